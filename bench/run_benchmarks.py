@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+
+"""
+run_benchmarks.py
+
+Scaling benchmarks of the model kernels of ch1-ch3.
+
+Every case times one kernel over a grid of step counts and ensemble sizes
+(parcels, members, components, cells, ...). Compute cases never draw;
+render cases only draw frames of already computed data (GIF encoding is
+left out), so the two can be compared separately.
+
+Each run is appended as one JSON line to the history file (outside the
+repository, ~/.cache/course-bench/history.jsonl or $COURSE_BENCH_HISTORY):
+date, git commit, versions, host and mode (full or --quick grids), and
+a list of results (case, kind, steps, size, best time in seconds). Only
+runs of the same host and mode are compared. From the history
+
+    --compare   flags results slower than the median of the previous runs
+                on the same grid point by more than --threshold, and exits
+                with status 1 if there are any
+    --report    prints the latest times per case and the fitted scaling
+                exponents of time against steps and against size
+
+Sandy Herho, 2024
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for folder in ('', 'ch1', 'ch2/buoyant_force', 'ch2/InertialOscillations/herho_work', 'ch2/coriolis',
+               'ch2/wave', 'ch3/long_surface_grav_wave'):
+    sys.path.insert(0, os.path.join(ROOT, folder))
+
+HISTORY = (os.environ.get("COURSE_BENCH_HISTORY")
+           or os.path.join(os.path.expanduser("~"), ".cache", "course-bench", "history.jsonl"))
+
+
+# Every case returns a function that runs the kernel once for (steps, size).
+
+def winethief_decay(steps, size):
+    import winethief
+    kappa = np.linspace(1e-5, 1e-3, size)
+    dt = 60.0
+    return lambda: winethief.ensemble(kappa, dt, "explicit", hours=steps * dt / 3600)
+
+
+def buoyancy(steps, size, r=0.0):
+    import parcels
+    z = np.linspace(-90.0, -10.0, size)
+    return lambda: parcels.simulate(z, 1025.5, 1.0e-4, r, dt=1.0, ntot=steps, nout=10)
+
+
+def buoyancy_friction(steps, size):
+    return buoyancy(steps, size, r=0.02)
+
+
+def inertial_oscillation(steps, size, scheme):
+    import inertial
+    latitudes = np.linspace(-80.0, 80.0, size)
+    return lambda: inertial.ensemble(latitudes, [inertial.IMPULSES], [(0.05, 0.05)], 4320.0, steps,
+                                     u=0.1, scheme=scheme)
+
+
+def inertial_semi_implicit(steps, size):
+    return inertial_oscillation(steps, size, "semi_implicit")
+
+
+def inertial_exact(steps, size):
+    return inertial_oscillation(steps, size, "exact")
+
+
+def coriolis_particle(steps, size):
+    from trajectories import coriolis_path
+    fre = 2 * np.pi / (24 * 3600)
+    u0 = np.linspace(0.1, 1.0, size)
+    return lambda: coriolis_path(0.0, 5.0, u0, 0.5, fre, 432.0, steps)
+
+
+def wave_superposition(steps, size):
+    from superposition import Superposition
+    rng = np.random.default_rng(0)
+    components = list(zip(rng.rayleigh(0.2, size), rng.uniform(20, 200, size),
+                          rng.uniform(5, 20, size), rng.uniform(0, 2 * np.pi, size)))
+    engine = Superposition(components, np.linspace(0, 1000, 500))
+    t = np.arange(steps) * 3.0
+    return lambda: engine.elevation(t)
+
+
+def long_wave_parcels(steps, size):
+    from particles import ParticleTracker, wave_velocity
+    x = np.linspace(0, 1000, size)
+    velocity = wave_velocity(1.0, 500.0)
+
+    def run():
+        ParticleTracker(x, 10.0, velocity, "rk4").step(0.5, steps)
+    return run
+
+
+def shallow_water(steps, size):
+    from shallow_water import ShallowWater1D
+
+    def run():
+        model = ShallowWater1D(1000.0, size)
+        model.set_wave(1.0, 500.0)
+        model.step(steps)
+    return run
+
+
+def render_raster_lines(steps, size):
+    """ Three panels of `size`-point lines, as in waveInterference.py --backend raster. """
+    from common import raster
+    canvas = raster.Canvas(1000, 800)
+    panels = [canvas.panel((0.125, 0.1 + 0.27 * i, 0.775, 0.22), (0, 1000), (-2, 2)) for i in range(3)]
+    x = np.linspace(0, 1000, size)
+    data = np.sin(2 * np.pi * (x / 100 - np.arange(steps)[:, None] / 50))
+
+    def run():
+        for frame in range(steps):
+            canvas.begin()
+            for panel, color in zip(panels, ('blue', 'green', 'red')):
+                canvas.polyline(panel, x, data[frame], color, width=2)
+    return run
+
+
+def render_tank_matplotlib(steps, size):
+    """ Redraw of a TankRenderer figure per frame, as in the Coriolis animations. """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from tank import TankRenderer
+    from trajectories import coriolis_path
+    path = coriolis_path(0.0, 5.0, 0.5, 0.5, 2 * np.pi / (24 * 3600), 432.0, size)
+
+    def run():
+        fig, ax = plt.subplots()
+        ax.set_xlim(-20, 20)
+        ax.set_ylim(-20, 20)
+        renderer = TankRenderer(ax, 20, 0.9, marker=[(2, 'red')])
+        renderer.set_trajectory(path["x"], path["y"])
+        for frame in range(steps):
+            renderer.draw_frame(count=frame * size // steps + 1, phase=0.01 * frame)
+            fig.canvas.draw()
+        plt.close(fig)
+    return run
+
+
+# name: (kind, builder, step counts, sizes, quick step counts, quick sizes)
+CASES = {
+    "winethief_decay": ("compute", winethief_decay, [1_000, 10_000, 100_000], [1, 100, 10_000],
+                        [1_000], [1, 100]),
+    "buoyancy": ("compute", buoyancy, [1_000, 3_600, 36_000], [1, 100, 10_000], [1_000], [1, 100]),
+    "buoyancy_friction": ("compute", buoyancy_friction, [1_000, 3_600, 36_000], [1, 100, 10_000],
+                          [1_000], [1, 100]),
+    "inertial_semi_implicit": ("compute", inertial_semi_implicit, [1_000, 10_000, 100_000], [1, 10, 100],
+                               [1_000], [1, 10]),
+    "inertial_exact": ("compute", inertial_exact, [1_000, 10_000, 100_000], [1, 10, 100], [1_000], [1, 10]),
+    "coriolis_particle": ("compute", coriolis_particle, [200, 10_000, 100_000], [1, 10, 100], [200],
+                          [1, 10]),
+    "wave_superposition": ("compute", wave_superposition, [200, 2_000, 20_000], [2, 16, 128], [200], [2, 16]),
+    "long_wave_parcels": ("compute", long_wave_parcels, [100, 1_000], [400, 10_000, 100_000], [100], [400]),
+    "shallow_water": ("compute", shallow_water, [100, 1_000, 10_000], [1_000, 100_000, 1_000_000],
+                      [100], [1_000]),
+    "render_raster_lines": ("render", render_raster_lines, [10, 50, 200], [100, 500, 5_000], [10], [500]),
+    "render_tank_matplotlib": ("render", render_tank_matplotlib, [10, 50, 200], [200], [10], [200]),
+}
+
+
+def best_time(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, check=True,
+                             capture_output=True, text=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_cases(names, quick=False, repeat=3):
+    """ Time the named cases over their grids; returns a list of result dicts. """
+    results = []
+    for name in names:
+        kind, builder, steps_grid, size_grid, quick_steps, quick_sizes = CASES[name]
+        for steps in (quick_steps if quick else steps_grid):
+            for size in (quick_sizes if quick else size_grid):
+                seconds = best_time(builder(steps, size), repeat)
+                results.append({"case": name, "kind": kind, "steps": steps, "size": size,
+                                "seconds": seconds})
+                print(f"{name:<24} {kind:<8} steps={steps:<9d} size={size:<9d} {seconds * 1e3:>11.3f} ms",
+                      flush=True)
+    return results
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def setup(quick=False):
+    """ Host and mode of a run: only runs with the same setup are compared. """
+    return {"node": platform.node(), "machine": platform.machine(), "cpus": os.cpu_count(),
+            "mode": "quick" if quick else "full"}
+
+
+def same_setup(history, quick=False):
+    """ The entries of history run on this host in the same mode. """
+    current = setup(quick)
+    return [entry for entry in history
+            if all(entry.get(key, "full" if key == "mode" else None) == value
+                   for key, value in current.items())]
+
+
+def append_history(path, results, quick=False):
+    entry = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        **setup(quick),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a') as file:
+        file.write(json.dumps(entry) + "\n")
+    return entry
+
+
+def regressions(results, history, threshold=1.25, window=5):
+    """
+    Results slower than threshold times the median of the same grid point
+    over the last `window` runs of the history (of the same setup, see
+    same_setup()). Returns (result, baseline) pairs.
+    """
+    previous = {}
+    for entry in history[-window:]:
+        for r in entry["results"]:
+            previous.setdefault((r["case"], r["steps"], r["size"]), []).append(r["seconds"])
+    slow = []
+    for r in results:
+        times = previous.get((r["case"], r["steps"], r["size"]))
+        if times and r["seconds"] > threshold * np.median(times):
+            slow.append((r, float(np.median(times))))
+    return slow
+
+
+def scaling_exponent(points):
+    """ Slope of log(seconds) against log(n) for [(n, seconds), ...]; None for < 2 points. """
+    points = [(n, s) for n, s in points if s > 0]
+    if len({n for n, _ in points}) < 2:
+        return None
+    n, s = np.log(np.array(points, dtype=float)).T
+    return float(np.polyfit(n, s, 1)[0])
+
+
+def report(entry):
+    """ Times of one history entry per case, with scaling exponents in steps and size. """
+    print(f"{entry.get('mode', 'full')} run of {entry['date']} on {entry['node']} "
+          f"(commit {entry['commit']}, {entry['cpus']} cpus)")
+    by_case = {}
+    for r in entry["results"]:
+        by_case.setdefault(r["case"], []).append(r)
+    for name, rows in by_case.items():
+        largest_size = max(r["size"] for r in rows)
+        largest_steps = max(r["steps"] for r in rows)
+        in_steps = scaling_exponent([(r["steps"], r["seconds"]) for r in rows if r["size"] == largest_size])
+        in_size = scaling_exponent([(r["size"], r["seconds"]) for r in rows if r["steps"] == largest_steps])
+        fmt = lambda e: "   -" if e is None else f"{e:4.2f}"
+        print(f"{name:<24} {rows[0]['kind']:<8} time ~ steps^{fmt(in_steps)} size^{fmt(in_size)}")
+        for r in rows:
+            per_item = r["seconds"] / (r["steps"] * r["size"])
+            print(f"    steps={r['steps']:<9d} size={r['size']:<9d} {r['seconds'] * 1e3:>11.3f} ms"
+                  f" {per_item * 1e9:>10.2f} ns/step/item")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmarks of the model kernels")
+    parser.add_argument("cases", nargs="*", help=f"cases to run (default: all): {', '.join(CASES)}")
+    parser.add_argument("--kind", choices=("compute", "render", "all"), default="all")
+    parser.add_argument("--quick", action="store_true",
+                        help="small grids only, for smoke tests (kept apart in the history)")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions per point (best is kept)")
+    parser.add_argument("--history", default=HISTORY, help="JSON-lines history file")
+    parser.add_argument("--no-save", action="store_true", help="don't append this run to the history")
+    parser.add_argument("--compare", action="store_true",
+                        help="exit 1 if a point is slower than the recent history")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown factor counted as a regression")
+    parser.add_argument("--report", action="store_true",
+                        help="only print the latest run of the history with scaling exponents")
+    args = parser.parse_args()
+
+    history = same_setup(load_history(args.history), args.quick)
+    if args.report:
+        if not history:
+            print(f"no {'quick' if args.quick else 'full'} runs of this host in {args.history}")
+            return 1
+        report(history[-1])
+        return 0
+
+    unknown = set(args.cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+    names = [name for name in (args.cases or CASES)
+             if args.kind == "all" or CASES[name][0] == args.kind]
+    results = run_cases(names, quick=args.quick, repeat=args.repeat)
+
+    status = 0
+    if args.compare:
+        slow = regressions(results, history, args.threshold)
+        for r, baseline in slow:
+            print(f"REGRESSION {r['case']} steps={r['steps']} size={r['size']}: "
+                  f"{r['seconds'] * 1e3:.3f} ms vs {baseline * 1e3:.3f} ms")
+        if not slow:
+            print("no regressions")
+        status = 1 if slow else 0
+    if not args.no_save:
+        append_history(args.history, results, quick=args.quick)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+winethief.ensemble() and stream() sample every member at the steps
+main() writes.
+"""
+
+import numpy as np
+import pytest
+
+import winethief
+
+
+def loop(kappa, dt, scheme, hours=24.0):
+    """ The step-by-step loop of main() for any dt: outputs (time in hours, C). """
+    fac = winethief.amplification(kappa, dt, scheme)
+    ntot = int(hours * 3600 / dt)
+    nout = int(3600.0 / dt)
+    C, rows = winethief.CZERO, [(0.0, winethief.CZERO)]
+    for n in range(1, ntot + 1):
+        C = fac * C
+        if n % nout == 0:
+            rows.append((n * dt / 3600.0, C))
+    return np.array(rows)
+
+
+@pytest.mark.parametrize("hours", [24.0, 5.5])
+def test_outputs_follow_main(hours):
+    dts = [3600.0, 1000.0, 700.0, 60.0]
+    result = winethief.ensemble(1e-4, dts, "implicit", hours=hours)
+    for i, dt in enumerate(dts):
+        expected = loop(1e-4, dt, "implicit", hours)
+        rows = result["rows"][i]
+        assert rows == len(expected)
+        np.testing.assert_allclose(result["time"][i, :rows], expected[:, 0], rtol=1e-15)
+        np.testing.assert_allclose(result["C"][i, :rows], expected[:, 1], rtol=1e-12)
+        assert np.isnan(result["C"][i, rows:]).all()
+    assert len(winethief.to_table(result)) == result["rows"].sum()
+
+    blocks = list(winethief.stream(1e-4, dts, "implicit", hours=hours, block=4))
+    np.testing.assert_array_equal(np.concatenate([b["C"] for b in blocks]).T, result["C"])
+
+
+def test_dt_1000_has_29_rows():
+    assert winethief.ensemble(1e-4, 1000.0, "explicit")["C"].shape == (1, 29)
+
+
+def test_main_matches_ensemble(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("builtins.input", lambda prompt: "1")
+    winethief.main()
+    written = np.loadtxt(tmp_path / "output1_py.txt", delimiter=",")
+    result = winethief.ensemble(1e-4, 3600.0, "explicit")
+    np.testing.assert_allclose(written[:, 1], result["C"][0], rtol=1e-14)
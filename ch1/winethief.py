@@ -3,52 +3,256 @@
 """
 winethief.py
 
+Decay of a concentration C with dC/dt = -kappa*C, solved with either the
+explicit or the implicit Euler scheme.
+
+Run without arguments for the interactive single-run mode, or pass arrays
+of decay constants, time steps and schemes to evaluate a whole ensemble in
+one NumPy computation, e.g.
+
+    python winethief.py --kappa 1e-4 2e-4 --dt 3600 60 --scheme explicit implicit --grid
+
 Sandy Herho, 2024
 """
 
+import argparse
+import os
+import sys
+
 import numpy as np
 
-def main():
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import simio, stepping, streams, timings
+
+CZERO = 100.0   # Initial concentration
+SCHEMES = {"explicit": 1, "implicit": 2}
+
+
+def amplification(kappa, dt, scheme):
+    """
+    Per-step amplification factor of each member.
+
+    `scheme` holds 1/"explicit" or 2/"implicit" for every member.
+    """
+    kappa, dt, scheme = np.broadcast_arrays(np.asarray(kappa, dtype=float),
+                                            np.asarray(dt, dtype=float),
+                                            _scheme_codes(scheme))
+    A = -kappa[..., None, None]
+    h = dt[..., None, None]
+    explicit, _ = stepping.propagator("explicit", A, h)
+    implicit, _ = stepping.propagator("implicit", A, h)
+    return np.where(scheme == 1, explicit[..., 0, 0], implicit[..., 0, 0])
+
+
+def ensemble(kappa, dt, scheme, hours=24.0, czero=CZERO):
+    """
+    Evaluate all members of a decay ensemble at once.
+
+    `kappa`, `dt` and `scheme` are broadcast against each other; every
+    broadcast element is one member. As in `main()`, each member runs
+    ntot = int(hours*3600/dt) steps and is sampled at step 0 and every
+    nout = int(3600/dt) steps, so a dt that doesn't divide an hour gives
+    more rows than hours (dt=1000: 29 rows, every 3000 s). C after n steps
+    is czero*fac**n, which is exactly what the step-by-step loop produces.
+
+    Returns a dict of 2-D arrays with shape (n_members, n_out): "time"
+    (hours), "C", "CTRUE" and "error" (C - CTRUE), NaN past the last
+    output of members with fewer rows, plus the 1-D member parameters
+    "kappa", "dt", "scheme", "stable" and "rows" (outputs of the member).
+    """
+    kappa, dt, scheme, fac, nout, nrows = _members(kappa, dt, scheme, hours)
+
+    time, C, CTRUE = _outputs(np.arange(nrows.max())[None, :], kappa[:, None], dt[:, None],
+                              fac[:, None], nout[:, None], nrows[:, None], czero)
+
+    return {
+        "kappa": kappa,
+        "dt": dt,
+        "scheme": scheme,
+        "stable": fac > 0.0,
+        "rows": nrows,
+        "time": time / 3600.0,
+        "C": C,
+        "CTRUE": CTRUE,
+        "error": C - CTRUE,
+    }
+
+
+def stream(kappa, dt, scheme, hours=24.0, czero=CZERO, block=streams.BLOCK):
+    """
+    `ensemble()` as consecutive blocks of at most `block` outputs, for
+    ensembles run over very many hours. Each block is a dict with "time"
+    (hours), "C", "CTRUE" and "error" of shape (rows, n_members): time
+    runs along the first axis, as in all the model streams (see
+    common/streams.py).
+    """
+    kappa, dt, scheme, fac, nout, nrows = _members(kappa, dt, scheme, hours)
+
+    for start in range(0, nrows.max(), block):
+        k = np.arange(start, min(start + block, nrows.max()))[:, None]
+        time, C, CTRUE = _outputs(k, kappa, dt, fac, nout, nrows, czero)
+        yield {"time": time / 3600.0, "C": C, "CTRUE": CTRUE, "error": C - CTRUE}
+
+
+def _outputs(k, kappa, dt, fac, nout, nrows, czero):
+    """ Time (s), C and CTRUE of output k of each member, NaN past its last output. """
+    n = np.where(k < nrows, k * nout, -1)   # step number of each output
+    time = np.where(n >= 0, n * dt, np.nan)
+    C = np.where(n >= 0, czero * fac ** np.maximum(n, 0), np.nan)
+    CTRUE = czero * np.exp(-kappa * time)
+    return time, C, CTRUE
+
+
+def _members(kappa, dt, scheme, hours):
+    """
+    Flattened member parameters, amplification factors, output intervals
+    (steps) and numbers of output rows, counted as main() counts them.
+    """
+    kappa, dt, scheme = np.broadcast_arrays(np.asarray(kappa, dtype=float),
+                                            np.asarray(dt, dtype=float),
+                                            _scheme_codes(scheme))
+    kappa, dt, scheme = kappa.ravel(), dt.ravel(), scheme.ravel()
+
+    fac = amplification(kappa, dt, scheme)
+    nout = (3600.0 / dt).astype(int)
+    if np.any(nout < 1):
+        raise ValueError("time step must not exceed the one-hour output interval")
+    ntot = (hours * 3600.0 / dt).astype(int)
+    return kappa, dt, scheme, fac, nout, ntot // nout + 1
+
+
+def to_table(result):
+    """
+    Flatten an `ensemble()` result into one long table with the columns
+    member, kappa, dt, scheme, time, C, CTRUE, error (the rows of every
+    member, without the NaN padding).
+    """
+    nmem, nout = result["C"].shape
+    keep = (np.arange(nout)[None, :] < result["rows"][:, None]).ravel()
+    member = np.repeat(np.arange(nmem), nout)[keep]
+    return np.column_stack([
+        member,
+        result["kappa"][member],
+        result["dt"][member],
+        result["scheme"][member],
+        result["time"].ravel()[keep],
+        result["C"].ravel()[keep],
+        result["CTRUE"].ravel()[keep],
+        result["error"].ravel()[keep],
+    ])
+
+
+def _scheme_codes(scheme):
+    """ Convert scheme names or numbers to the integer mode codes 1 and 2. """
+    scheme = np.asarray(scheme)
+    if scheme.dtype.kind in "US":
+        codes = np.vectorize(lambda s: int(s) if s.isdigit() else SCHEMES[s.lower()],
+                             otypes=[int])
+        scheme = codes(scheme)
+    scheme = scheme.astype(int)
+    if np.any((scheme != 1) & (scheme != 2)):
+        raise ValueError("scheme must be 1/'explicit' or 2/'implicit'")
+    return scheme
+
+
+def run_ensemble(args):
+    """ Non-interactive ensemble run driven by the command line. """
+    kappa = np.asarray(args.kappa, dtype=float)
+    dt = np.asarray(args.dt, dtype=float)
+    scheme = _scheme_codes(args.scheme)
+    if args.grid:
+        kappa, dt, scheme = np.meshgrid(kappa, dt, scheme, indexing="ij")
+
+    with timings.stage("compute"):
+        result = ensemble(kappa, dt, scheme, hours=args.hours)
+    timings.count("members", result["C"].shape[0])
+    for i in np.flatnonzero(~result["stable"]):
+        print(f"STABILITY CRITERION ALERT: REDUCE TIME STEP "
+              f"(member {i}: kappa={result['kappa'][i]}, dt={result['dt'][i]})")
+
+    table = to_table(result)
+    if args.binary:
+        names = ["member", "kappa", "dt", "scheme", "time", "C", "CTRUE", "error"]
+        simio.save(args.output, dict(zip(names, table.T)),
+                   meta={"czero": CZERO, "hours": args.hours, "members": result["C"].shape[0]})
+    else:
+        with timings.stage("write"):
+            np.savetxt(args.output, table, delimiter=",", fmt="%.17g",
+                       header="member,kappa,dt,scheme,time,C,CTRUE,error", comments="")
+        timings.count_file(args.output)
+    print(f"{result['C'].shape[0]} members written to {args.output}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Wine thief decay model")
+    parser.add_argument("--kappa", type=float, nargs="+", help="decay constants (1/s)")
+    parser.add_argument("--dt", type=float, nargs="+", default=[3600.0], help="time steps (s)")
+    parser.add_argument("--scheme", nargs="+", default=["explicit"],
+                        help="explicit/implicit (or 1/2) for each member")
+    parser.add_argument("--grid", action="store_true",
+                        help="run every combination of kappa, dt and scheme")
+    parser.add_argument("--hours", type=float, default=24.0, help="simulated hours")
+    parser.add_argument("--output", default="ensemble_py.csv", help="output table")
+    parser.add_argument("--binary", action="store_true",
+                        help="write .npy/.json (see common/simio.py) instead of text")
+    return parser.parse_args(argv)
+
+
+def main(binary=False):
     print("Select the numerical scheme for the decay simulation:")
     print("1: Explicit scheme")
     print("2: Implicit scheme")
     mode = int(input("Enter your choice (1 or 2): "))
 
     # Constants and Initialization
-    CZERO = 100.0   # Initial concentration
     kappa = 0.0001  # Decay constant
     dt = 3600.0     # Time step (seconds)
     ntot = int(24.0 * 3600 / dt)  # Total number of iterations for 24 hours
     nout = int(3600.0 / dt)       # Output every hour
 
-    # Factor used in the scheme
-    if mode == 1:
-        fac = 1.0 - dt * kappa
-        if fac <= 0.0:
-            print('STABILITY CRITERION ALERT: REDUCE TIME STEP')
-    elif mode == 2:
-        fac = 1.0 / (1.0 + dt * kappa)
+    # Propagator (the factor fac) of the chosen scheme for dC/dt = -kappa*C
+    scheme = "explicit" if mode == 1 else "implicit"
+    G, _ = stepping.propagator(scheme, [[-kappa]], dt)
+    if mode == 1 and G[0, 0] <= 0.0:
+        print('STABILITY CRITERION ALERT: REDUCE TIME STEP')
 
     # Initialize variables
-    C = CZERO
+    C = stepping.as_batch(CZERO)
     time = 0
 
-    # File handling
-    output_file = 'output1_py.txt' if mode == 1 else 'output2_py.txt'
-    with open(output_file, 'w') as file:
-        file.write(f"{0},{100.0},{100.0}\n")  # Write initial values
+    # Output rows: time (hours), prediction and exact solution, starting with initial values
+    rows = [(0, 100.0, 100.0)]
 
-        # Iteration loop
+    # Iteration loop
+    with timings.stage("compute"):
         for n in range(1, ntot + 1):
-            CN = C * fac  # prediction for the next time step
+            CN = stepping.apply(G, C)  # prediction for the next time step
             time = n * dt
             CTRUE = CZERO * np.exp(-kappa * time)  # exact analytical solution
             C = CN  # updating for upcoming time step
 
             # Output data if the current iteration is a multiple of nout
             if n % nout == 0:
-                file.write(f"{time/3600.0},{C},{CTRUE}\n")  # Write to file
+                rows.append((time/3600.0, C[0, 0], CTRUE))
                 print(f"Data output at time = {time/3600.0} hours")  # Print to screen
+    timings.count("steps", ntot)
+
+    # File handling
+    output_file = 'output1_py.txt' if mode == 1 else 'output2_py.txt'
+    if binary:
+        time, C, CTRUE = np.array(rows, dtype=float).T
+        simio.save(output_file, {"time": time, "C": C, "CTRUE": CTRUE},
+                   meta={"czero": CZERO, "kappa": kappa, "dt": dt, "ntot": ntot, "mode": mode})
+    else:
+        with timings.stage("write"), open(output_file, 'w') as file:
+            for time, C, CTRUE in rows:
+                file.write(f"{time},{C},{CTRUE}\n")  # Write to file
+        timings.count_file(output_file)
 
 if __name__ == "__main__":
-    main()
+    timings.setup(__file__)
+    args = parse_args()
+    if args.kappa is None:
+        main(binary=args.binary)
+    else:
+        run_ensemble(args)
@@ -1,13 +1,46 @@
 #!/usr/bin/env python
+import argparse
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 
+import inertial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common import cache, simio, timings
+
 # Set the 'bmh' style for aesthetic preference
 plt.style.use('bmh')
 
-# Load data from the text file
-data = np.loadtxt('output2.txt', skiprows=1)
+# The run of iner_osci.f95 / iner_osci_v1.py, for --cached
+RUN = {"u": 0.1, "v": 0.0, "x": 0.0, "y": 0.0, "f": -4 * np.pi / (24 * 3600), "dt": 6 * 24 * 3600 / 120,
+       "ntot": 120, "uzero": 0.05, "vzero": 0.05, "events": inertial.IMPULSES}
+
+def compute(**params):
+    """ x, y, time of a run after the initial state, as in the text outputs. """
+    traj = inertial.trajectory(**params)
+    return {"x": traj["x"][1:], "y": traj["y"][1:], "time": traj["time"][1:]}
+
+timings.setup(__file__)
+parser = argparse.ArgumentParser(description="Animated path of an inertial oscillation")
+parser.add_argument("filename", nargs="?", default='output2.txt',
+                    help="text output, or a binary run such as output2_pyv1.npy")
+parser.add_argument("--cached", nargs="?", const="exact", choices=inertial.SCHEMES, metavar="SCHEME",
+                    help="plot the run of SCHEME (default exact) from the result cache, "
+                         "computed if it isn't there, instead of reading a file")
+parser.add_argument("--set", action="append", metavar="NAME=VALUE",
+                    help=f"change a parameter of the cached run ({', '.join(RUN)})")
+args = parser.parse_args()
+
+# Load data from the text file, from a binary run, or from the cache
+if args.cached:
+    params = dict(cache.overrides(RUN, args.set), scheme=args.cached)
+    data = cache.fetch("inertial.trajectory", params, compute, sources=[__file__, inertial]).rows()
+else:
+    data = simio.load(args.filename, names=('x', 'y', 'time'), header=('freq', 'dt', 'ntot')).rows()
 times = data[:, 2] / (24 * 3600)  # Convert seconds to days
 
 # Set up the figure and axis
@@ -40,7 +73,7 @@ def update(n):
     return line, time_text
 
 # Create the animation
-ani = FuncAnimation(fig, update, frames=len(data), init_func=init, blit=True, repeat=True)
+ani = FuncAnimation(fig, timings.wrap(update, "update"), frames=len(data), init_func=init, blit=True, repeat=True)
 
 # Show the plot
 plt.show()
@@ -1,15 +1,73 @@
 #!/usr/bin/env python
 
+import argparse
+import os
+import sys
+
 import numpy as np
 
-def main():
+import inertial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common import checkpoint, simio, timings
+
+RUNS = (("semi_implicit", 'output1_pyv1.txt'), ("exact", 'output2_pyv1.txt'))
+
+def run_checkpointed(u, v, x, y, f, freq, dt, ntot, uzero, vzero, every, restart):
+    """
+    The text output of main() written block by block, with a checkpoint
+    after every `every` steps: which run is in progress, the running sums
+    of inertial.stream() (the velocity in the rotating frame and the
+    summed velocities of the position), the step and the output cursor.
+    The rows only depend on those sums and the absolute step, so the
+    output is byte for byte that of main() whatever the interval, and
+    restart continues from the last checkpoint (with any interval) without
+    recomputing the earlier steps and writes exactly what an uninterrupted
+    run writes.
+    """
+    params = {"u": u, "v": v, "x": x, "y": y, "f": f, "dt": dt, "ntot": ntot,
+              "uzero": uzero, "vzero": vzero, "impulses": inertial.IMPULSES}
+    ckpt = checkpoint.Checkpoint('output_pyv1.ckpt.npz', every, params)
+
+    first_run, start, cursor, state = 0, 0, None, {}
+    saved = ckpt.resume() if restart else None
+    if saved is not None:
+        start, arrays, cursor = saved
+        first_run = int(arrays["run"])
+        state = {key: arrays[key][()] for key in ("impulses", "xsum", "ysum")}
+        print(f"Restarting {RUNS[first_run][1]} at step {start}")
+
+    for i, (scheme, filename) in enumerate(RUNS):
+        if i < first_run:
+            continue
+        if i > first_run:
+            start, cursor, state = 0, None, {}
+        with checkpoint.reopen(filename, cursor) as file:
+            if cursor is None:
+                file.write(f"{freq} {dt} {ntot}\n")
+            n = start
+            blocks = inertial.stream(u, v, x, y, f, dt, ntot, events=inertial.IMPULSES, uzero=uzero,
+                                     vzero=vzero, scheme=scheme, block=every, start=start,
+                                     state=state)
+            for block in timings.iterate(blocks, "compute"):
+                first = 1 if n == 0 else 0   # the initial state isn't written
+                with timings.stage("write"):
+                    for xn, yn, time in zip(block["x"][first:], block["y"][first:], block["time"][first:]):
+                        file.write(f"{xn} {yn} {time}\n")
+                    file.flush()
+                n += len(block["time"])
+                if n <= ntot:
+                    ckpt.write(n, {"run": i, **state}, cursor=file.tell())
+        timings.count("steps", ntot - start)
+        timings.count_file(filename)
+    ckpt.clear()
+
+def main(binary=False, backend="numpy", checkpoint_every=None, restart=False):
     # Constants
     pi = np.pi
     freq = -2 * pi / (24 * 3600)
     f = 2 * freq
     dt = 6 * 24 * 3600 / 120
-    alpha = f * dt
-    beta = 0.25 * alpha * alpha
     ntot = 120
 
     # Initial conditions
@@ -20,54 +78,42 @@ def main():
     x = 0.0
     y = 0.0
 
-    # Initialize mode 2 variables
-    u2, v2, x2, y2 = u, v, x, y
-
-    # Open files
-    with open('output1_pyv1.txt', 'w') as file1, open('output2_pyv1.txt', 'w') as file2:
-        # Write headers
-        file1.write(f"{freq} {dt} {ntot}\n")
-        file2.write(f"{freq} {dt} {ntot}\n")
-
-        # Iteration loop
-        for n in range(1, ntot + 1):
-            time = n * dt
-            du = 0.0
-            dv = 0.0
-
-            if n == 40:
-                dv = -0.3
-            elif n == 80:
-                dv = 0.1
-
-            # Mode 1 calculations
-            ustar = u + du
-            vstar = v + dv
-
-            un = (ustar * (1 - beta) + alpha * vstar) / (1 + beta)
-            vn = (vstar * (1 - beta) - alpha * ustar) / (1 + beta)
-
-            xn = x + dt * (un + uzero) / 1000
-            yn = y + dt * (vn + vzero) / 1000
-
-            u, v, x, y = un, vn, xn, yn
-
-            file1.write(f"{x} {y} {time}\n")
-
-            # Mode 2 calculations
-            ustar = u2 + du
-            vstar = v2 + dv
-
-            un2 = np.cos(alpha) * ustar + np.sin(alpha) * vstar
-            vn2 = np.cos(alpha) * vstar - np.sin(alpha) * ustar
-
-            xn2 = x2 + dt * (un2 + uzero) / 1000
-            yn2 = y2 + dt * (vn2 + vzero) / 1000
-
-            u2, v2, x2, y2 = un2, vn2, xn2, yn2
-
-            file2.write(f"{x2} {y2} {time}\n")
+    if checkpoint_every or restart:
+        if binary or backend != "numpy":
+            raise ValueError("checkpoints are only written for NumPy runs with text output")
+        run_checkpointed(u, v, x, y, f, freq, dt, ntot, uzero, vzero, checkpoint_every or ntot, restart)
+        return
+
+    # Mode 1 (semi-implicit) and mode 2 (exact rotation), impulses at n = 40 and n = 80
+    for scheme, filename in RUNS:
+        with timings.stage("compute"):
+            traj = inertial.trajectory(u, v, x, y, f, dt, ntot, events=inertial.IMPULSES,
+                                       uzero=uzero, vzero=vzero, scheme=scheme,
+                                       backend=backend)
+        timings.count("steps", ntot)
+
+        if binary:
+            simio.save(filename, {"x": traj["x"][1:], "y": traj["y"][1:], "time": traj["time"][1:]},
+                       meta={"freq": freq, "dt": dt, "ntot": ntot, "scheme": scheme})
+            continue
+
+        with timings.stage("write"), open(filename, 'w') as file:
+            file.write(f"{freq} {dt} {ntot}\n")
+            for xn, yn, time in zip(traj["x"][1:], traj["y"][1:], traj["time"][1:]):
+                file.write(f"{xn} {yn} {time}\n")
+        timings.count_file(filename)
 
 if __name__ == "__main__":
-    main()
-
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Inertial oscillations, both schemes")
+    parser.add_argument("--binary", action="store_true",
+                        help="write .npy/.json runs (see common/simio.py) instead of text")
+    parser.add_argument("--backend", choices=("numpy", "fortran", "auto"), default="numpy",
+                        help="fortran: run the iner_osci.f95 loop through common/fortran.py")
+    parser.add_argument("--checkpoint-every", type=int, metavar="STEPS",
+                        help="checkpoint to output_pyv1.ckpt.npz every STEPS steps")
+    parser.add_argument("--restart", action="store_true",
+                        help="continue from the last checkpoint, if there is one")
+    args = parser.parse_args()
+    main(binary=args.binary, backend=args.backend, checkpoint_every=args.checkpoint_every,
+         restart=args.restart)
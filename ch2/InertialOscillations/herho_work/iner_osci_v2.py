@@ -1,14 +1,21 @@
 #!/usr/bin/env python
 
+import argparse
+import os
+import sys
+
 import numpy as np
 
+import inertial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common import simio, timings
+
 # Constants
 pi = np.pi
 freq = -2 * pi / (24 * 3600)
 f = 2 * freq
 dt = 6 * 24 * 3600 / 120
-alpha = f * dt
-beta = 0.25 * alpha * alpha
 ntot = 120
 uzero = 0.05
 vzero = 0.05
@@ -16,43 +23,40 @@ initial_conditions = {
     'u': 0.1, 'v': 0.0, 'x': 0.0, 'y': 0.0
 }
 
-def update_positions_and_velocities(u, v, du, dv):
-    ustar = u + du
-    vstar = v + dv
-    un = (ustar * (1 - beta) + alpha * vstar) / (1 + beta)
-    vn = (vstar * (1 - beta) - alpha * ustar) / (1 + beta)
-    return un, vn
-
 def write_outputs(file, x, y, time):
     file.write(f"{x:.6f} {y:.6f} {time:.2f}\n")
 
-def simulate(mode: int):
-    conditions = np.array([initial_conditions['u'], initial_conditions['v'], initial_conditions['x'], initial_conditions['y']])
+def simulate(mode: int, binary: bool = False):
+    # Mode 1 is semi-implicit; mode 2 rotates exactly and adds the impulse after the rotation
+    with timings.stage("compute"):
+        traj = inertial.trajectory(initial_conditions['u'], initial_conditions['v'],
+                                   initial_conditions['x'], initial_conditions['y'], f, dt, ntot,
+                                   events=inertial.IMPULSES, uzero=uzero, vzero=vzero,
+                                   scheme="semi_implicit" if mode == 1 else "exact",
+                                   kick="before" if mode == 1 else "after")
+    timings.count("steps", ntot)
     filename = f'output_py_v2_{mode}.txt'
-    
-    with open(filename, 'w') as file:
+
+    if binary:
+        simio.save(filename, {"x": traj["x"][1:], "y": traj["y"][1:], "time": traj["time"][1:]},
+                   meta={"freq": freq, "dt": dt, "ntot": ntot, "mode": mode})
+        return
+
+    with timings.stage("write"), open(filename, 'w') as file:
         file.write(f"{freq} {dt} {ntot}\n")
-        
-        for n in range(1, ntot + 1):
-            time = n * dt
-            du, dv = (0.0, -0.3 if n == 40 else 0.1 if n == 80 else 0.0)
-            
-            if mode == 1:
-                u, v = update_positions_and_velocities(conditions[0], conditions[1], du, dv)
-            else:
-                u = np.cos(alpha) * conditions[0] + np.sin(alpha) * conditions[1] + du
-                v = np.cos(alpha) * conditions[1] - np.sin(alpha) * conditions[0] + dv
-            
-            x = conditions[2] + dt * (u + uzero) / 1000
-            y = conditions[3] + dt * (v + vzero) / 1000
-            conditions = np.array([u, v, x, y])
-            
+
+        for x, y, time in zip(traj["x"][1:], traj["y"][1:], traj["time"][1:]):
             write_outputs(file, x, y, time)
+    timings.count_file(filename)
 
-def main():
-    simulate(mode=1)
-    simulate(mode=2)
+def main(binary=False):
+    simulate(mode=1, binary=binary)
+    simulate(mode=2, binary=binary)
 
 if __name__ == "__main__":
-    main()
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Inertial oscillations, modes 1 and 2")
+    parser.add_argument("--binary", action="store_true",
+                        help="write .npy/.json runs (see common/simio.py) instead of text")
+    main(binary=parser.parse_args().binary)
 
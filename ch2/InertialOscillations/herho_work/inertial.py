@@ -0,0 +1,280 @@
+"""
+inertial.py
+
+Closed-form engine for the inertial-oscillation models of
+iner_osci_v1.py / iner_osci_v2.py.
+
+The velocity (u, v) is treated as the complex number W = u + i*v. Both
+schemes of the course then advance W by a constant complex multiplier,
+
+    exact rotation:  W_n = exp(-i*alpha) * W_(n-1)
+    semi-implicit:   W_n = ((1 - beta) - i*alpha)/(1 + beta) * W_(n-1)
+
+with alpha = f*dt and beta = alpha^2/4, the exact and Crank-Nicolson
+propagators of common/stepping.py written as complex numbers. With impulses d_k = du + i*dv
+added before the update at step k,
+
+    W_n = R^n * (W_0 + sum_(k<=n) R^(1-k) d_k),
+
+so the whole trajectory follows from one power table, one cumulative sum
+over the impulses and one cumulative sum for the positions.
+
+trajectory() can also run the FORTRAN loop of iner_osci.f95 through
+common/fortran.py (backend="fortran"), or use it whenever it can be
+built (backend="auto"). stream() yields the same trajectory in blocks of
+bounded size, for runs too long to hold in memory (see
+common/streams.py).
+
+Sandy Herho, 2024
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common import fortran, stepping, streams
+
+SCHEMES = ("semi_implicit", "exact")
+OMEGA = 2 * np.pi / (24 * 3600)   # rotation rate of the earth, as in the course
+
+# Impulses of the course example: (step, du, dv) in m/s
+IMPULSES = [(40, 0.0, -0.3), (80, 0.0, 0.1)]
+
+
+def coriolis_parameter(latitude):
+    """
+    Coriolis parameter f = 2*OMEGA*sin(latitude) for latitudes in degrees.
+    The course example, f = 2*freq with freq = -2*pi/(24*3600), is -90.
+    """
+    return 2 * OMEGA * np.sin(np.radians(latitude))
+
+
+def multiplier(f, dt, scheme="exact"):
+    """
+    Complex one-step multiplier R of the velocity W = u + i*v, taken from
+    the propagator G of (u, v) in common/stepping.py: the exact rotation,
+    or Crank-Nicolson for the semi-implicit scheme. Both are rotations
+    (scaled for Crank-Nicolson), so R = G[0, 0] - i*G[0, 1].
+    """
+    f = np.asarray(f, dtype=float)
+    if scheme == "exact":
+        G = stepping.rotation_matrix(f * dt)
+    elif scheme == "semi_implicit":
+        A = np.zeros(f.shape + (2, 2))
+        A[..., 0, 1] = f
+        A[..., 1, 0] = -f
+        G, _ = stepping.propagator("crank_nicolson", A, dt)
+    else:
+        raise ValueError(f"unknown scheme: {scheme}")
+    return (G[..., 0, 0] - 1j * G[..., 0, 1])[()]
+
+
+def impulse_series(events, ntot):
+    """ Complex impulses d_n = du + i*dv for n = 0..ntot from (n, du, dv) events. """
+    d = np.zeros(ntot + 1, dtype=complex)
+    for n, du, dv in events:
+        if not 1 <= n <= ntot:
+            raise ValueError(f"impulse at step {n} outside 1..{ntot}")
+        d[n] += du + 1j * dv
+    return d
+
+
+def trajectory(u, v, x, y, f, dt, ntot, events=(), uzero=0.0, vzero=0.0,
+               scheme="exact", kick="before", backend="numpy"):
+    """
+    Whole trajectory of one parcel in one vectorized pass.
+
+    u, v: initial relative velocity (m/s); x, y: initial location (km);
+    events: iterable of (step, du, dv) impulses; uzero, vzero: ambient
+    drift (m/s). kick="before" adds an impulse before the rotation of its
+    step (as in iner_osci_v1.py and the FORTRAN code), kick="after" adds it
+    afterwards (as in mode 2 of iner_osci_v2.py).
+
+    Returns a dict of arrays of length ntot+1 (index 0 is the initial
+    state): "time" (s), "u", "v", "x" and "y" (km).
+
+    backend: "numpy", "fortran" (the REAL(8) build of the FORTRAN kernel,
+    kick="before" only) or "auto" (FORTRAN if it is available and
+    applicable, NumPy otherwise). Both compute in double precision, so
+    the backend changes the results only by round-off.
+    """
+    if backend not in ("numpy", "fortran", "auto"):
+        raise ValueError(f"unknown backend: {backend}")
+    if backend == "fortran" or (backend == "auto" and kick == "before" and fortran.available()):
+        return _fortran_trajectory(u, v, x, y, f, dt, ntot, events, uzero, vzero, scheme, kick)
+
+    W, _ = _velocity(u + 1j * v, multiplier(f, dt, scheme), impulse_series(events, ntot), kick)
+    xs, ys = _displacement(W, dt)
+    n = np.arange(ntot + 1)
+
+    return {
+        "time": n * dt,
+        "u": W.real,
+        "v": W.imag,
+        "x": x + xs + dt * n * uzero / 1000,
+        "y": y + ys + dt * n * vzero / 1000,
+    }
+
+
+def stream(u, v, x, y, f, dt, ntot, events=(), uzero=0.0, vzero=0.0,
+           scheme="exact", kick="before", block=streams.BLOCK, start=0, state=None):
+    """
+    trajectory() (NumPy backend) as consecutive blocks of at most `block`
+    rows, the first row of the first block being the initial state.
+
+    Every block is computed from the initial state with the absolute step
+    numbers, and the running sums of the impulses and of the positions
+    are carried from block to block in the order trajectory() adds them,
+    so the rows are bit-for-bit those of trajectory() whatever the block
+    size. Memory is bounded by the block size whatever ntot is.
+
+    start resumes a run at row start: u, v, x, y are still the initial
+    state, and the rows before start are computed (for the running sums)
+    but not yielded. state, a dict, avoids that: after every block the
+    running sums are stored in it ("impulses", the impulses in the
+    rotating frame, and "xsum", "ysum", the summed velocities), and given
+    the sums stored when row start was reached, the run continues from
+    there without computing the earlier rows.
+    """
+    R = multiplier(f, dt, scheme)
+    kicks = {}
+    for n, du, dv in events:
+        if not 1 <= n <= ntot:
+            raise ValueError(f"impulse at step {n} outside 1..{ntot}")
+        kicks[n] = kicks.get(n, 0.0) + du + 1j * dv
+
+    W0 = complex(u, v)
+    impulses, xsum, ysum = 0j, 0.0, 0.0
+    first = 0
+    if state and start:
+        impulses, xsum, ysum, first = state["impulses"], state["xsum"], state["ysum"], start
+    for begin in range(first, ntot + 1, block):
+        stop = min(begin + block, ntot + 1)
+        d = np.zeros(stop - begin, dtype=complex)
+        for n, dk in kicks.items():
+            if begin <= n < stop:
+                d[n - begin] += dk
+        W, impulses = _velocity(W0, R, d, kick, begin, impulses)
+
+        # Running sums of the displacement, which starts with the first step
+        dx, dy = W.real.copy(), W.imag.copy()
+        if begin == 0:
+            dx[0] = dy[0] = 0.0
+        dx[0] += xsum
+        dy[0] += ysum
+        np.cumsum(dx, out=dx)
+        np.cumsum(dy, out=dy)
+        xsum, ysum = dx[-1], dy[-1]
+        if state is not None:
+            state.update(impulses=impulses, xsum=xsum, ysum=ysum)
+        if stop <= start:
+            continue
+
+        n = np.arange(begin, stop)
+        rows = slice(max(start - begin, 0), None)
+        yield {"time": (n * dt)[rows], "u": W.real[rows], "v": W.imag[rows],
+               "x": (x + dt * dx / 1000 + dt * n * uzero / 1000)[rows],
+               "y": (y + dt * dy / 1000 + dt * n * vzero / 1000)[rows]}
+
+
+def ensemble(latitudes, schedules, drifts, dt, ntot, u=0.1, v=0.0, x=0.0, y=0.0,
+             scheme="exact", kick="before"):
+    """
+    Trajectories for every combination of latitude, impulse schedule and
+    background drift in one array computation.
+
+    latitudes: L latitudes in degrees; schedules: S lists of (step, du, dv)
+    impulses; drifts: D pairs (uzero, vzero) in m/s. The remaining
+    arguments are shared by all members, as in trajectory().
+
+    Returns a dict with "latitude" (L,), "f" (L,), "time" (ntot+1,),
+    "u" and "v" of shape (L, S, ntot+1), and the stacked positions "x"
+    and "y" (km) of shape (L, S, D, ntot+1). The drift only adds a
+    straight-line displacement, so it is broadcast onto the rotating part
+    instead of being recomputed per member.
+    """
+    latitudes = np.atleast_1d(np.asarray(latitudes, dtype=float))
+    f = coriolis_parameter(latitudes)
+    drifts = np.asarray(drifts, dtype=float).reshape(-1, 2)
+
+    d = np.stack([impulse_series(events, ntot) for events in schedules])   # (S, N)
+    R = multiplier(f, dt, scheme)[:, None]                                  # (L, 1)
+    W, _ = _velocity(u + 1j * v, R, d, kick)                                # (L, S, N)
+    xs, ys = _displacement(W, dt)
+
+    n = np.arange(ntot + 1)
+    xdrift = dt * n * drifts[:, 0, None] / 1000                             # (D, N)
+    ydrift = dt * n * drifts[:, 1, None] / 1000
+
+    return {
+        "latitude": latitudes,
+        "f": f,
+        "time": n * dt,
+        "u": W.real,
+        "v": W.imag,
+        "x": x + xs[:, :, None, :] + xdrift,
+        "y": y + ys[:, :, None, :] + ydrift,
+    }
+
+
+def drift_statistics(result):
+    """
+    Mean drift velocity (m/s) of every member over the whole run, i.e. the
+    net displacement divided by the elapsed time, and its speed.
+    """
+    T = result["time"][-1] - result["time"][0]
+    udrift = (result["x"][..., -1] - result["x"][..., 0]) * 1000 / T
+    vdrift = (result["y"][..., -1] - result["y"][..., 0]) * 1000 / T
+    return {"u": udrift, "v": vdrift, "speed": np.hypot(udrift, vdrift)}
+
+
+def _fortran_trajectory(u, v, x, y, f, dt, ntot, events, uzero, vzero, scheme, kick):
+    """ trajectory() computed by the REAL(8) FORTRAN kernel, with the initial state prepended. """
+    if kick != "before":
+        raise ValueError("the FORTRAN kernel only supports kick='before'")
+    if scheme not in SCHEMES:
+        raise ValueError(f"unknown scheme: {scheme}")
+    run = fortran.inertial_run(scheme, ntot, u, v, x, y, uzero, vzero, f / 2, dt, events, double=True)
+    start = {"time": 0.0, "u": u, "v": v, "x": x, "y": y}
+    return {key: np.concatenate([[start[key]], run[key]]).astype(float) for key in start}
+
+
+def _velocity(W0, R, d, kick, start=0, impulses=0.0):
+    """
+    Complex velocities W_n for multipliers R and impulse series d along
+    the last axis; R broadcasts against d's leading axes. start is the step
+    number of d[..., 0] and impulses the running sum of the weighted
+    impulses before it, for runs computed in blocks. Returns W and the
+    running sum after the last step.
+    """
+    n = np.arange(start, start + d.shape[-1])
+    R = np.asarray(R)[..., None]
+
+    # R^n from modulus and angle, so long runs don't accumulate round-off
+    growth, angle = np.log(np.abs(R)), np.angle(R)
+    power = np.exp(n * growth) * np.exp(1j * n * angle)
+    inverse = np.exp(-n * growth) * np.exp(-1j * n * angle)
+
+    if kick == "before":
+        weights = inverse * R
+    elif kick == "after":
+        weights = inverse
+    else:
+        raise ValueError("kick must be 'before' or 'after'")
+
+    weighted = weights * d
+    if start:
+        weighted[..., 0] += impulses
+    total = np.cumsum(weighted, axis=-1)
+    return power * (W0 + total), total[..., -1]
+
+
+def _displacement(W, dt):
+    """ Displacement (km) from the start due to the relative velocity W. """
+    xs = np.zeros(W.shape)
+    ys = np.zeros(W.shape)
+    np.cumsum(W.real[..., 1:], axis=-1, out=xs[..., 1:])
+    np.cumsum(W.imag[..., 1:], axis=-1, out=ys[..., 1:])
+    return dt * xs / 1000, dt * ys / 1000
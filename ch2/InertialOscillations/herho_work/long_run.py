@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""
+long_run.py
+
+Inertial oscillations over years of model time at minute resolution,
+streamed block by block (inertial.stream(), common/streams.py) into
+running statistics, so the run never exists in memory or on disk as a
+whole. Optionally the blocks are also written to --output (text for
+.txt/.csv, a binary run otherwise) and a thinned path is plotted to
+--plot.
+
+    python long_run.py --years 5 --dt 60 --plot path.png
+
+Sandy Herho, 2024
+"""
+
+import argparse
+import os
+import resource
+import sys
+
+import numpy as np
+
+import inertial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from common import streams, timings
+
+
+def with_speed(blocks):
+    """ Add the speed |(u, v)| to every block. """
+    for block in blocks:
+        block["speed"] = np.hypot(block["u"], block["v"])
+        yield block
+
+
+def main(years=1.0, dt=60.0, latitude=-90.0, scheme="exact", uzero=0.05, vzero=0.05,
+         output=None, plot=None, block=streams.BLOCK):
+    f = inertial.coriolis_parameter(latitude)
+    ntot = int(round(years * 365 * 24 * 3600 / dt))
+    blocks = with_speed(inertial.stream(0.1, 0.0, 0.0, 0.0, f, dt, ntot, uzero=uzero, vzero=vzero,
+                                        scheme=scheme, block=block))
+
+    stats = streams.Statistics(keys=("u", "v", "speed", "x", "y"))
+    sinks = [stats]
+    if output:
+        sinks.append(streams.FileSink(output, keys=("time", "u", "v", "x", "y"),
+                                      meta={"f": f, "dt": dt, "ntot": ntot, "scheme": scheme}))
+    if plot:
+        path = streams.Plotter("x", "y")
+        sinks.append(path)
+    streams.drain(blocks, *sinks)
+    timings.count("steps", ntot)
+
+    print(f"{ntot} steps of {dt:g} s ({years:g} years), latitude {latitude:g}, {scheme} scheme")
+    print(f"{'':>6} {'mean':>12} {'std':>12} {'min':>12} {'max':>12}")
+    for key, s in stats.result().items():
+        print(f"{key:>6} {s['mean']:>12.5g} {s['std']:>12.5g} {s['min']:>12.5g} {s['max']:>12.5g}")
+    print(f"peak memory {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    if plot:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        plt.style.use('bmh')
+        fig, ax = plt.subplots(figsize=(6, 6))
+        path.plot(ax, linewidth=1)
+        ax.set_xlabel('x (km)')
+        ax.set_ylabel('y (km)')
+        ax.set_title(f"every {path.stride}th of {ntot + 1} positions")
+        fig.savefig(plot, dpi=100)
+        plt.close(fig)
+
+
+if __name__ == "__main__":
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Streamed long run of inertial oscillations")
+    parser.add_argument("--years", type=float, default=1.0, help="length of the run")
+    parser.add_argument("--dt", type=float, default=60.0, help="time step (s)")
+    parser.add_argument("--latitude", type=float, default=-90.0,
+                        help="latitude (deg); -90 is the course's f = 2*freq")
+    parser.add_argument("--scheme", choices=inertial.SCHEMES, default="exact")
+    parser.add_argument("--drift", type=float, nargs=2, default=(0.05, 0.05), metavar=("U", "V"),
+                        help="ambient drift (m/s)")
+    parser.add_argument("--output", help="also write the run (.txt/.csv text, otherwise binary)")
+    parser.add_argument("--plot", help="PNG file for the thinned path")
+    parser.add_argument("--block", type=int, default=streams.BLOCK, help="rows per block")
+    args = parser.parse_args()
+    main(years=args.years, dt=args.dt, latitude=args.latitude, scheme=args.scheme,
+         uzero=args.drift[0], vzero=args.drift[1], output=args.output, plot=args.plot,
+         block=args.block)
@@ -0,0 +1,119 @@
+"""
+Checkpointed and restarted runs of iner_osci_v1.py write the bytes of
+the default run.
+"""
+
+import numpy as np
+import pytest
+
+import inertial
+import iner_osci_v1
+from common import checkpoint
+
+FILES = [filename for _, filename in iner_osci_v1.RUNS]
+
+
+def outputs(directory):
+    return {name: (directory / name).read_bytes() for name in FILES}
+
+
+@pytest.fixture
+def reference(tmp_path_factory, monkeypatch):
+    directory = tmp_path_factory.mktemp("plain")
+    monkeypatch.chdir(directory)
+    iner_osci_v1.main()
+    return outputs(directory)
+
+
+@pytest.mark.parametrize("every", [1, 7, 13, 50, 120, 500])
+def test_checkpoint_interval_does_not_change_output(every, reference, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    iner_osci_v1.main(checkpoint_every=every)
+    assert outputs(tmp_path) == reference
+    assert not (tmp_path / 'output_pyv1.ckpt.npz').exists()
+
+
+@pytest.mark.parametrize("every, crash, resume_every", [(7, 5, 7), (13, 12, 50), (50, 3, 1)])
+def test_restart_after_crash(every, crash, resume_every, reference, tmp_path, monkeypatch):
+    """ Die while writing the checkpoint after block `crash` (its rows are already written). """
+    monkeypatch.chdir(tmp_path)
+    write = checkpoint.Checkpoint.write
+    calls = []
+
+    def dying_write(self, *args, **kwargs):
+        calls.append(1)
+        if len(calls) == crash:
+            raise KeyboardInterrupt
+        write(self, *args, **kwargs)
+
+    monkeypatch.setattr(checkpoint.Checkpoint, "write", dying_write)
+    with pytest.raises(KeyboardInterrupt):
+        iner_osci_v1.main(checkpoint_every=every)
+    monkeypatch.setattr(checkpoint.Checkpoint, "write", write)
+
+    iner_osci_v1.main(checkpoint_every=resume_every, restart=True)
+    assert outputs(tmp_path) == reference
+
+
+@pytest.mark.parametrize("block", [1, 3, 40, 41, 4096])
+@pytest.mark.parametrize("scheme", inertial.SCHEMES)
+def test_stream_matches_trajectory_bitwise(block, scheme):
+    args = (0.1, 0.0, 0.0, 0.0, 2 * inertial.coriolis_parameter(-30.0), 4320.0, 120)
+    kwargs = {"events": inertial.IMPULSES, "uzero": 0.05, "vzero": 0.05, "scheme": scheme}
+    whole = inertial.trajectory(*args, **kwargs)
+    for start in (0, 1, 57):
+        blocks = list(inertial.stream(*args, **kwargs, block=block, start=start))
+        for key in whole:
+            np.testing.assert_array_equal(np.concatenate([b[key] for b in blocks]), whole[key][start:])
+
+
+@pytest.mark.parametrize("scheme", inertial.SCHEMES)
+def test_stream_resumes_from_its_running_sums(scheme):
+    args = (0.1, 0.0, 0.0, 0.0, 2 * inertial.coriolis_parameter(-30.0), 4320.0, 120)
+    kwargs = {"events": inertial.IMPULSES, "uzero": 0.05, "vzero": 0.05, "scheme": scheme}
+    whole = inertial.trajectory(*args, **kwargs)
+    state = {}
+    blocks = inertial.stream(*args, **kwargs, block=13, state=state)
+    for _ in range(3):
+        next(blocks)
+    resumed = list(inertial.stream(*args, **kwargs, block=7, start=39, state=dict(state)))
+    for key in whole:
+        np.testing.assert_array_equal(np.concatenate([b[key] for b in resumed]), whole[key][39:])
+
+
+def test_restart_does_not_recompute_earlier_steps(reference, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write = checkpoint.Checkpoint.write
+    calls = []
+
+    def dying_write(self, *args, **kwargs):
+        calls.append(1)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        write(self, *args, **kwargs)
+
+    monkeypatch.setattr(checkpoint.Checkpoint, "write", dying_write)
+    with pytest.raises(KeyboardInterrupt):
+        iner_osci_v1.main(checkpoint_every=20)
+    monkeypatch.setattr(checkpoint.Checkpoint, "write", write)
+
+    velocity = inertial._velocity
+    starts = []
+
+    def recording_velocity(W0, R, d, kick, start=0, impulses=0.0):
+        starts.append(start)
+        return velocity(W0, R, d, kick, start, impulses)
+
+    monkeypatch.setattr(inertial, "_velocity", recording_velocity)
+    iner_osci_v1.main(checkpoint_every=20, restart=True)
+    assert starts[0] == 40
+    assert outputs(tmp_path) == reference
+
+
+def test_multiplier_is_the_stepping_propagator():
+    f = inertial.coriolis_parameter(np.array([-90.0, -30.0, 10.0, 45.0]))
+    alpha, beta = f * 4320.0, 0.25 * (f * 4320.0) ** 2
+    np.testing.assert_allclose(inertial.multiplier(f, 4320.0, "exact"), np.exp(-1j * alpha), rtol=1e-15)
+    np.testing.assert_allclose(inertial.multiplier(f, 4320.0, "semi_implicit"),
+                               ((1 - beta) - 1j * alpha) / (1 + beta), rtol=1e-15)
+    assert np.ndim(inertial.multiplier(f[0], 4320.0)) == 0
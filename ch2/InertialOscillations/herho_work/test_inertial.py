@@ -0,0 +1,45 @@
+"""
+inertial.ensemble() members are the trajectories of their parameters.
+"""
+
+import numpy as np
+import pytest
+
+import inertial
+
+LATITUDES = [-90.0, -30.0, 10.0, 45.0]
+SCHEDULES = [[], inertial.IMPULSES, [(5, 0.2, 0.0), (5, 0.0, 0.1), (119, -0.1, 0.0)]]
+DRIFTS = [(0.0, 0.0), (0.05, 0.05), (-0.1, 0.02)]
+
+
+@pytest.mark.parametrize("scheme", inertial.SCHEMES)
+@pytest.mark.parametrize("kick", ["before", "after"])
+def test_members_are_trajectories(scheme, kick):
+    result = inertial.ensemble(LATITUDES, SCHEDULES, DRIFTS, 4320.0, 120, u=0.1, x=1.0, y=-2.0,
+                               scheme=scheme, kick=kick)
+    assert result["u"].shape == (4, 3, 121)
+    assert result["x"].shape == (4, 3, 3, 121)
+    np.testing.assert_array_equal(result["f"], inertial.coriolis_parameter(np.array(LATITUDES)))
+    for l, latitude in enumerate(LATITUDES):
+        for s, events in enumerate(SCHEDULES):
+            for d, (uzero, vzero) in enumerate(DRIFTS):
+                member = inertial.trajectory(0.1, 0.0, 1.0, -2.0, result["f"][l], 4320.0, 120,
+                                             events=events, uzero=uzero, vzero=vzero, scheme=scheme,
+                                             kick=kick)
+                np.testing.assert_array_equal(result["time"], member["time"])
+                np.testing.assert_allclose(result["u"][l, s], member["u"], rtol=1e-13, atol=1e-15)
+                np.testing.assert_allclose(result["v"][l, s], member["v"], rtol=1e-13, atol=1e-15)
+                np.testing.assert_allclose(result["x"][l, s, d], member["x"], rtol=1e-13, atol=1e-12)
+                np.testing.assert_allclose(result["y"][l, s, d], member["y"], rtol=1e-13, atol=1e-12)
+
+
+def test_drift_statistics():
+    """ Whole inertial periods without impulses: the mean drift is the background drift. """
+    f = inertial.coriolis_parameter(np.array([30.0]))
+    period = 2 * np.pi / abs(f[0])
+    result = inertial.ensemble([30.0], [[]], DRIFTS, period / 288, 288 * 3)
+    drift = inertial.drift_statistics(result)
+    assert drift["u"].shape == (1, 1, 3)
+    np.testing.assert_allclose(drift["u"][0, 0], [d[0] for d in DRIFTS], atol=1e-12)
+    np.testing.assert_allclose(drift["v"][0, 0], [d[1] for d in DRIFTS], atol=1e-12)
+    np.testing.assert_allclose(drift["speed"], np.hypot(drift["u"], drift["v"]))
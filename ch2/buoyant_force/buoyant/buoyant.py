@@ -1,14 +1,17 @@
 #!/usr/bin/env python
 
+import argparse
+import os
+import sys
+
 import numpy as np
 
-# Define the density function to calculate ambient density
-def density(zin, N2in):
-    rhos = 1025.0
-    g = 9.81
-    return rhos * (1 - N2in / g * zin)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+import parcels
+from common import simio, timings
 
-def main():
+def main(profile=None, binary=False):
     # Initialization of variables and parameters
     z = -80.0       # initial location is 80 m below sea surface
     w = 0.0         # no vertical speed at time zero
@@ -19,32 +22,36 @@ def main():
     r = 0.0         # friction parameter
     ntot = int(3600 / dt)  # total number of iterations
 
+    # The single parcel is a batch of one in the shared simulator
+    with timings.stage("compute"):
+        result = parcels.simulate(z, rho, N2, r, w=w, dt=dt, ntot=ntot, nout=10, g=g,
+                                  profile=profile)
+    timings.count("steps", ntot)
+
     # File handling
-    with open('output_python.txt', 'w') as file:
-        # Write initial conditions to file
-        file.write(f"{0:12.4f}{z:12.4f}{w:12.4f}{rho-1000:12.4f}\n")
-
-        # Start of iteration
-        for n in range(1, ntot + 1):
-            rhosea = density(z, N2)      # determine ambient density at current location
-            bf = -g * (rho - rhosea) / rho  # calculate buoyancy force
-            wn = (w + dt * bf) / (1 + r * dt)  # predict new vertical speed
-            zn = z + dt * wn              # predict new location
-            zn = min(zn, 0.0)             # location constrained by sea surface
-            zn = max(zn, -100.0)          # location constrained by seafloor
-
-            # Update Z and W for next time step
-            w = wn
-            z = zn
-            time = n * dt
-
-            # Write to file every 10 time steps
-            if n % 10 == 0:
-                file.write(f"{time:12.4f}{z:12.4f}{w:12.4f}{rho-1000:12.4f}\n")
+    if binary:
+        simio.save('output_python', {"time": result["time"], "z": result["z"][:, 0],
+                                     "w": result["w"][:, 0],
+                                     "rho": np.full(len(result["time"]), rho - 1000)},
+                   meta={"z0": z, "dt": dt, "ntot": ntot, "rho": rho, "N2": N2, "r": r})
+    else:
+        with timings.stage("write"), open('output_python.txt', 'w') as file:
+            # Write initial conditions and every 10th time step to file
+            for time, zn, wn in zip(result["time"], result["z"][:, 0], result["w"][:, 0]):
+                file.write(f"{time:12.4f}{zn:12.4f}{wn:12.4f}{rho-1000:12.4f}\n")
+        timings.count_file('output_python.txt')
 
     # End of program
     print(" *** Simulation completed *** ")
 
 if __name__ == "__main__":
-    main()
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Buoyancy oscillation")
+    parser.add_argument("--profile", help="text file with z (m) and rho (kg/m^3) columns "
+                                          "to use instead of the constant-N2 profile")
+    parser.add_argument("--binary", action="store_true",
+                        help="write output_python.npy/.json instead of text")
+    args = parser.parse_args()
+    main(profile=parcels.DensityProfile.from_file(args.profile) if args.profile else None,
+         binary=args.binary)
 
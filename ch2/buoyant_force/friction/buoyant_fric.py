@@ -1,14 +1,61 @@
 #!/usr/bin/env python
 
+import argparse
+import hashlib
+import os
+import sys
+
 import numpy as np
 
-# Define the density function to calculate ambient density
-def density(zin, N2in):
-    rhos = 1025.0
-    g = 9.81
-    return rhos * (1 - N2in / g * zin)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+import parcels
+from common import checkpoint, simio, timings
+
+def run_checkpointed(z, w, rho, N2, r, dt, ntot, g, profile, every, restart,
+                     filename='output_python.txt'):
+    """
+    The stepping run of main() with text output, written block by block
+    with a checkpoint of the parcel state, the step and the output cursor
+    after every `every` steps (a multiple of the 10-step output interval).
+    restart continues from the last checkpoint; the output is then the
+    same as that of an uninterrupted run. The checkpoint is removed when
+    the run completes.
+    """
+    nout = 10
+    if every % nout:
+        raise ValueError(f"checkpoint interval {every} is not a multiple of {nout} steps")
+    params = {"z": z, "w": w, "rho": rho, "N2": N2, "r": r, "dt": dt, "ntot": ntot, "g": g,
+              "profile": None if profile is None else hashlib.sha1(profile.coef.tobytes()).hexdigest()}
+    ckpt = checkpoint.Checkpoint(filename + '.ckpt.npz', every, params)
+
+    start, cursor = 0, None
+    saved = ckpt.resume() if restart else None
+    if saved is not None:
+        start, state, cursor = saved
+        z, w = state["z"], state["w"]
+        print(f"Restarting at step {start}")
 
-def main():
+    # A resumed stream starts with the checkpointed row, which is already written
+    first = 1 if start else 0
+    with checkpoint.reopen(filename, cursor) as file:
+        blocks = parcels.stream(z, rho, N2, r, w=w, dt=dt, ntot=ntot, nout=nout, g=g,
+                                profile=profile, block=every // nout, start=start)
+        for block in timings.iterate(blocks, "compute"):
+            with timings.stage("write"):
+                for time, zn, wn in zip(block["time"][first:], block["z"][first:, 0],
+                                        block["w"][first:, 0]):
+                    file.write(f"{time:12.4f}{zn:12.4f}{wn:12.4f}{rho-1000:12.4f}\n")
+                file.flush()
+            first = 0
+            step = int(round(block["time"][-1] / dt))
+            if step < ntot:
+                ckpt.write(step, {"z": block["z"][-1], "w": block["w"][-1]}, cursor=file.tell())
+    timings.count("steps", ntot - start)
+    timings.count_file(filename)
+    ckpt.clear()
+
+def main(exact=False, profile=None, binary=False, checkpoint_every=None, restart=False, drag=None):
     # Initialization of variables and parameters
     z = -80.0       # initial location is 80 m below sea surface
     w = 0.0         # no vertical speed at time zero
@@ -19,32 +66,69 @@ def main():
     r = 0.02         # friction parameter
     ntot = int(3600 / dt)  # total number of iterations
 
+    if checkpoint_every or restart:
+        if exact or binary or drag is not None:
+            raise ValueError("checkpoints are only written for the stepping run with text output")
+        run_checkpointed(z, w, rho, N2, r, dt, ntot, g, profile, checkpoint_every or 600, restart)
+        print(" *** Simulation completed *** ")
+        return
+
+    # The single parcel is a batch of one in the shared simulator, is moved
+    # with the exact propagator of the damped oscillator between outputs, or
+    # with adaptive steps when there is quadratic drag
+    if drag is not None:
+        if exact:
+            raise ValueError("the exact propagator has no quadratic drag")
+        with timings.stage("compute"):
+            result = parcels.simulate_adaptive(z, rho, N2, r, cd=drag, w=w, t_end=ntot * dt,
+                                               dt_out=10 * dt, g=g, profile=profile)
+        timings.count("steps", result["steps"])
+        print(f" {result['steps']} adaptive steps instead of {ntot}")
+    elif exact:
+        if profile is not None:
+            raise ValueError("the exact propagator needs the constant-N2 profile")
+        with timings.stage("compute"):
+            result = parcels.simulate_exact(z, rho, N2, r, w=w, t_end=ntot * dt, dt_out=10 * dt, g=g)
+    else:
+        with timings.stage("compute"):
+            result = parcels.simulate(z, rho, N2, r, w=w, dt=dt, ntot=ntot, nout=10, g=g,
+                                      profile=profile)
+        timings.count("steps", ntot)
+
     # File handling
-    with open('output_python.txt', 'w') as file:
-        # Write initial conditions to file
-        file.write(f"{0:12.4f}{z:12.4f}{w:12.4f}{rho-1000:12.4f}\n")
-
-        # Start of iteration
-        for n in range(1, ntot + 1):
-            rhosea = density(z, N2)      # determine ambient density at current location
-            bf = -g * (rho - rhosea) / rho  # calculate buoyancy force
-            wn = (w + dt * bf) / (1 + r * dt)  # predict new vertical speed
-            zn = z + dt * wn              # predict new location
-            zn = min(zn, 0.0)             # location constrained by sea surface
-            zn = max(zn, -100.0)          # location constrained by seafloor
-
-            # Update Z and W for next time step
-            w = wn
-            z = zn
-            time = n * dt
-
-            # Write to file every 10 time steps
-            if n % 10 == 0:
-                file.write(f"{time:12.4f}{z:12.4f}{w:12.4f}{rho-1000:12.4f}\n")
+    if binary:
+        simio.save('output_python', {"time": result["time"], "z": result["z"][:, 0],
+                                     "w": result["w"][:, 0],
+                                     "rho": np.full(len(result["time"]), rho - 1000)},
+                   meta={"z0": z, "dt": dt, "ntot": ntot, "rho": rho, "N2": N2, "r": r})
+    else:
+        with timings.stage("write"), open('output_python.txt', 'w') as file:
+            # Write initial conditions and every 10th time step to file
+            for time, zn, wn in zip(result["time"], result["z"][:, 0], result["w"][:, 0]):
+                file.write(f"{time:12.4f}{zn:12.4f}{wn:12.4f}{rho-1000:12.4f}\n")
+        timings.count_file('output_python.txt')
 
     # End of program
     print(" *** Simulation completed *** ")
 
 if __name__ == "__main__":
-    main()
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Buoyancy oscillation with friction")
+    parser.add_argument("--exact", action="store_true",
+                        help="integrate with the exact propagator instead of 1-second steps")
+    parser.add_argument("--profile", help="text file with z (m) and rho (kg/m^3) columns "
+                                          "to use instead of the constant-N2 profile")
+    parser.add_argument("--binary", action="store_true",
+                        help="write output_python.npy/.json instead of text")
+    parser.add_argument("--drag", type=float, metavar="CD",
+                        help="add quadratic drag CD*|w|*w (CD in 1/m), integrated with adaptive steps")
+    parser.add_argument("--checkpoint-every", type=int, metavar="STEPS",
+                        help="checkpoint the run to output_python.txt.ckpt.npz every STEPS steps")
+    parser.add_argument("--restart", action="store_true",
+                        help="continue from the last checkpoint, if there is one")
+    args = parser.parse_args()
+    main(exact=args.exact,
+         profile=parcels.DensityProfile.from_file(args.profile) if args.profile else None,
+         binary=args.binary, checkpoint_every=args.checkpoint_every, restart=args.restart,
+         drag=args.drag)
 
@@ -1,19 +1,44 @@
 #!/usr/bin/env python
 
+import argparse
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 import matplotlib
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+import parcels
+from common import cache, gifenc, simio, timings
+
 # Ensure that the appropriate writer is available
 matplotlib.use("Agg")
 plt.style.use('bmh')
 
-def animate():
+# The run of buoyant_fric.py, for --cached
+RUN = {"z": -80.0, "w": 0.0, "dt": 1.0, "rho": 1025.5, "g": 9.81, "N2": 1.0e-4, "r": 0.02,
+       "ntot": 3600, "nout": 10}
+
+def compute(**params):
+    """ time, z, w, rho columns of a single-parcel run, as in output_python.txt. """
+    result = parcels.simulate(**params)
+    return {"time": result["time"], "z": result["z"][:, 0], "w": result["w"][:, 0],
+            "rho": np.full(len(result["time"]), params["rho"] - 1000)}
+
+def cached_run(settings=None):
+    """ The rows of the run of buoyant_fric.py (changed by NAME=VALUE settings) from the result cache. """
+    params = cache.overrides(RUN, settings)
+    return cache.fetch("parcels.simulate", params, compute, sources=[__file__, parcels]).rows()
+
+def animate(filename="./output_fortran.txt", data=None):
     fig, ax = plt.subplots()
     fig.set_size_inches(10, 5)
 
-    data = np.loadtxt("./output_fortran.txt")  # Load data
+    if data is None:
+        data = simio.load(filename, names=('time', 'z', 'w', 'rho')).rows()  # Load text or binary run
 
     ax.set_xlim(0, 60)  # Set time range in minutes
     ax.set_ylim(-100, 0)
@@ -51,11 +76,21 @@ def animate():
 
         return title_text, time_text
 
-    ani = FuncAnimation(fig, update, frames=len(data), init_func=init, blit=False, repeat=False)
+    ani = FuncAnimation(fig, timings.wrap(update, "update"), frames=len(data), init_func=init, blit=False, repeat=False)
 
     # Save the animation
-    ani.save('./oscillation_animation.gif', writer='imagemagick', fps=10)
+    ani.save('./oscillation_animation.gif', writer=timings.writer(gifenc.writer(fps=10, colors=['red', 'blue'])))
 
 if __name__ == '__main__':
-    animate()
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Animated depth of the buoyant parcel with friction")
+    parser.add_argument("filename", nargs="?", default="./output_fortran.txt",
+                        help="text output, or a binary run such as output_python.npy")
+    parser.add_argument("--cached", action="store_true",
+                        help="animate the run of buoyant_fric.py from the result cache, computed "
+                             "if it isn't there, instead of reading a file")
+    parser.add_argument("--set", action="append", metavar="NAME=VALUE",
+                        help=f"change a parameter of the cached run ({', '.join(RUN)})")
+    args = parser.parse_args()
+    animate(args.filename, data=cached_run(args.set) if args.cached else None)
 
@@ -0,0 +1,56 @@
+"""
+Checkpointed and restarted runs of buoyant_fric.py write the bytes of
+the plain run.
+"""
+
+import pytest
+
+import buoyant_fric
+from common import checkpoint
+
+FILENAME = 'output_python.txt'
+
+
+@pytest.fixture
+def reference(tmp_path_factory, monkeypatch):
+    directory = tmp_path_factory.mktemp("plain")
+    monkeypatch.chdir(directory)
+    buoyant_fric.main()
+    return (directory / FILENAME).read_bytes()
+
+
+@pytest.mark.parametrize("every", [10, 70, 600, 5000])
+def test_checkpoint_interval_does_not_change_output(every, reference, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    buoyant_fric.main(checkpoint_every=every)
+    assert (tmp_path / FILENAME).read_bytes() == reference
+    assert not (tmp_path / (FILENAME + '.ckpt.npz')).exists()
+
+
+@pytest.mark.parametrize("every, crash, resume_every", [(600, 2, 600), (70, 9, 10), (10, 300, 1000)])
+def test_restart_after_crash(every, crash, resume_every, reference, tmp_path, monkeypatch):
+    """ Die while writing the checkpoint after block `crash` (its rows are already written). """
+    monkeypatch.chdir(tmp_path)
+    write = checkpoint.Checkpoint.write
+    calls = []
+
+    def dying_write(self, *args, **kwargs):
+        calls.append(1)
+        if len(calls) == crash:
+            raise KeyboardInterrupt
+        write(self, *args, **kwargs)
+
+    monkeypatch.setattr(checkpoint.Checkpoint, "write", dying_write)
+    with pytest.raises(KeyboardInterrupt):
+        buoyant_fric.main(checkpoint_every=every)
+    monkeypatch.setattr(checkpoint.Checkpoint, "write", write)
+    assert (tmp_path / FILENAME).read_bytes() != reference
+
+    buoyant_fric.main(checkpoint_every=resume_every, restart=True)
+    assert (tmp_path / FILENAME).read_bytes() == reference
+
+
+def test_interval_must_be_a_multiple_of_the_output_interval(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(ValueError, match="multiple"):
+        buoyant_fric.main(checkpoint_every=15)
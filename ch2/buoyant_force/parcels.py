@@ -0,0 +1,466 @@
+"""
+parcels.py
+
+Batch version of the buoyancy oscillation models in buoyant/ and friction/.
+Any number of parcels are advanced together, each with its own density
+rho, ambient stability N2, friction r and starting depth z. The update is
+the same semi-implicit scheme as in buoyant.py / buoyant_fric.py:
+
+    bf = -g*(rho - density(z, N2))/rho
+    w  = (w + dt*bf)/(1 + r*dt)
+    z  = min(max(z + dt*w, -100), 0)
+
+Sandy Herho, 2024
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common import stepping, streams
+
+GRAVITY = 9.81      # gravity
+SURFACE = 0.0       # sea surface
+SEAFLOOR = -100.0   # seafloor
+MAX_LEVELS = 1 << 20   # levels of a DensityProfile table (8 MB per coefficient)
+
+# Define the density function to calculate ambient density
+def density(zin, N2in):
+    rhos = 1025.0
+    g = 9.81
+    return rhos * (1 - N2in / g * zin)
+
+class DensityProfile:
+    """
+    Ambient density tabulated once on a uniform grid in z.
+
+    Samples (z, rho), e.g. from a CTD cast, are resampled onto levels
+    z0 + i*dz. A lookup then computes the cell index directly from z, so
+    it costs the same for any number of levels and works on whole arrays
+    of parcel depths. kind="linear" interpolates linearly within a cell,
+    kind="cubic" uses a cubic Hermite spline whose per-cell coefficients
+    are also precomputed; its slopes are fourth-order differences, so a
+    cubic profile is reproduced exactly. Depths outside the table take the
+    end values.
+
+    The samples must have distinct depths. dz defaults to the smallest
+    gap between them, but never less than the spacing of MAX_LEVELS
+    levels; an explicit dz that needs more levels is an error.
+
+    An instance is called like density(z, N2) (N2 is ignored), so it can
+    be passed to simulate() as the ambient profile.
+    """
+
+    def __init__(self, z, rho, dz=None, kind="linear"):
+        z = np.asarray(z, dtype=float)
+        rho = np.asarray(rho, dtype=float)
+        order = np.argsort(z)
+        z, rho = z[order], rho[order]
+        if z.size < 2:
+            raise ValueError("a density profile needs at least two samples")
+        gaps = np.diff(z)
+        if not (gaps > 0).all():
+            raise ValueError(f"duplicate depths in the density profile: {np.unique(z[1:][gaps <= 0])}")
+        if dz is None:
+            dz = max(gaps.min(), (z[-1] - z[0]) / (MAX_LEVELS - 1))
+        if not dz > 0:
+            raise ValueError(f"level spacing must be positive, got dz={dz}")
+        if kind not in ("linear", "cubic"):
+            raise ValueError(f"unknown interpolation kind: {kind}")
+
+        self.kind = kind
+        self.z0 = z[0]
+        self.dz = float(dz)
+        # Enough levels to cover the samples, not one more for a round-off excess
+        self.nlev = int(np.ceil((z[-1] - z[0]) / self.dz - 1e-9)) + 1
+        if self.nlev > MAX_LEVELS:
+            raise ValueError(f"dz={dz} needs {self.nlev} levels, more than MAX_LEVELS={MAX_LEVELS}")
+        levels = self.z0 + self.dz * np.arange(self.nlev)
+        table = np.interp(levels, z, rho)
+
+        if kind == "linear":
+            self.coef = np.stack([table[:-1], np.diff(table)])
+        else:
+            # Cubic Hermite cells with slopes per cell width
+            slope = _slopes(table)
+            p0, p1 = table[:-1], table[1:]
+            m0, m1 = slope[:-1], slope[1:]
+            self.coef = np.stack([p0, m0,
+                                  3.0 * (p1 - p0) - 2.0 * m0 - m1,
+                                  2.0 * (p0 - p1) + m0 + m1])
+
+    @classmethod
+    def linear(cls, N2, zmin=SEAFLOOR, zmax=SURFACE, dz=0.1):
+        """ Tabulate the constant-N2 profile of density(). """
+        z = np.linspace(zmin, zmax, int(round((zmax - zmin) / dz)) + 1)
+        return cls(z, density(z, N2), dz=dz)
+
+    @classmethod
+    def from_file(cls, filename, dz=None, kind="linear"):
+        """ Build a profile from a text file with columns z (m) and rho (kg/m^3). """
+        data = np.loadtxt(filename)
+        return cls(data[:, 0], data[:, 1], dz=dz, kind=kind)
+
+    def __call__(self, z, N2=None):
+        s = np.clip((np.asarray(z, dtype=float) - self.z0) / self.dz, 0.0, self.nlev - 1)
+        i = np.minimum(s.astype(np.intp), self.nlev - 2)
+        s -= i
+        c = self.coef[:, i]
+        if self.kind == "linear":
+            return c[0] + s * c[1]
+        return c[0] + s * (c[1] + s * (c[2] + s * c[3]))
+
+
+def _slopes(table):
+    """
+    Derivatives (per level) of the tabulated values from fourth-order
+    differences, exact for cubics: centred five-point differences inside,
+    one-sided four-point ones at the two levels next to each end. Tables
+    of fewer than four levels get the centred differences of np.gradient().
+    """
+    n = len(table)
+    if n < 4:
+        return np.gradient(table)
+    f = table
+    slope = np.empty(n)
+    slope[2:-2] = (f[:-4] - 8.0 * f[1:-3] + 8.0 * f[3:-1] - f[4:]) / 12.0
+    slope[0] = (-11.0 * f[0] + 18.0 * f[1] - 9.0 * f[2] + 2.0 * f[3]) / 6.0
+    slope[1] = (-2.0 * f[0] - 3.0 * f[1] + 6.0 * f[2] - f[3]) / 6.0
+    slope[-2] = (f[-4] - 6.0 * f[-3] + 3.0 * f[-2] + 2.0 * f[-1]) / 6.0
+    slope[-1] = (-2.0 * f[-4] + 9.0 * f[-3] - 18.0 * f[-2] + 11.0 * f[-1]) / 6.0
+    return slope
+
+
+def simulate(z, rho, N2, r, w=0.0, dt=1.0, ntot=3600, nout=10, g=GRAVITY, out_dtype=float,
+             profile=None):
+    """
+    Advance a batch of parcels for ntot time steps.
+
+    z, rho, N2, r and w are scalars or arrays that broadcast to the number
+    of parcels. Output is recorded at step 0 and every nout steps, as in
+    the single-parcel scripts. profile is an optional DensityProfile that
+    replaces the constant-N2 density() as the ambient density.
+
+    Returns a dict with "time" of shape (n_out,), "z" and "w" of shape
+    (n_out, n_parcels) stored as out_dtype, and the per-parcel "rho".
+    The output is allocated once and each row written in place.
+    """
+    nrows = ntot // nout + 1
+    z, rho, N2, r, w = _batch(z, rho, N2, r, w)
+    out = {"time": np.arange(nrows) * nout * dt,
+           "z": np.empty((nrows, z.size), dtype=out_dtype),
+           "w": np.empty((nrows, z.size), dtype=out_dtype),
+           "rho": rho}
+    for row, zn, wn in _steps(z, rho, N2, r, w, dt, ntot, nout, g, profile):
+        out["z"][row] = zn
+        out["w"][row] = wn
+    return out
+
+
+def stream(z, rho, N2, r, w=0.0, dt=1.0, ntot=3600, nout=10, g=GRAVITY, profile=None,
+           block=streams.BLOCK, start=0, budget=streams.BUDGET):
+    """
+    simulate() as consecutive blocks of at most `block` output rows, each
+    a dict with "time" (rows,), "z" and "w" (rows, n_parcels). Blocks of
+    many parcels are shorter, so that "z" and "w" together take at most
+    budget bytes: memory is bounded whatever ntot and the number of
+    parcels are.
+
+    start resumes a run: z and w are then the state after step start (a
+    multiple of nout), which is also the first row yielded.
+    """
+    if start % nout:
+        raise ValueError(f"start step {start} is not a multiple of the output interval {nout}")
+    z, rho, N2, r, w = _batch(z, rho, N2, r, w)
+    block = streams.block_rows(z.size, arrays=2, budget=budget, block=block)
+    nrows = ntot // nout + 1
+    out, first = None, start // nout
+    for row, zn, wn in _steps(z, rho, N2, r, w, dt, ntot, nout, g, profile, start):
+        if out is None:
+            rows = min(block, nrows - row)
+            out = {"time": np.arange(row, row + rows) * nout * dt,
+                   "z": np.empty((rows, z.size)), "w": np.empty((rows, z.size))}
+            first = row
+        out["z"][row - first] = zn
+        out["w"][row - first] = wn
+        if row - first + 1 == len(out["time"]):
+            yield out
+            out = None
+
+
+def _batch(z, rho, N2, r, w):
+    """ The parameters as float arrays, one value per parcel (copies, so z and w can be updated). """
+    return tuple(np.array(a, dtype=float) for a in
+                 np.broadcast_arrays(np.atleast_1d(z), rho, N2, r, w))
+
+
+def _steps(z, rho, N2, r, w, dt, ntot, nout, g, profile, start=0):
+    """
+    Advance the batch (z and w in place) from step start to ntot, yielding
+    (output row, z, w) at start and every nout steps after it. The arrays
+    yielded are the live state: copy them before the next step.
+    """
+    bf = np.empty_like(z)
+    ambient = density if profile is None else profile
+    yield start // nout, z, w
+
+    # Start of iteration
+    for n in range(start + 1, ntot + 1):
+        rhosea = ambient(z, N2)                   # ambient density at every parcel
+        np.subtract(rho, rhosea, out=bf)          # buoyancy force
+        bf *= -g
+        bf /= rho
+        w = stepping.semi_implicit(w, bf, r, dt)  # new vertical speeds
+        z += dt * w                               # new locations
+        np.clip(z, SEAFLOOR, SURFACE, out=z)      # constrained by surface and seafloor
+
+        if n % nout == 0:
+            yield n // nout, z, w
+
+
+def linear_coefficients(rho, N2, g=GRAVITY):
+    """
+    Coefficients of the buoyancy force bf(z) = b0 - k*z for the linear
+    ambient profile in density(), so that dz/dt = w, dw/dt = b0 - k*z - r*w.
+    """
+    rhos0 = density(0.0, N2)
+    k = -g * (density(1.0, N2) - rhos0) / rho
+    b0 = -g * (rho - rhos0) / rho
+    return b0, k
+
+
+def simulate_exact(z, rho, N2, r, w=0.0, t_end=3600.0, dt_out=10.0, g=GRAVITY):
+    """
+    Integrate one parcel with the exact propagator of the damped oscillator
+    instead of fixed time steps.
+
+    Between boundary contacts the state is moved with exp(A t) evaluated in
+    closed form, so the cost does not depend on the length of the run. When
+    the parcel reaches the surface or the seafloor the contact time is found
+    by bisection on the exact solution. While the parcel is held at a
+    boundary, z stays fixed and w follows dw/dt = bf(wall) - r*w exactly,
+    as the min/max clamps do in the stepping scheme, until w turns away
+    from the boundary and the parcel is released. The propagator assumes
+    the linear ambient profile of density(); tabulated profiles need
+    simulate().
+
+    Returns the same dict as simulate() for one parcel, sampled every
+    dt_out seconds, plus "events", a list of (time, depth, "contact" or
+    "release") tuples.
+    """
+    b0, k = linear_coefficients(rho, N2, g)
+    A = np.array([[0.0, 1.0], [-k, -r]])
+    b = np.array([0.0, b0])
+
+    times = np.arange(int(round(t_end / dt_out)) + 1) * dt_out
+    zout = np.empty((len(times), 1))
+    wout = np.empty((len(times), 1))
+    events = []
+
+    z = min(max(z, SEAFLOOR), SURFACE)
+    y = np.array([z, w], dtype=float)
+    wall = _held_at(y, b0 - k * y[0])
+    t = 0.0
+    i = 0
+    while i < len(times):
+        if wall is None:
+            s_hit, wall = _next_contact(y, A, b, k, r, t_end - t, dt_out)
+            t_next = t + s_hit if wall is not None else np.inf
+            j = np.searchsorted(times, t_next, side='right')
+            Y = _free(y, A, b, k, times[i:j] - t)
+            if wall is not None:
+                y = _free(y, A, b, k, np.array([s_hit]))[0]
+                y[0] = wall
+                events.append((t_next, wall, "contact"))
+        else:
+            force = b0 - k * wall
+            s_rel = _release_time(y[1], force, r, wall)
+            t_next = t + s_rel
+            j = np.searchsorted(times, t_next, side='right')
+            Y = np.empty((j - i, 2))
+            Y[:, 0] = wall
+            Y[:, 1] = _held_speed(y[1], force, r, times[i:j] - t)
+            if np.isfinite(t_next):
+                y = np.array([wall, 0.0])
+                events.append((t_next, wall, "release"))
+                wall = None
+        zout[i:j, 0] = Y[:, 0]
+        wout[i:j, 0] = Y[:, 1]
+        i = j
+        t = t_next
+
+    return {"time": times, "z": zout, "w": wout, "rho": np.array([rho]), "events": events}
+
+
+def simulate_adaptive(z, rho, N2, r=0.0, cd=0.0, w=0.0, t_end=3600.0, dt_out=10.0, g=GRAVITY,
+                      profile=None, rtol=1e-6, atol=1e-8):
+    """
+    Integrate one parcel with linear friction r and quadratic drag cd (1/m),
+
+        dz/dt = w,   dw/dt = bf(z) - r*w - cd*|w|*w,
+
+    with the adaptive Dormand-Prince scheme (stepping.DormandPrince)
+    instead of fixed time steps, so the step grows where the parcel
+    settles. The surface and seafloor clamps are events: a contact is
+    located on the step's dense output by bisection, and the parcel is
+    held at the boundary, with z fixed and w following the equation
+    above at the wall, until w turns away from it, as in simulate_exact().
+    profile is an optional DensityProfile, as in simulate().
+
+    Returns the same dict as simulate_exact(), sampled every dt_out
+    seconds from the dense output, plus "steps", the number of accepted
+    steps.
+    """
+    ambient = density if profile is None else profile
+    wall = None
+
+    def rate(t, y):
+        zw = y[0] if wall is None else wall
+        bf = -g * (rho - ambient(zw, N2)) / rho
+        return (0.0 if wall is not None else y[1], bf - r * y[1] - cd * abs(y[1]) * y[1])
+
+    times = np.arange(int(round(t_end / dt_out)) + 1) * dt_out
+    zout = np.empty((len(times), 1))
+    wout = np.empty((len(times), 1))
+    events = []
+
+    y = np.array([min(max(z, SEAFLOOR), SURFACE), w], dtype=float)
+    wall = _held_at(y, rate(0.0, y)[1])
+    solver = stepping.DormandPrince(rate, 0.0, y, rtol=rtol, atol=atol)
+    zout[0, 0], wout[0, 0] = y
+    i = 1
+    while i < len(times):
+        t = solver.step(t_end)
+        # Contact when z leaves [SEAFLOOR, SURFACE], release when w turns away from the wall
+        crossed = None
+        if wall is None:
+            if solver.y[0] > SURFACE:
+                crossed = SURFACE
+            elif solver.y[0] < SEAFLOOR:
+                crossed = SEAFLOOR
+            if crossed is not None:
+                t = _bisect(solver, lambda y: y[0] - crossed)
+        elif (1.0 if wall == SURFACE else -1.0) * solver.y[1] <= 0.0:
+            crossed = wall
+            t = _bisect(solver, lambda y: y[1])
+        j = np.searchsorted(times, t, side='right')
+        Y = solver.dense(times[i:j])
+        zout[i:j, 0], wout[i:j, 0] = Y[:, 0], Y[:, 1]
+        i = j
+        if crossed is not None:
+            y = solver.dense(t)
+            if wall is None:
+                y[0] = wall = crossed
+                events.append((t, wall, "contact"))
+            else:
+                y = np.array([wall, 0.0])
+                events.append((t, wall, "release"))
+                wall = None
+            solver.restart(t, y)
+
+    return {"time": times, "z": zout, "w": wout, "rho": np.array([rho]), "events": events,
+            "steps": solver.nsteps}
+
+
+def _bisect(solver, side):
+    """ Time within the last step of solver where side(dense state) changes sign. """
+    lo, hi = solver.t_old, solver.t
+    sign = np.sign(side(solver.y_old))
+    for _ in range(100):
+        mid = 0.5 * (lo + hi)
+        if np.sign(side(solver.dense(mid))) == sign:
+            lo = mid
+        else:
+            hi = mid
+        if hi - lo <= 1.0e-12 * max(1.0, hi):
+            break
+    return hi
+
+
+def _free(y0, A, b, k, s):
+    """ Exact free-flight states (len(s), 2) at times s after state y0. """
+    if k != 0.0:
+        yeq = np.array([b[1] / k, 0.0])
+        return yeq + np.einsum('...ij,j->...i', stepping.expm2(A, s), y0 - yeq)
+    G, c = stepping.propagator("exponential", A, s[:, None, None], b)
+    return np.einsum('...ij,j->...i', G, y0) + c
+
+
+def _held_at(y, force):
+    """ Boundary the parcel is pressed against at state y (by w, or by force if w is 0), or None. """
+    for wall, side in ((SURFACE, 1.0), (SEAFLOOR, -1.0)):
+        if y[0] == wall:
+            push = y[1] if y[1] != 0.0 else force
+            if side * push > 0.0:
+                return wall
+    return None
+
+
+def _held_speed(w0, force, r, s):
+    """ Vertical speed while held at a boundary, s seconds after contact. """
+    if r == 0.0:
+        return w0 + force * s
+    winf = force / r
+    return winf + (w0 - winf) * np.exp(-r * s)
+
+
+def _release_time(w0, force, r, wall):
+    """ Time until the speed at a boundary turns away from it (inf if never). """
+    side = 1.0 if wall == SURFACE else -1.0
+    if side * w0 <= 0.0:
+        return 0.0
+    if r == 0.0:
+        return -w0 / force if side * force < 0.0 else np.inf
+    winf = force / r
+    if side * winf >= 0.0:
+        return np.inf
+    return -np.log(-winf / (w0 - winf)) / r
+
+
+def _next_contact(y0, A, b, k, r, horizon, dt_out):
+    """
+    Time (s, wall) of the first boundary contact within horizon seconds of
+    free flight from y0, or (inf, None). The solution is scanned on a grid
+    fine enough to resolve every oscillation, then the crossing is refined
+    by bisection.
+    """
+    h = dt_out
+    omega2 = k - 0.25 * r * r
+    envelope = None
+    if omega2 > 0.0:
+        omega = np.sqrt(omega2)
+        h = min(h, 2.0 * np.pi / omega / 16.0)
+        dz0 = y0[0] - b[1] / k
+        amp = np.hypot(dz0, (y0[1] + 0.5 * r * dz0) / omega)
+        envelope = lambda s: b[1] / k + np.array([-1.0, 1.0]) * amp * np.exp(-0.5 * r * s)
+
+    s0 = 0.0
+    chunk = 4096
+    while s0 < horizon:
+        if envelope is not None:
+            low, high = envelope(s0)
+            if low > SEAFLOOR and high < SURFACE:
+                break
+        s = np.minimum(s0 + h * np.arange(1, chunk + 1), horizon)
+        z = _free(y0, A, b, k, s)[:, 0]
+        out = np.flatnonzero((z > SURFACE) | (z < SEAFLOOR))
+        if out.size:
+            n = out[0]
+            wall = SURFACE if z[n] > SURFACE else SEAFLOOR
+            lo = s[n - 1] if n > 0 else s0
+            hi = s[n]
+            for _ in range(100):
+                mid = 0.5 * (lo + hi)
+                zm = _free(y0, A, b, k, np.array([mid]))[0, 0]
+                if (zm > SURFACE) if wall == SURFACE else (zm < SEAFLOOR):
+                    hi = mid
+                else:
+                    lo = mid
+                if hi - lo <= 1.0e-12 * max(1.0, hi):
+                    break
+            return hi, wall
+        s0 = s[-1]
+        chunk *= 2
+    return np.inf, None
@@ -0,0 +1,152 @@
+"""
+parcels.stream() blocks stay within their byte budget and add up to
+parcels.simulate(); DensityProfile tables reproduce the profiles they
+sample.
+"""
+
+import numpy as np
+import pytest
+
+import parcels
+from common import stepping, streams
+
+RHO = np.linspace(1024.0, 1026.0, 500)
+
+
+@pytest.mark.parametrize("block, start", [(streams.BLOCK, 0), (7, 0), (7, 50), (1, 30)])
+def test_stream_matches_simulate(block, start):
+    whole = parcels.simulate(-80.0, RHO, 1.0e-4, 0.01, ntot=1000, nout=10)
+    blocks = list(parcels.stream(-80.0, RHO, 1.0e-4, 0.01, ntot=1000, nout=10, block=block))
+    assert max(len(b["time"]) for b in blocks) <= block
+    for key in ("time", "z", "w"):
+        np.testing.assert_array_equal(streams.collect(blocks)[key], whole[key])
+    resumed = streams.collect(parcels.stream(whole["z"][start // 10], RHO, 1.0e-4, 0.01,
+                                             w=whole["w"][start // 10], ntot=1000, nout=10,
+                                             block=block, start=start))
+    np.testing.assert_array_equal(resumed["z"], whole["z"][start // 10:])
+
+
+def test_blocks_fit_the_budget():
+    budget = 100 * RHO.size * 8
+    blocks = list(parcels.stream(-80.0, RHO, 1.0e-4, 0.01, ntot=2000, nout=10, budget=budget))
+    assert all(b["z"].nbytes + b["w"].nbytes <= budget for b in blocks)
+    assert [len(b["time"]) for b in blocks] == [50] * 4 + [1]
+
+
+def cubic(z):
+    return 1025.0 + 0.3 * z / 100 + 0.2 * (z / 100) ** 2 - 0.7 * (z / 100) ** 3
+
+
+def test_linear_profile_is_density():
+    z = np.linspace(parcels.SEAFLOOR, parcels.SURFACE, 777)
+    profile = parcels.DensityProfile.linear(1.0e-4)
+    np.testing.assert_allclose(profile(z), parcels.density(z, 1.0e-4), rtol=1e-14)
+    assert profile(-30.0) == pytest.approx(parcels.density(-30.0, 1.0e-4), rel=1e-14)
+
+
+@pytest.mark.parametrize("levels", [4, 5, 41])
+def test_cubic_profile_is_exact_on_a_cubic(levels):
+    samples = np.linspace(-100.0, 0.0, levels)
+    profile = parcels.DensityProfile(samples[::-1], cubic(samples[::-1]), kind="cubic")
+    assert profile.nlev == levels
+    z = np.linspace(-100.0, 0.0, 1001)
+    np.testing.assert_allclose(profile(z), cubic(z), rtol=1e-14)
+
+
+@pytest.mark.parametrize("kind", ["linear", "cubic"])
+def test_depths_outside_the_profile_take_the_end_values(kind):
+    samples = np.linspace(-50.0, -10.0, 9)
+    profile = parcels.DensityProfile(samples, cubic(samples), kind=kind)
+    np.testing.assert_allclose(profile([-100.0, -50.0, -10.0, 0.0]),
+                               cubic(np.array([-50.0, -50.0, -10.0, -10.0])), rtol=1e-14)
+
+
+def test_profile_samples_are_checked():
+    with pytest.raises(ValueError, match="duplicate"):
+        parcels.DensityProfile([-100.0, -50.0, -50.0, 0.0], [1026.0, 1025.5, 1025.4, 1025.0])
+    with pytest.raises(ValueError, match="two samples"):
+        parcels.DensityProfile([-10.0], [1025.0])
+    with pytest.raises(ValueError, match="MAX_LEVELS"):
+        parcels.DensityProfile([-100.0, 0.0], [1026.0, 1025.0], dz=1e-6)
+
+    # One tiny gap no longer sets the level spacing of the whole table
+    z = np.array([-100.0, -50.0, -50.0 + 1e-9, 0.0])
+    profile = parcels.DensityProfile(z, cubic(z))
+    assert profile.nlev <= parcels.MAX_LEVELS
+    np.testing.assert_allclose(profile(-25.0), np.interp(-25.0, z, cubic(z)), rtol=1e-12)
+
+
+# (z, rho, r): free oscillations, and runs held at the surface or the seafloor and released
+RUNS = [(-80.0, 1025.5, 0.02), (-80.0, 1025.5, 0.0), (-80.0, 1025.1, 0.001), (-10.0, 1026.0, 0.001),
+        (-10.0, 1026.0, 0.01)]
+
+
+@pytest.mark.parametrize("z, rho, r", RUNS)
+def test_exact_propagator_reproduces_stepping(z, rho, r):
+    exact = parcels.simulate_exact(z, rho, 1.0e-4, r, t_end=3600.0, dt_out=10.0)
+    stepped = parcels.simulate(z, rho, 1.0e-4, r, dt=1.0, ntot=3600, nout=10)
+    np.testing.assert_array_equal(stepped["time"], exact["time"])
+    np.testing.assert_allclose(stepped["z"], exact["z"], atol=0.5)
+    np.testing.assert_allclose(stepped["w"], exact["w"], atol=2e-3)
+
+    # The stepping scheme is first order: a tenth of the step, a tenth of the difference
+    fine = parcels.simulate(z, rho, 1.0e-4, r, dt=0.1, ntot=36000, nout=100)
+    assert (np.abs(fine["z"] - exact["z"]).max()
+            <= 0.12 * np.abs(stepped["z"] - exact["z"]).max())
+
+    # The steps clamped at a wall are those between contact and release
+    every = parcels.simulate(z, rho, 1.0e-4, r, dt=1.0, ntot=3600, nout=1)["z"][:, 0]
+    held = np.flatnonzero((every == parcels.SURFACE) | (every == parcels.SEAFLOOR))
+    if not exact["events"]:
+        assert held.size == 0
+        return
+    (contact, wall, first), (release, _, second) = exact["events"]
+    assert (first, second) == ("contact", "release")
+    assert every[held[0]] == wall
+    assert abs(held[0] - contact) <= 1.0 and abs(held[-1] - release) <= 1.0
+    inside = (exact["time"] > contact) & (exact["time"] < release)
+    assert (exact["z"][inside, 0] == wall).all()
+
+
+@pytest.mark.parametrize("z, rho, r", RUNS)
+def test_adaptive_without_drag_matches_exact(z, rho, r):
+    exact = parcels.simulate_exact(z, rho, 1.0e-4, r)
+    adaptive = parcels.simulate_adaptive(z, rho, 1.0e-4, r, cd=0.0)
+    np.testing.assert_allclose(adaptive["z"], exact["z"], atol=1e-3)
+    np.testing.assert_allclose(adaptive["w"], exact["w"], atol=1e-5)
+    assert adaptive["steps"] < 360
+
+    # Contacts and releases found by bisection, and the parcel held in between
+    assert [e[1:] for e in adaptive["events"]] == [e[1:] for e in exact["events"]]
+    for (t, _, _), (t_exact, _, _) in zip(adaptive["events"], exact["events"]):
+        assert abs(t - t_exact) < 1e-3
+    if adaptive["events"]:
+        (contact, wall, _), (release, _, _) = adaptive["events"]
+        inside = (adaptive["time"] > contact) & (adaptive["time"] < release)
+        assert (adaptive["z"][inside, 0] == wall).all()
+        after = adaptive["z"][adaptive["time"] > release + 10.0, 0]
+        assert (after != wall).all()
+
+
+def test_next_contact_of_undamped_oscillator():
+    """ From rest at z0 below equilibrium zeq: z = zeq + (z0 - zeq) cos(omega t) reaches 0. """
+    b0, k = parcels.linear_coefficients(1025.1, 1.0e-4)
+    A = np.array([[0.0, 1.0], [-k, 0.0]])
+    b = np.array([0.0, b0])
+    zeq, z0 = b0 / k, -80.0
+    s, wall = parcels._next_contact(np.array([z0, 0.0]), A, b, k, 0.0, 3600.0, 10.0)
+    assert wall == parcels.SURFACE
+    assert s == pytest.approx(np.arccos(-zeq / (z0 - zeq)) / np.sqrt(k), abs=1e-8)
+
+    # A parcel oscillating inside the column has no contact
+    s, wall = parcels._next_contact(np.array([-15.0, 0.0]), A, b, k, 0.0, 3600.0, 10.0)
+    assert (s, wall) == (np.inf, None)
+
+
+def test_bisect_finds_the_crossing_within_the_step():
+    solver = stepping.DormandPrince(lambda t, y: (y[1], -y[0]), 0.0, [1.0, 0.0], rtol=1e-10, atol=1e-12)
+    while solver.t < 0.5 * np.pi:
+        solver.step(10.0)
+    t = parcels._bisect(solver, lambda y: y[0])
+    assert solver.t_old <= t <= solver.t
+    assert t == pytest.approx(0.5 * np.pi, abs=1e-8)
@@ -1,27 +1,27 @@
 #!/usr/bin/env python
 
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.patches import Circle
-from matplotlib.animation import FuncAnimation, PillowWriter
 
-def update(frame, fac2, factor, fre, dt, lines, small_circle):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from tank import TankRenderer
+from common import gifenc, timings
+
+def update(frame, fac2, factor, fre, dt, renderer):
     time = frame * dt
 
     # Calculate new positions using the simplified dynamics
     xp = fac2 * np.cos(fre * time)
     yp = fac2 * np.sin(fre * time)
 
-    # Update trajectory
-    x_vals, y_vals = lines.get_data()
-    x_vals = np.append(x_vals, xp)
-    y_vals = np.append(y_vals, yp)
-    lines.set_data(x_vals, y_vals)
-
-    # Update small circle for ball position
-    small_circle.center = (xp, yp)
-
-    return lines, small_circle
+    # Update trajectory and ball position
+    renderer.append(xp, yp)
+    return renderer.draw_frame()
 
 def main():
     # Constants
@@ -44,20 +44,20 @@ def main():
     # Drawing initial circle and lines
     circle = Circle((0, 0), fac2, edgecolor='black', facecolor='none')
     ax.add_patch(circle)
-    lines, = ax.plot([], [], 'r-')
 
-    # Initialize small circle for ball position
-    small_circle = Circle((0, 0), 1, color='red')
-    ax.add_patch(small_circle)
+    # Trajectory and small circle for ball position
+    renderer = TankRenderer(ax, radius, factor, capacity=200, spokes=False, trail={'color': 'r'},
+                            marker=[(2, 'red')])
 
     # Creating the animation
-    ani = FuncAnimation(fig, update, frames=np.arange(0, 200), fargs=(fac2, factor, fre, dt, lines, small_circle),
-                        blit=True, interval=50)
+    ani = renderer.animate(fig, timings.wrap(update, "update"), frames=np.arange(0, 200),
+                           fargs=(fac2, factor, fre, dt, renderer), interval=50)
 
     # Save to GIF using Pillow
-    writer = PillowWriter(fps=20)
+    writer = timings.writer(gifenc.writer(fps=20, colors=['red']))
     ani.save('CentripetalForce.gif', writer=writer)
 
 if __name__ == "__main__":
+    timings.setup(__file__)
     main()
 
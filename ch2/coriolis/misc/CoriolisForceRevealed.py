@@ -1,23 +1,35 @@
 #!/usr/bin/env python
 
+import argparse
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.patches import Ellipse
-from matplotlib.animation import FuncAnimation, PillowWriter
-
-def main():
-    # Constants and initial conditions
-    T = 24 * 3600  # Period in seconds
-    fre = 2 * np.pi / T  # Rotation rate
-    radius = 20
-    dt = T / 200  # Time step
-    factor = 0.9
-    fac2 = factor * radius
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from tank import TankRenderer
+from trajectories import coriolis_path
+from common import gifenc, simio, timings
+
+# Constants and initial conditions
+T = 24 * 3600  # Period in seconds
+fre = 2 * np.pi / T  # Rotation rate
+radius = 20
+dt = T / 200  # Time step
+factor = 0.9
+nframes = 200
+
+def compute():
+    """ Trajectory stage: the whole path of the ball, in both frames. """
     # Initial position and velocity
     xp, yp = 0, 5
     up, vp = 0.5, 0.5
+    return coriolis_path(xp, yp, up, vp, fre, dt, nframes)
 
+def render(path, filename='CoriolisForceRevealed.gif'):
+    """ Render stage: animate a path from compute() in the rotating frame. """
     # Setup the plot
     plt.style.use('bmh')
     fig, ax = plt.subplots()
@@ -26,53 +38,36 @@ def main():
     ax.set_aspect('equal')
     ax.set_title("Rotating Frame of Reference")
 
-    # Data storage for trajectory
-    x_positions, y_positions = [], []
+    # Trajectory, spokes and tank boundary, created once
+    renderer = TankRenderer(ax, radius, factor, trail={'color': 'r', 'linewidth': 4},
+                            rim={'angle': 0, 'color': 'blue', 'fill': False, 'linewidth': 6})
+    renderer.set_trajectory(path["x"], path["y"])
+    phase = -fre * path["time"]
 
-    # Update function for the animation
+    # Show the trajectory up to the frame and rotate the spokes
     def update(frame):
-        nonlocal xp, yp, up, vp
-
-        # Update time
-        time = frame * dt
-
-        # Calculate new ball position
-        alpha = np.cos(dt * 2 * fre)
-        beta = np.sin(dt * 2 * fre)
-
-        upn = alpha * (up - dt * 2 * fre * vp) - beta * dt * 2 * fre * up
-        vpn = alpha * (vp + dt * 2 * fre * up) + beta * dt * 2 * fre * vp
-
-        xp += dt * upn / 1000
-        yp += dt * vpn / 1000
-
-        x_positions.append(xp)
-        y_positions.append(yp)
-
-        up, vp = upn, vpn
-
-        ax.clear()
-        ax.set_xlim(-radius, radius)
-        ax.set_ylim(-radius, radius)
-        ax.plot(x_positions, y_positions, 'r-', linewidth=4)  # Plot the trajectory
-
-        # Draw all rotating lines and ellipses
-        angles = np.linspace(0, 2 * np.pi, 5)
-        for angle in angles:
-            xx = radius * np.sin(-fre * time + angle)
-            yy = radius * np.cos(-fre * time + angle)
-            ax.plot([0, factor * xx], [0, factor * yy], 'k-', lw=6)
-
-        # Plotting the ellipse representing boundaries
-        ellipse = Ellipse((0, 0), 2 * fac2, 2 * fac2, angle=0, color='blue', fill=False, linewidth=6)
-        ax.add_patch(ellipse)
+        return renderer.draw_frame(count=frame + 1, phase=phase[frame])
 
     # Create animation
-    ani = FuncAnimation(fig, update, frames=200, repeat=False)
+    ani = renderer.animate(fig, timings.wrap(update, "update"), frames=len(path["time"]), repeat=False)
 
     # Save to GIF
-    ani.save('CoriolisForceRevealed.gif', writer=PillowWriter(fps=20))
+    ani.save(filename, writer=timings.writer(gifenc.writer(fps=20, colors=['r', 'blue'])))
+    plt.close(fig)
+
+def main(draw=True, output=None):
+    with timings.stage("compute"):
+        path = compute()
+    timings.count("steps", nframes)
+    if output:
+        simio.save(output, path, meta={"fre": fre, "dt": dt})
+    if draw:
+        render(path)
 
 if __name__ == "__main__":
-    main()
-
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Coriolis trajectory seen from the rotating frame")
+    parser.add_argument("--no-render", action="store_true", help="compute the trajectory without animating it")
+    parser.add_argument("--output", help="write the trajectory with common/simio.py")
+    args = parser.parse_args()
+    main(draw=not args.no_render, output=args.output)
@@ -1,23 +1,35 @@
 #!/usr/bin/env python
 
+import argparse
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation, PillowWriter
-
-def main():
-    # Constants
-    T = 24 * 3600  # period in seconds
-    fre = -2 * np.pi / T  # negative rotation rate
-    radius = 20
-    dt = T / 200  # time step
-    factor = 0.9
-    fac2 = factor * radius
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from tank import TankRenderer
+from trajectories import straight_path
+from common import gifenc, simio, timings
+
+# Constants
+T = 24 * 3600  # period in seconds
+fre = -2 * np.pi / T  # negative rotation rate
+radius = 20
+dt = T / 200  # time step
+factor = 0.9
+nframes = 200
+
+def compute():
+    """ Trajectory stage: straight path in the fixed frame and its view from the rotating frame. """
     # Initial position and velocity
-    xp, yp = 0, 5
-    xf, yf = xp, yp
+    xf, yf = 0, 5
     uf, vf = 0.0, 0.15  # speed in m/s
+    return straight_path(xf, yf, uf, vf, fre, dt, nframes)
 
+def render(path, filename='StraightPath.gif'):
+    """ Render stage: animate a path from compute() in the rotating frame. """
     # Create plot
     plt.style.use('bmh')
     fig, ax = plt.subplots()
@@ -26,47 +38,35 @@ def main():
     ax.set_aspect('equal')
     ax.set_title("Rotating Frame of Reference")
 
-    # Data storage for trajectory
-    x_positions, y_positions = [], []
+    # Spokes and trajectory
+    renderer = TankRenderer(ax, radius, factor, trail={'color': 'r', 'lw': 2})
+    renderer.set_trajectory(path["x_turned"], path["y_turned"])
+    phase = -fre * path["time"]
 
-    # Update function for animation
+    # Rotate the spokes and show the trajectory up to the frame
     def update(frame):
-        nonlocal xf, yf, xp, yp
-
-        # Time update
-        time = frame * dt
-
-        # Update fixed frame position
-        xf += dt * uf / 1000
-        yf += dt * vf / 1000
-
-        # Transform to rotating frame
-        xp = xf * np.cos(fre * time) + yf * np.sin(fre * time)
-        yp = yf * np.cos(fre * time) - xf * np.sin(fre * time)
-
-        x_positions.append(xp)
-        y_positions.append(yp)
-
-        ax.clear()
-        ax.set_xlim(-radius, radius)
-        ax.set_ylim(-radius, radius)
-
-        # Draw lines and arcs
-        angles = np.linspace(0, 2 * np.pi, 5)
-        for angle in angles:
-            xx = radius * np.sin(-fre * time + angle)
-            yy = radius * np.cos(-fre * time + angle)
-            ax.plot([0, factor * xx], [0, factor * yy], 'k-', lw=6)
-
-        # Plot trajectory
-        ax.plot(x_positions, y_positions, 'r-', lw=2)
+        return renderer.draw_frame(count=frame + 1, phase=phase[frame])
 
     # Create animation
-    ani = FuncAnimation(fig, update, frames=200, repeat=False)
+    ani = renderer.animate(fig, timings.wrap(update, "update"), frames=len(path["time"]), repeat=False)
 
     # Save to GIF
-    ani.save('StraightPath.gif', writer='pillow', fps=20)
+    ani.save(filename, writer=timings.writer(gifenc.writer(fps=20, colors=['r'])))
+    plt.close(fig)
+
+def main(draw=True, output=None):
+    with timings.stage("compute"):
+        path = compute()
+    timings.count("steps", nframes)
+    if output:
+        simio.save(output, path, meta={"fre": fre, "dt": dt})
+    if draw:
+        render(path)
 
 if __name__ == "__main__":
-    main()
-
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Straight path seen from the rotating frame")
+    parser.add_argument("--no-render", action="store_true", help="compute the trajectory without animating it")
+    parser.add_argument("--output", help="write the trajectory with common/simio.py")
+    args = parser.parse_args()
+    main(draw=not args.no_render, output=args.output)
@@ -1,23 +1,35 @@
 #!/usr/bin/env python
 
+import argparse
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.patches import Ellipse
-from matplotlib.animation import FuncAnimation, PillowWriter
-
-def main():
-    # Constants and parameters
-    T = 24 * 3600  # period in seconds
-    fre = 2 * np.pi / T  # rotation rate
-    radius = 20
-    dt = T / 200  # time step
-    factor = 0.9
-    fac2 = factor * radius
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+from tank import TankRenderer
+from trajectories import coriolis_path
+from common import gifenc, simio, timings
+
+# Constants and parameters
+T = 24 * 3600  # period in seconds
+fre = 2 * np.pi / T  # rotation rate
+radius = 20
+dt = T / 200  # time step
+factor = 0.9
+nframes = 200
+
+def compute():
+    """ Trajectory stage: the whole path of the ball, in both frames. """
     # Initial position and velocity
     xp, yp = 0, 5
     up, vp = 0.5, 0.5
+    return coriolis_path(xp, yp, up, vp, fre, dt, nframes)
 
+def render(path, filename='Traject.gif'):
+    """ Render stage: animate a path from compute() in the fixed frame. """
     # Plot setup
     plt.style.use('bmh')
     fig, ax = plt.subplots()
@@ -26,56 +38,37 @@ def main():
     ax.set_ylim(-radius, radius)
     ax.set_title("Fixed Frame of Reference")
 
-    # Initial ellipse
-    ellipse = Ellipse((0, 0), 2 * fac2, 2 * fac2, angle=0, edgecolor='blue', facecolor='none', lw=2)
-    ax.add_patch(ellipse)
+    # Rotating tank boundary and trajectory, created once
+    renderer = TankRenderer(ax, radius, factor, spokes=False, trail={'color': 'r'},
+                            rim={'angle': 0, 'edgecolor': 'blue', 'facecolor': 'none', 'lw': 2})
+    renderer.set_trajectory(path["x_turned"], path["y_turned"])
+    rim_angle = np.degrees(fre * path["time"]) % 360
 
-    # Trajectory data storage
-    x_positions, y_positions = [], []
-
-    # Update function for animation
+    # Show the trajectory up to the frame and rotate the ellipse
     def update(frame):
-        nonlocal xp, yp, up, vp, ellipse
-        # Time calculation
-        time = frame * dt
-
-        # Calculate new positions based on Coriolis effect
-        alpha = np.cos(dt * 2 * fre)
-        beta = np.sin(dt * 2 * fre)
-
-        upn = alpha * (up - dt * 2 * fre * vp) - beta * dt * 2 * fre * up
-        vpn = alpha * (vp + dt * 2 * fre * up) + beta * dt * 2 * fre * vp
-
-        xp += dt * upn / 1000
-        yp += dt * vpn / 1000
-
-        xpn = xp * np.cos(fre * time) + yp * np.sin(fre * time)
-        ypn = yp * np.cos(fre * time) - xp * np.sin(fre * time)
-
-        x_positions.append(xpn)
-        y_positions.append(ypn)
-
-        up, vp = upn, vpn
-
-        ax.clear()
-        ax.set_xlim(-radius, radius)
-        ax.set_ylim(-radius, radius)
-        ax.plot(x_positions, y_positions, 'r-')
-
-        # Update and redraw the rotating ellipse
-        angle = np.degrees(fre * time) % 360
-        ellipse = Ellipse((0, 0), 2 * fac2, 2 * fac2, angle=angle, edgecolor='blue', facecolor='none', lw=2)
-        ax.add_patch(ellipse)
-
-        return ellipse,
+        return renderer.draw_frame(count=frame + 1, rim_angle=rim_angle[frame])
 
     # Create animation
-    ani = FuncAnimation(fig, update, frames=200, blit=True, interval=50)
+    ani = renderer.animate(fig, timings.wrap(update, "update"), frames=len(path["time"]), interval=50)
 
     # Save animation as GIF
-    writer = PillowWriter(fps=20)
-    ani.save('Traject.gif', writer=writer)
+    writer = timings.writer(gifenc.writer(fps=20, colors=['r', 'blue']))
+    ani.save(filename, writer=writer)
+    plt.close(fig)
+
+def main(draw=True, output=None):
+    with timings.stage("compute"):
+        path = compute()
+    timings.count("steps", nframes)
+    if output:
+        simio.save(output, path, meta={"fre": fre, "dt": dt})
+    if draw:
+        render(path)
 
 if __name__ == "__main__":
-    main()
-
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Coriolis trajectory seen from the fixed frame")
+    parser.add_argument("--no-render", action="store_true", help="compute the trajectory without animating it")
+    parser.add_argument("--output", help="write the trajectory with common/simio.py")
+    args = parser.parse_args()
+    main(draw=not args.no_render, output=args.output)
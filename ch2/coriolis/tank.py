@@ -0,0 +1,116 @@
+"""
+tank.py
+
+Shared renderer for the rotating-tank animations in utama/ and misc/.
+
+All artists (the rotating spokes, the trajectory, the ball marker and the
+optional tank rim) are created once. Every frame only changes their data,
+so no axes are cleared and no artists are rebuilt, and the trajectory is
+kept in preallocated NumPy buffers instead of growing Python lists. With
+blit=True the returned artists are the only ones redrawn on screen.
+
+Sandy Herho, 2024
+"""
+
+import numpy as np
+from matplotlib.animation import FuncAnimation
+from matplotlib.patches import Ellipse
+
+
+class TankRenderer:
+    """
+    Artists of one tank animation on an existing axes.
+
+    radius, factor: tank geometry as in the scripts (spokes reach
+    factor*radius). nspokes: number of spokes drawn from angle 0 to 2*pi.
+    trail: keyword arguments of the trajectory line. marker: list of
+    (diameter, color) discs drawn on top of each other at the ball position,
+    or None. rim: keyword arguments of an Ellipse of diameter
+    2*factor*radius that is rotated with the tank, or None.
+    """
+
+    def __init__(self, ax, radius, factor=0.9, capacity=1, nspokes=5, spoke_width=6,
+                 spokes=True, trail=None, marker=None, rim=None):
+        self.ax = ax
+        self.radius = radius
+        self.factor = factor
+        self.offsets = np.linspace(0, 2 * np.pi, nspokes) if spokes else np.empty(0)
+
+        # One line holds every spoke, separated by NaNs: [0, tip, nan] per spoke
+        self._spoke_xy = np.zeros((2, 3 * len(self.offsets)))
+        self._spoke_xy[:, 2::3] = np.nan
+        self.spokes, = ax.plot(*self._spoke_xy, 'k-', lw=spoke_width)
+
+        self._x = np.empty(capacity)
+        self._y = np.empty(capacity)
+        self._n = 0
+        self.trail, = ax.plot([], [], **({'color': 'r', 'lw': 4} if trail is None else trail))
+
+        self.markers = []
+        for diameter, color in marker or []:
+            disc = Ellipse((0, 0), diameter, diameter, color=color, fill=True, visible=False)
+            self.markers.append(ax.add_patch(disc))
+
+        self.rim = None
+        if rim is not None:
+            d = 2 * factor * radius
+            self.rim = ax.add_patch(Ellipse((0, 0), d, d, **rim))
+
+    @property
+    def artists(self):
+        """ Artists that change from frame to frame (for blitting). """
+        return [a for a in [self.spokes, self.trail, *self.markers, self.rim] if a is not None]
+
+    def reset(self):
+        """ Empty the trajectory, e.g. from an animation's init function. """
+        self._n = 0
+        self.trail.set_data(self._x[:0], self._y[:0])
+        for disc in self.markers:
+            disc.set_visible(False)
+        return self.artists
+
+    def set_trajectory(self, x, y):
+        """ Use precomputed positions; draw_frame(n) then shows the first n+1. """
+        self._x = np.ascontiguousarray(x, dtype=float)
+        self._y = np.ascontiguousarray(y, dtype=float)
+        self._n = len(self._x)
+
+    def append(self, x, y):
+        """ Add one position to the trajectory buffers. """
+        if self._n == len(self._x):
+            self._x = np.resize(self._x, 2 * self._n)
+            self._y = np.resize(self._y, 2 * self._n)
+        self._x[self._n] = x
+        self._y[self._n] = y
+        self._n += 1
+
+    def draw_frame(self, count=None, phase=0.0, rim_angle=None):
+        """
+        Update all artists.
+
+        count: number of trajectory points to show (default: all appended
+        so far); the ball sits on the last of them. phase: rotation of the
+        spokes, which point at radius*(sin(phase + offset), cos(phase + offset)).
+        rim_angle: rotation of the rim in degrees.
+        """
+        n = self._n if count is None else count
+
+        tips = self.factor * self.radius
+        self._spoke_xy[0, 1::3] = tips * np.sin(phase + self.offsets)
+        self._spoke_xy[1, 1::3] = tips * np.cos(phase + self.offsets)
+        self.spokes.set_data(self._spoke_xy[0], self._spoke_xy[1])
+
+        self.trail.set_data(self._x[:n], self._y[:n])
+        for disc in self.markers:
+            if n > 0:
+                disc.set_center((self._x[n - 1], self._y[n - 1]))
+            disc.set_visible(n > 0)
+
+        if self.rim is not None and rim_angle is not None:
+            self.rim.set_angle(rim_angle)
+        return self.artists
+
+    def animate(self, fig, update, frames, **kwargs):
+        """ FuncAnimation with blitting that resets the renderer on init. """
+        kwargs.setdefault('blit', True)
+        return FuncAnimation(fig, update, frames=frames, init_func=self.reset, **kwargs)
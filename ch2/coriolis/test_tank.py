@@ -0,0 +1,83 @@
+"""
+TankRenderer draws every frame by updating the artists it created once.
+"""
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib.animation import PillowWriter
+import numpy as np
+import pytest
+
+from tank import TankRenderer
+
+
+@pytest.fixture
+def ax():
+    fig, ax = plt.subplots()
+    yield ax
+    plt.close(fig)
+
+
+def test_frames_reuse_the_artists(ax):
+    tank = TankRenderer(ax, 20, marker=[(3, 'k'), (2, 'y')], rim={'edgecolor': 'blue', 'fill': False})
+    artists = tank.artists
+    lines, patches = len(ax.lines), len(ax.patches)
+    assert len(artists) == 5
+
+    for n in range(40):
+        tank.append(np.cos(n / 10), np.sin(n / 10))
+        assert tank.draw_frame(phase=0.1 * n, rim_angle=3.0 * n) == artists
+    assert (len(ax.lines), len(ax.patches)) == (lines, patches)
+
+    x, y = tank.trail.get_data()
+    np.testing.assert_array_equal(x, np.cos(np.arange(40) / 10))
+    np.testing.assert_array_equal(y, np.sin(np.arange(40) / 10))
+    for disc in tank.markers:
+        assert disc.get_visible()
+        assert disc.get_center() == pytest.approx((np.cos(3.9), np.sin(3.9)))
+    assert tank.rim.get_angle() == 117.0
+
+
+def test_spokes(ax):
+    tank = TankRenderer(ax, 20, factor=0.9, nspokes=4)
+    tank.draw_frame(phase=0.3)
+    x, y = tank.spokes.get_data()
+    offsets = np.linspace(0, 2 * np.pi, 4)
+    np.testing.assert_allclose(x[1::3], 18 * np.sin(0.3 + offsets))
+    np.testing.assert_allclose(y[1::3], 18 * np.cos(0.3 + offsets))
+    assert (x[0::3] == 0).all() and np.isnan(x[2::3]).all()
+
+    assert len(TankRenderer(ax, 20, spokes=False).spokes.get_xdata()) == 0
+
+
+def test_precomputed_trajectory_and_reset(ax):
+    tank = TankRenderer(ax, 20, marker=[(3, 'k')])
+    tank.set_trajectory(np.arange(10.0), -np.arange(10.0))
+    tank.draw_frame(count=4)
+    x, _ = tank.trail.get_data()
+    np.testing.assert_array_equal(x, [0.0, 1.0, 2.0, 3.0])
+    assert tank.markers[0].get_center() == (3.0, -3.0)
+
+    tank.draw_frame(count=0)
+    assert not tank.markers[0].get_visible()
+
+    tank.reset()
+    assert len(tank.trail.get_xdata()) == 0
+    tank.append(5.0, 5.0)
+    tank.draw_frame()
+    assert tank.markers[0].get_center() == (5.0, 5.0)
+
+
+def test_animation_resets_on_init(ax, tmp_path):
+    tank = TankRenderer(ax, 20)
+    tank.append(1.0, 1.0)
+    phases = []
+
+    def update(i):
+        phases.append(i)
+        assert len(tank.trail.get_xdata()) == 0
+        return tank.draw_frame(phase=i)
+
+    tank.animate(ax.figure, update, frames=3).save(tmp_path / 'tank.gif', writer=PillowWriter(fps=2))
+    assert phases == [0, 1, 2]
@@ -0,0 +1,82 @@
+"""
+coriolis_path() is the velocity loop of the course scripts, bit for bit
+the scalar path for every ball of a batch, and coriolis_stream() adds up
+to it.
+"""
+
+import numpy as np
+import pytest
+
+import trajectories
+from common import stepping
+
+FRE = 2 * np.pi / (24 * 3600)
+DT = 24 * 3600 / 200
+
+
+def scalar_path(x0, y0, u0, v0, fre, dt, nframes):
+    """ coriolis_path() as it was for one ball, before it took arrays. """
+    time = np.arange(nframes) * dt
+    velocity = stepping.apply(trajectories.matrix_powers(trajectories.velocity_matrix(fre, dt), nframes),
+                              np.array([u0, v0]))
+    x = x0 + np.cumsum(dt * velocity[:, 0] / 1000)
+    y = y0 + np.cumsum(dt * velocity[:, 1] / 1000)
+    x_turned, y_turned = trajectories.rotate(x, y, fre * time)
+    return {"time": time, "u": velocity[:, 0], "v": velocity[:, 1],
+            "x": x, "y": y, "x_turned": x_turned, "y_turned": y_turned}
+
+
+def course_loop(xp, yp, up, vp, fre, dt, nframes):
+    """ The update callback of Traject.py, without the drawing. """
+    rows = []
+    for frame in range(nframes):
+        time = frame * dt
+        alpha = np.cos(dt * 2 * fre)
+        beta = np.sin(dt * 2 * fre)
+        upn = alpha * (up - dt * 2 * fre * vp) - beta * dt * 2 * fre * up
+        vpn = alpha * (vp + dt * 2 * fre * up) + beta * dt * 2 * fre * vp
+        xp += dt * upn / 1000
+        yp += dt * vpn / 1000
+        xpn = xp * np.cos(fre * time) + yp * np.sin(fre * time)
+        ypn = yp * np.cos(fre * time) - xp * np.sin(fre * time)
+        rows.append((upn, vpn, xp, yp, xpn, ypn))
+        up, vp = upn, vpn
+    return dict(zip(("u", "v", "x", "y", "x_turned", "y_turned"), np.array(rows).T))
+
+
+def test_path_follows_the_course_loop():
+    path = trajectories.coriolis_path(0.0, 5.0, 0.5, 0.5, FRE, DT, 200)
+    for key, value in course_loop(0.0, 5.0, 0.5, 0.5, FRE, DT, 200).items():
+        np.testing.assert_allclose(path[key], value, rtol=1e-10, atol=1e-12)
+
+
+def test_scalar_path_is_unchanged():
+    path = trajectories.coriolis_path(0.0, 5.0, 0.5, 0.5, FRE, DT, 200)
+    for key, value in scalar_path(0.0, 5.0, 0.5, 0.5, FRE, DT, 200).items():
+        np.testing.assert_array_equal(path[key], value)
+        assert path[key].shape == (200,)
+
+
+@pytest.mark.parametrize("shape", [(5,), (2, 3)])
+def test_batch_is_the_scalar_path_of_every_ball(shape):
+    rng = np.random.default_rng(3)
+    x0, y0 = rng.uniform(-5, 5, shape), 5.0
+    u0, v0 = rng.uniform(0.1, 1.0, shape), 0.5
+    path = trajectories.coriolis_path(x0, y0, u0, v0, FRE, DT, 200)
+    assert path["time"].shape == (200,)
+    for key in ("u", "v", "x", "y", "x_turned", "y_turned"):
+        assert path[key].shape == (200,) + shape
+    for ball in np.ndindex(shape):
+        single = scalar_path(x0[ball], y0, u0[ball], v0, FRE, DT, 200)
+        for key, value in single.items():
+            if key != "time":
+                np.testing.assert_array_equal(path[key][(slice(None),) + ball], value)
+
+
+@pytest.mark.parametrize("block", [1, 7, 200, 4096])
+def test_stream_matches_path(block):
+    path = trajectories.coriolis_path(0.0, 5.0, 0.5, 0.5, FRE, DT, 200)
+    blocks = list(trajectories.coriolis_stream(0.0, 5.0, 0.5, 0.5, FRE, DT, 200, block=block))
+    assert max(len(b["time"]) for b in blocks) <= block
+    for key, value in path.items():
+        np.testing.assert_allclose(np.concatenate([b[key] for b in blocks]), value, rtol=1e-12, atol=1e-12)
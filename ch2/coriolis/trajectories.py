@@ -0,0 +1,122 @@
+"""
+trajectories.py
+
+Trajectory stage of the rotating-tank animations in misc/.
+
+The scripts used to advance the ball inside the animation callback. Here
+the whole path is computed up front, in the frame the motion is
+integrated in and in the other frame, so rendering only reads arrays and
+a path can be computed without drawing it.
+
+The velocity update of Traject.sce / CoriolisForceRevealed.sce,
+
+    un = a*(u - k*v) - b*k*u,   vn = a*(v + k*u) + b*k*v,
+
+with k = 2*fre*dt, a = cos(k), b = sin(k), is a constant 2x2 matrix M,
+so the velocity after n steps is M^n applied to the initial velocity. The
+powers are built by repeated doubling (log2(n) batched products) and the
+positions follow from one cumulative sum. The change of frame at time t is
+the batched rotation stepping.rotation_matrix(fre*t). coriolis_stream()
+yields the same path in blocks of bounded size (see common/streams.py).
+
+Sandy Herho, 2024
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common import stepping, streams
+
+
+def velocity_matrix(fre, dt):
+    """ One-step matrix M of the course's velocity update with Coriolis parameter 2*fre. """
+    k = 2 * fre * dt
+    a, b = np.cos(k), np.sin(k)
+    return np.array([[a - b * k, -a * k],
+                     [a * k, a + b * k]])
+
+
+def matrix_powers(M, n):
+    """ M^1 ... M^n as an (n, 2, 2) stack, by repeated doubling. """
+    powers = np.empty((n, 2, 2))
+    powers[0] = M
+    m = 1
+    while m < n:
+        step = min(m, n - m)
+        powers[m:m + step] = powers[m - 1] @ powers[:step]
+        m += step
+    return powers
+
+
+def rotate(x, y, angle):
+    """
+    Positions x, y seen from a frame turned by angle (rad, one per point):
+    (x*cos + y*sin, y*cos - x*sin), as in the scripts.
+    """
+    xy = stepping.apply(stepping.rotation_matrix(angle), np.stack([x, y], axis=-1))
+    return xy[..., 0], xy[..., 1]
+
+
+def coriolis_path(x0, y0, u0, v0, fre, dt, nframes):
+    """
+    Path of the ball of Traject.py / CoriolisForceRevealed.py.
+
+    x0, y0: initial position (km); u0, v0: initial velocity (m/s). Frame n
+    (time n*dt) shows the ball after n+1 velocity updates. Returns a dict
+    of arrays of length nframes: "time" (s), "u", "v", the integrated path
+    "x", "y" (km) and "x_turned", "y_turned", the path seen from the frame
+    turned by fre*time.
+
+    x0, y0, u0 and v0 may also be arrays (one element per ball), which
+    are computed together: the arrays of the path then have the shape
+    (nframes,) + the broadcast shape.
+    """
+    u0, v0 = np.broadcast_arrays(np.asarray(u0, dtype=float), np.asarray(v0, dtype=float))
+    balls = (None,) * u0.ndim
+    time = np.arange(nframes) * dt
+    powers = matrix_powers(velocity_matrix(fre, dt), nframes)[(slice(None),) + balls]
+    velocity = stepping.apply(powers, np.stack([u0, v0], axis=-1))
+    x = x0 + np.cumsum(dt * velocity[..., 0] / 1000, axis=0)
+    y = y0 + np.cumsum(dt * velocity[..., 1] / 1000, axis=0)
+    x_turned, y_turned = rotate(x, y, fre * time[(slice(None),) + balls])
+    return {"time": time, "u": velocity[..., 0], "v": velocity[..., 1],
+            "x": x, "y": y, "x_turned": x_turned, "y_turned": y_turned}
+
+
+def coriolis_stream(x0, y0, u0, v0, fre, dt, nframes, block=streams.BLOCK):
+    """
+    coriolis_path() as consecutive blocks of at most `block` frames. The
+    powers M^1 ... M^block are built once; every block applies them to the
+    last velocity of the previous one and continues its positions, so
+    memory is bounded by the block size whatever nframes is.
+    """
+    powers = matrix_powers(velocity_matrix(fre, dt), min(block, nframes))
+    velocity0 = np.array([u0, v0], dtype=float)
+    x, y = float(x0), float(y0)
+    for start in range(0, nframes, block):
+        rows = min(block, nframes - start)
+        time = np.arange(start, start + rows) * dt
+        velocity = stepping.apply(powers[:rows], velocity0)
+        xs = x + np.cumsum(dt * velocity[:, 0] / 1000)
+        ys = y + np.cumsum(dt * velocity[:, 1] / 1000)
+        x_turned, y_turned = rotate(xs, ys, fre * time)
+        yield {"time": time, "u": velocity[:, 0], "v": velocity[:, 1],
+               "x": xs, "y": ys, "x_turned": x_turned, "y_turned": y_turned}
+        velocity0, x, y = velocity[-1], xs[-1], ys[-1]
+
+
+def straight_path(x0, y0, u, v, fre, dt, nframes):
+    """
+    Path of the ball of StraightPath.py: uniform motion with velocity
+    (u, v) m/s from (x0, y0) km, and the same path seen from the frame
+    turned by fre*time. Same keys as coriolis_path().
+    """
+    time = np.arange(nframes) * dt
+    x = x0 + np.cumsum(np.full(nframes, dt * u / 1000))
+    y = y0 + np.cumsum(np.full(nframes, dt * v / 1000))
+    x_turned, y_turned = rotate(x, y, fre * time)
+    return {"time": time, "u": np.full(nframes, u), "v": np.full(nframes, v),
+            "x": x, "y": y, "x_turned": x_turned, "y_turned": y_turned}
@@ -1,14 +1,44 @@
 #!/usr/bin/env python
 
+import argparse
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
-import pandas as pd
-from matplotlib.patches import Ellipse, Arc
-from matplotlib.animation import FuncAnimation, PillowWriter
+from matplotlib.patches import Ellipse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'InertialOscillations', 'herho_work'))
+import inertial
+from common import cache, gifenc, simio, timings
+from tank import TankRenderer
+
+# The run of Coriolis.f95, for --cached
+RUN = {"u": 0.5, "v": 0.5, "x": 0.0, "y": 5.0, "freq": -2 * np.pi / (24 * 3600), "dt": 24 * 3600 / 200,
+       "ntot": 200}
 
 def read_data(filename):
-    """ Reads data from the specified file, handling multiple spaces as delimiters. """
-    return pd.read_csv(filename, delim_whitespace=True, header=None)
+    """
+    Reads a run as columns x, y, time with the header (freq, dt, ntot) as metadata.
+    Text files are parsed; binary runs (.npy + .json) are memory-mapped.
+    """
+    return simio.load(filename, names=('x', 'y', 'time'), header=('freq', 'dt', 'ntot'))
+
+def compute(freq, scheme, **params):
+    """ x, y, time of a run after the initial state, as in output1.txt / output2.txt. """
+    traj = inertial.trajectory(f=2 * freq, scheme=scheme, **params)
+    return {"x": traj["x"][1:], "y": traj["y"][1:], "time": traj["time"][1:]}
+
+def cached_run(scheme, settings=None):
+    """
+    The run of Coriolis.f95 with scheme (changed by NAME=VALUE settings)
+    from the result cache, with the header of the text output as metadata.
+    """
+    params = dict(cache.overrides(RUN, settings), scheme=scheme)
+    run = cache.fetch("inertial.trajectory", params, compute, sources=[__file__, inertial])
+    return simio.Run(run.data, run.names, {key: params[key] for key in ('freq', 'dt', 'ntot')})
 
 def setup_plot(radius, factor, fac2):
     """ Set up the initial plot settings. """
@@ -25,47 +55,44 @@ def setup_plot(radius, factor, fac2):
 
     return fig, ax
 
-def update(frame, data, radius, fact, fre, ax):
-    """ Update function for animation. """
-    time = data.iloc[frame, 2]
-    xr = data.iloc[frame, 0]
-    yr = data.iloc[frame, 1]
-
-    ax.clear()
-    ax.set_xlim(-radius, radius)
-    ax.set_ylim(-radius, radius)
-
-    # Draw rotating arcs to visualize relative rotation of the tank
-    angles = np.linspace(0, 2 * np.pi, 5)
-    for angle in angles:
-        xx = radius * np.sin(fre * time + angle)
-        yy = radius * np.cos(fre * time + angle)
-        ax.plot([0, fact * xx], [0, fact * yy], 'k-', lw=6)
-
-    # Draw trajectory
-    ax.plot(data.iloc[1:frame+1, 0], data.iloc[1:frame+1, 1], 'r-', linewidth=4)
+def update(frame, time, fre, renderer):
+    """ Update function for animation: rotate the spokes, extend the trajectory, move the ball. """
+    return renderer.draw_frame(frame + 1, phase=fre * time[frame])
 
-    # Draw location
-    ax.add_patch(Ellipse((xr, yr), 2, 2, color='red', fill=True))
-    ax.add_patch(Ellipse((xr, yr), 1.6, 1.6, color='yellow', fill=True))
+def main(filename='./output1.txt', cached=None, settings=None):
+    data = cached_run(cached, settings) if cached else read_data(filename)
 
-def main():
-    filename = './output1.txt'
-    data = read_data(filename)
-
-    fre = data.iloc[0, 0]
-    dt = data.iloc[0, 1]
-    ntot = int(data.iloc[0, 2])
+    fre = data.meta['freq']
+    dt = data.meta['dt']
+    ntot = int(data.meta['ntot'])
     radius = 20
     fact = 0.9
     fac2 = fact * radius
 
     fig, ax = setup_plot(radius, fact, fac2)
 
-    ani = FuncAnimation(fig, update, frames=ntot-1, fargs=(data, radius, fact, fre, ax), repeat=False)
+    # Artists are created once; frames only update their data
+    renderer = TankRenderer(ax, radius, fact, trail={'color': 'r', 'linewidth': 4},
+                            marker=[(2, 'red'), (1.6, 'yellow')])
+    renderer.set_trajectory(data['x'], data['y'])
+    time = np.array(data['time'])
+
+    ani = renderer.animate(fig, timings.wrap(update, "update"), frames=ntot, fargs=(time, fre, renderer),
+                           repeat=False)
 
-    ani.save('CoriolisEffectSimulation.gif', writer='pillow', fps=10)
+    ani.save('CoriolisEffectSimulation.gif', writer=timings.writer(gifenc.writer(fps=10, colors=['red', 'yellow'])))
 
 if __name__ == "__main__":
-    main()
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Ball on a rotating table")
+    parser.add_argument("filename", nargs="?", default='./output1.txt',
+                        help="text output, or a binary run")
+    parser.add_argument("--cached", nargs="?", const="semi_implicit", choices=inertial.SCHEMES,
+                        metavar="SCHEME", help="show the run of SCHEME (default semi_implicit, as "
+                                               "output1.txt) from the result cache, computed if it "
+                                               "isn't there, instead of reading a file")
+    parser.add_argument("--set", action="append", metavar="NAME=VALUE",
+                        help=f"change a parameter of the cached run ({', '.join(RUN)})")
+    args = parser.parse_args()
+    main(args.filename, cached=args.cached, settings=args.set)
 
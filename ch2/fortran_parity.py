@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+"""
+fortran_parity.py
+
+Parity and speed of the FORTRAN kernels (common/kernels.f90, called through
+common/fortran.py) against the NumPy engine of
+InertialOscillations/herho_work/inertial.py.
+
+For every program and scheme the kernel is checked against
+  - the output file the FORTRAN program wrote (same arithmetic, so they
+    agree to the printed digits; InerOsci's file comes from the Scilab
+    version and is held to --atol), and
+  - the double-precision NumPy trajectory (agreement to single-precision
+    round-off, --atol km), and the REAL(8) build of the kernel against it
+    (agreement to double-precision round-off, --atol64 km).
+Then both are timed on a long run of --steps steps. Exits with status 1
+if a check fails; if the kernels can't be built, says why and exits 0,
+as the NumPy path is then the only one in use.
+
+Sandy Herho, 2024
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'InertialOscillations', 'herho_work'))
+sys.path.insert(0, os.path.join(HERE, '..'))
+import inertial
+from common import fortran, simio
+
+FREQ = -2 * np.pi / (24 * 3600)
+
+# (program, kernel, parameters, {scheme: output file of the program})
+CORIOLIS = dict(u=0.5, v=0.5, x=0.0, y=5.0, uzero=0.0, vzero=0.0, dt=24 * 3600 / 200, ntot=200, events=())
+INERTIAL = dict(u=0.1, v=0.0, x=0.0, y=0.0, uzero=0.05, vzero=0.05, dt=6 * 24 * 3600 / 120, ntot=120,
+                events=inertial.IMPULSES)
+CASES = [
+    ("Coriolis.f95", "coriolis", CORIOLIS,
+     {"semi_implicit": "coriolis/utama/output1.txt", "exact": "coriolis/utama/output2.txt"}),
+    ("InerOsci.f95", "inertial", INERTIAL,
+     {"exact": "InertialOscillations/output2.txt"}),
+    ("iner_osci.f95", "inertial", INERTIAL,
+     {"semi_implicit": "InertialOscillations/herho_work/output1.txt",
+      "exact": "InertialOscillations/herho_work/output2.txt"}),
+]
+
+# Reference files written in double precision (by InerOsci.sce), held to --atol
+DOUBLE_PRECISION_FILES = {"InertialOscillations/output2.txt"}
+
+
+def run_fortran(kernel, scheme, p, ntot, double=False):
+    if kernel == "coriolis":
+        return fortran.coriolis_run(scheme, ntot, p["u"], p["v"], p["x"], p["y"], FREQ, p["dt"],
+                                    double=double)
+    return fortran.inertial_run(scheme, ntot, p["u"], p["v"], p["x"], p["y"], p["uzero"], p["vzero"],
+                                FREQ, p["dt"], p["events"], double=double)
+
+
+def run_numpy(scheme, p, ntot):
+    traj = inertial.trajectory(p["u"], p["v"], p["x"], p["y"], 2 * FREQ, p["dt"], ntot,
+                               events=p["events"], uzero=p["uzero"], vzero=p["vzero"],
+                               scheme=scheme, backend="numpy")
+    return {key: value[1:] for key, value in traj.items()}
+
+
+def deviation(a, b):
+    return max(np.abs(np.asarray(a["x"], float) - b["x"]).max(),
+               np.abs(np.asarray(a["y"], float) - b["y"]).max())
+
+
+def best_time(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FORTRAN kernel parity and speed")
+    parser.add_argument("--atol", type=float, default=1e-3, help="tolerance against NumPy (km)")
+    parser.add_argument("--atol64", type=float, default=1e-9,
+                        help="tolerance of the REAL(8) kernel against NumPy (km)")
+    parser.add_argument("--file-atol", type=float, default=1e-5,
+                        help="tolerance against the program output files (km)")
+    parser.add_argument("--steps", type=int, default=1_000_000, help="steps of the timing runs")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions (best is kept)")
+    args = parser.parse_args()
+
+    if not fortran.available():
+        print(f"FORTRAN kernels unavailable, NumPy path only: {fortran.unavailable_reason()}")
+        return 0
+
+    failed = False
+    print(f"{'program':<14} {'scheme':<14} {'vs file':>10} {'vs numpy':>10} {'f64':>10} "
+          f"{'fortran':>10} {'numpy':>10} {'speedup':>8}")
+    for program, kernel, params, files in CASES:
+        for scheme in ("semi_implicit", "exact"):
+            ntot = params["ntot"]
+            kern = run_fortran(kernel, scheme, params, ntot)
+            reference = run_numpy(scheme, params, ntot)
+            err_numpy = deviation(kern, reference)
+            err_double = deviation(run_fortran(kernel, scheme, params, ntot, double=True), reference)
+            failed |= err_numpy > args.atol or err_double > args.atol64
+
+            err_file = ""
+            if scheme in files:
+                ref = simio.load(os.path.join(HERE, files[scheme]), names=("x", "y", "time"),
+                                 header=("freq", "dt", "ntot"))
+                err = deviation(kern, ref)
+                failed |= err > (args.atol if files[scheme] in DOUBLE_PRECISION_FILES else args.file_atol)
+                err_file = f"{err:.1e}"
+
+            t_fortran = best_time(lambda: run_fortran(kernel, scheme, params, args.steps), args.repeat)
+            t_numpy = best_time(lambda: run_numpy(scheme, params, args.steps), args.repeat)
+            print(f"{program:<14} {scheme:<14} {err_file:>10} {err_numpy:>10.1e} {err_double:>10.1e} "
+                  f"{t_fortran * 1e3:>8.1f}ms {t_numpy * 1e3:>8.1f}ms {t_numpy / t_fortran:>7.1f}x")
+
+    print("FAILED" if failed else "all within tolerance")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+The FORTRAN kernels against the program outputs (single precision) and
+the NumPy engine (REAL(8)); see fortran_parity.py.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import fortran_parity
+import inertial
+from common import fortran, simio
+
+pytestmark = pytest.mark.skipif(not fortran.available(),
+                                reason=f"FORTRAN kernels unavailable: {fortran.unavailable_reason()}")
+
+CASES = [(program, kernel, params, scheme, files.get(scheme))
+         for program, kernel, params, files in fortran_parity.CASES
+         for scheme in inertial.SCHEMES]
+
+
+@pytest.mark.parametrize("program, kernel, params, scheme, reference", CASES,
+                         ids=[f"{c[0]}-{c[3]}" for c in CASES])
+def test_kernels(program, kernel, params, scheme, reference):
+    numpy = fortran_parity.run_numpy(scheme, params, params["ntot"])
+    single = fortran_parity.run_fortran(kernel, scheme, params, params["ntot"])
+    double = fortran_parity.run_fortran(kernel, scheme, params, params["ntot"], double=True)
+    assert single["x"].dtype == np.float32 and double["x"].dtype == np.float64
+    assert fortran_parity.deviation(single, numpy) < 1e-3
+    assert fortran_parity.deviation(double, numpy) < 1e-9
+    if reference is not None:
+        ref = simio.load(os.path.join(fortran_parity.HERE, reference), names=("x", "y", "time"),
+                         header=("freq", "dt", "ntot"))
+        atol = 1e-3 if reference in fortran_parity.DOUBLE_PRECISION_FILES else 1e-5
+        assert fortran_parity.deviation(single, ref) < atol
+
+
+@pytest.mark.parametrize("scheme", inertial.SCHEMES)
+def test_auto_backend_keeps_double_precision(scheme):
+    p = fortran_parity.INERTIAL
+    args = (p["u"], p["v"], p["x"], p["y"], 2 * fortran_parity.FREQ, p["dt"], 5000)
+    kwargs = {"events": p["events"], "uzero": p["uzero"], "vzero": p["vzero"], "scheme": scheme}
+    numpy = inertial.trajectory(*args, **kwargs, backend="numpy")
+    auto = inertial.trajectory(*args, **kwargs, backend="auto")
+    for key in numpy:
+        np.testing.assert_allclose(auto[key], numpy[key], rtol=1e-10, atol=1e-10)
+
+
+def test_library_is_built_outside_the_source_tree():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(fortran.__file__)))
+    assert not os.path.abspath(fortran._library_path()).startswith(root + os.sep)
@@ -0,0 +1,49 @@
+"""
+Superposition elevations are the direct sums of their sine waves, in one
+chunk or many.
+"""
+
+import numpy as np
+import pytest
+
+from superposition import Superposition
+
+COMPONENTS = [(1.0, 100.0, 10.0), (0.5, 40.0, -6.0, 0.3), (0.2, 250.0, 17.0, -1.2)]
+
+
+def direct(components, x, t):
+    """ eta(x, t) = sum_m a_m sin(k_m x - omega_m t + phi_m), one point at a time. """
+    eta = 0.0
+    for a, wavelength, period, *phase in components:
+        eta += a * np.sin(2 * np.pi / wavelength * x - 2 * np.pi / period * t + sum(phase))
+    return eta
+
+
+@pytest.mark.parametrize("chunk", [256, 3, 1])
+def test_elevation_is_the_direct_sum(chunk):
+    x = np.linspace(0.0, 500.0, 101)
+    t = np.linspace(0.0, 60.0, 11)
+    waves = Superposition(COMPONENTS, x, chunk=chunk)
+    eta = waves.elevation(t)
+    assert eta.shape == (len(t), len(x))
+    for i, j in [(0, 0), (3, 17), (7, 100), (10, 55), (5, 64)]:
+        assert eta[i, j] == pytest.approx(direct(COMPONENTS, x[j], t[i]), abs=1e-12)
+
+    starts = [start for start, _ in waves.blocks(t)]
+    assert starts == list(range(0, len(t), chunk))
+    np.testing.assert_allclose(eta, Superposition(COMPONENTS, x, chunk=len(t)).elevation(t), atol=1e-13)
+
+
+def test_components_add_up_to_the_elevation():
+    x = np.linspace(0.0, 500.0, 33)
+    t = np.array([0.0, 2.5, 41.0])
+    waves = Superposition(COMPONENTS, x, chunk=2)
+    parts = waves.components(t)
+    assert parts.shape == (3, len(COMPONENTS), len(x))
+    np.testing.assert_allclose(parts[1, 1], direct(COMPONENTS[1:2], x, 2.5), atol=1e-12)
+    np.testing.assert_allclose(parts.sum(axis=1), waves.elevation(t), atol=1e-12)
+
+
+def test_no_components():
+    with pytest.raises(ValueError):
+        Superposition([], np.zeros(3))
@@ -0,0 +1,35 @@
+"""
+GIFs rendered in frame chunks on a process pool are the bytes of the
+serial run, whether the workers are forked or spawned.
+"""
+
+import multiprocessing
+
+import pytest
+
+import waveInterference
+
+NFRAMES = 8   # frames of each scenario, so that a run takes seconds
+SCENARIOS = waveInterference.scenarios[:2]
+
+
+def gifs(directory, scenarios):
+    return [(directory / waveInterference.gif_filename(s)).read_bytes() for s in scenarios]
+
+
+@pytest.fixture(scope="module")
+def serial(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("serial")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(directory)
+        for scenario in SCENARIOS:
+            waveInterference.create_animation(scenario, NFRAMES)
+    return gifs(directory, SCENARIOS)
+
+
+@pytest.mark.parametrize("workers, chunks, method", [(2, 3, "fork"), (3, 8, "fork"), (2, 2, "spawn")])
+def test_chunked_rendering_matches_serial(workers, chunks, method, serial, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    waveInterference.render_parallel(SCENARIOS, workers=workers, chunks=chunks, nframes=NFRAMES,
+                                     context=multiprocessing.get_context(method))
+    assert gifs(tmp_path, SCENARIOS) == serial
@@ -6,9 +6,21 @@ waveInterference.py
 Sandy Herho, 2024
 """
 
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation, PillowWriter
+from matplotlib.animation import FuncAnimation
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common import gifenc, raster, timings
+from superposition import Superposition
 
 # Constants for Wave 1
 lambda1 = 100.0
@@ -17,6 +29,15 @@ amp = 1.0
 xrange = 10 * lambda1
 x = np.linspace(0, xrange, 500)
 
+# Time axis shared by all scenarios: 200 frames over 10 periods of wave 1
+trange = 10 * T1
+dt = trange / 200
+ntot = int(trange / dt)
+FPS = 15
+
+# Colors of wave 1, wave 2 and their superposition
+COLORS = ['blue', 'green', 'red']
+
 # Scenarios for Wave 2
 scenarios = [
     {"lambda2": 100, "T2": 50, "label": "Scenario 1"},
@@ -27,48 +48,199 @@ scenarios = [
     {"lambda2": 95, "T2": -30, "label": "Scenario 6"}
 ]
 
-def create_animation(scenario):
+def wave_frames(scenario, nframes=ntot):
+    """
+    Wave 1, wave 2 and their superposition at the first nframes frame
+    times, each of shape (nframes, len(x)), from the spectral
+    superposition engine.
+    """
+    with timings.stage("compute"):
+        engine = Superposition([(amp, lambda1, T1), (amp, scenario["lambda2"], scenario["T2"])], x)
+        t = np.arange(nframes) * dt
+        waves = engine.components(t)
+        total = engine.elevation(t)
+    timings.count("steps", nframes)
+    return waves[:, 0], waves[:, 1], total
+
+def setup_figure(scenario, nframes=ntot):
+    """
+    Build the figure of the first nframes frames of one scenario. Returns
+    the figure, the update function (frame -> artists) and the number of
+    frames.
+    """
     lambda2 = scenario["lambda2"]
     T2 = scenario["T2"]
-    label = scenario["label"]
-    
+
     plt.style.use('bmh')
-    trange = 10 * T1
-    dt = trange / 200
-    ntot = int(trange / dt)
-    
+
     fig, axes = plt.subplots(3, 1, figsize=(10, 8))
     for ax in axes:
         ax.set_xlim(0, xrange)
         ax.set_ylim(-2, 2)
         ax.grid(True)
-    
+
     axes[0].set_title(f"Wave 1: λ={lambda1}, T={T1}")
     axes[1].set_title(f"Wave 2: λ={lambda2}, T={T2}")
     axes[2].set_title("Superposition of Wave 1 and 2")
 
-    # Custom colors for each line
-    colors = ['blue', 'green', 'red']
-    lines = [axes[i].plot([], [], lw=2, color=colors[i])[0] for i in range(3)]
-    
+    lines = [axes[i].plot([], [], lw=2, color=COLORS[i])[0] for i in range(3)]
+    waves = wave_frames(scenario, nframes)
+
     def update(frame):
-        t = frame * dt
-        f1 = amp * np.sin(2 * np.pi * (x / lambda1 - t / T1))
-        f2 = amp * np.sin(2 * np.pi * (x / lambda2 - t / T2))
-        f3 = f1 + f2
-
-        lines[0].set_data(x, f1)
-        lines[1].set_data(x, f2)
-        lines[2].set_data(x, f3)
+        for line, f in zip(lines, waves):
+            line.set_data(x, f[frame])
         return lines
-    
-    ani = FuncAnimation(fig, update, frames=ntot, blit=True, interval=50)
-    gif_filename = f'waves_{label.replace(" ", "_").lower()}.gif'
-    ani.save(gif_filename, writer=PillowWriter(fps=15))
+
+    return fig, update, nframes
+
+def gif_filename(scenario):
+    return f'waves_{scenario["label"].replace(" ", "_").lower()}.gif'
+
+def create_animation(scenario, nframes=ntot):
+    fig, update, nframes = setup_figure(scenario, nframes)
+    ani = FuncAnimation(fig, timings.wrap(update, "update"), frames=nframes, blit=True, interval=50)
+    ani.save(gif_filename(scenario), writer=timings.writer(gifenc.writer(fps=FPS, colors=COLORS)))
     plt.close(fig)  # Close the figure to free memory
 
+def create_animation_raster(scenario, nframes=ntot):
+    """
+    Same animation as create_animation(), drawn with the matplotlib-free
+    raster backend: the three panels of the 10x8 inch figure are laid out
+    once and each frame only rasterizes the three polylines.
+    """
+    lambda2 = scenario["lambda2"]
+    T2 = scenario["T2"]
+
+    canvas = raster.Canvas(1000, 800)
+    titles = [f"Wave 1: λ={lambda1}, T={T1}", f"Wave 2: λ={lambda2}, T={T2}",
+              "Superposition of Wave 1 and 2"]
+    # Subplot positions of a 3x1 matplotlib figure (left .125, right .9, bottom .11, top .88)
+    height = 0.77 / 3.4
+    panels = [canvas.panel((0.125, 0.88 - (i + 1) * height - i * 0.2 * height, 0.775, height),
+                           (0, xrange), (-2, 2), title=titles[i]) for i in range(3)]
+    waves = wave_frames(scenario, nframes)
+
+    def frames():
+        for frame in range(nframes):
+            canvas.begin()
+            for panel, f, color in zip(panels, waves, COLORS):
+                canvas.polyline(panel, x, f[frame], color, width=2)
+            yield canvas.frame
+
+    raster.save_gif(frames(), gif_filename(scenario), FPS, colors=COLORS)
+
+def grab(fig):
+    """ The figure as an RGBA array, grabbed as gifenc.writer() does. """
+    w, h = fig.get_size_inches()
+    buf = BytesIO()
+    fig.savefig(buf, format="rgba", dpi=fig.dpi)
+    return np.frombuffer(buf.getbuffer(), dtype=np.uint8).reshape(int(h * fig.dpi), int(w * fig.dpi), 4)
+
+def frame_palette(scenario, nframes=ntot):
+    """
+    Colors of the global GIF palette of a scenario: built from its first
+    frame, as gifenc.writer() builds it in create_animation().
+    """
+    fig, update, _ = setup_figure(scenario, nframes)
+    update(0)
+    colors = gifenc.Palette.build(grab(fig), COLORS).colors
+    plt.close(fig)
+    return colors
+
+def render_frames(scenario, start, stop, colors, nframes=ntot):
+    """
+    Render frames start..stop-1 of the nframes frames of a scenario in a
+    fresh figure and map them to the palette of frame_palette() (its
+    colors), so chunks rendered by different processes stitch into the
+    same bytes as a serial run. Returns the frames as palette index arrays.
+    """
+    fig, update, _ = setup_figure(scenario, nframes)
+    palette = gifenc.Palette(colors)
+    frames = []
+    for frame in range(start, stop):
+        update(frame)
+        frames.append(palette.index(grab(fig)))
+    plt.close(fig)
+    return frames
+
+def frame_spans(ntot, chunks):
+    """ Split range(ntot) into at most `chunks` contiguous (start, stop) spans. """
+    edges = np.linspace(0, ntot, min(chunks, ntot) + 1).astype(int)
+    return list(zip(edges[:-1], edges[1:]))
+
+def render_parallel(scenarios, workers=None, chunks=1, nframes=ntot, context=None):
+    """
+    Render the first nframes frames of scenarios on a process pool, whose
+    workers get everything they need as arguments (context: the
+    multiprocessing context of the pool, e.g. spawn).
+
+    chunks=1: every worker renders and encodes whole scenarios. chunks>1:
+    every scenario is also split into frame chunks rendered by separate
+    workers. The chunks are encoded in frame order as they arrive, while
+    the workers render the next ones, and at most two chunks per worker
+    are submitted ahead, so only those are held in memory. The GIFs are
+    byte-for-byte identical to those of create_animation().
+    """
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        if chunks <= 1:
+            list(pool.map(partial(create_animation, nframes=nframes), scenarios))
+            return
+
+        palettes = [pool.submit(frame_palette, scenario, nframes) for scenario in scenarios]
+
+        def jobs():
+            for scenario, palette in zip(scenarios, palettes):
+                colors = palette.result()
+                for start, stop in frame_spans(nframes, chunks):
+                    yield scenario, colors, start, stop
+
+        jobs = jobs()
+        pending = deque()
+
+        def submit():
+            job = next(jobs, None)
+            if job is not None:
+                scenario, colors, start, stop = job
+                pending.append((job, pool.submit(render_frames, scenario, start, stop, colors, nframes)))
+
+        for _ in range(2 * (workers or os.cpu_count() or 1)):
+            submit()
+        gif = None
+        while pending:
+            (scenario, colors, start, stop), future = pending.popleft()
+            with timings.stage("render"):
+                frames = future.result()
+            submit()
+            if start == 0:
+                gif = gifenc.Encoder(gif_filename(scenario), FPS, palette=gifenc.Palette(colors))
+            for indices in frames:
+                gif.add_indices(indices)
+            timings.count("frames", len(frames))
+            if stop == nframes:
+                gif.close()
+                timings.count_file(gif.filename)
+
 if __name__ == '__main__':
-    # Run the animation creation for each scenario
-    for scenario in scenarios:
-        create_animation(scenario)
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Wave interference animations")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="render on a pool of this many processes (1: serial)")
+    parser.add_argument("--chunks", type=int, default=1,
+                        help="split each animation into this many frame chunks")
+    parser.add_argument("--backend", choices=("matplotlib", "raster"), default="matplotlib",
+                        help="raster: draw frames without matplotlib (common/raster.py)")
+    args = parser.parse_args()
 
+    if args.backend == "raster":
+        if args.workers == 1:
+            for scenario in scenarios:
+                create_animation_raster(scenario)
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                list(pool.map(create_animation_raster, scenarios))
+    elif args.workers == 1 and args.chunks == 1:
+        # Run the animation creation for each scenario
+        for scenario in scenarios:
+            create_animation(scenario)
+    else:
+        render_parallel(scenarios, workers=args.workers, chunks=args.chunks)
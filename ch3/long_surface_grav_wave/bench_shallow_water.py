@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""
+bench_shallow_water.py
+
+Accuracy and cost of the finite-difference model in shallow_water.py
+against the analytic progressive wave of long_surf_wave.py.
+
+For every grid size the periodic model is started from the analytic wave
+and run for one wave period; the table lists the time per step of the
+model, the time to evaluate the analytic eta and u on the same grid, and
+the largest eta error at the end (m, for a 1 m wave).
+
+Sandy Herho, 2024
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from shallow_water import ShallowWater1D
+
+# Same wave as long_surf_wave.py
+LEN_WAVE = 500.0
+ETA0 = 1.0
+G = 9.81
+H = 20.0
+
+
+def analytic(x_eta, x_u, t):
+    c = np.sqrt(G * H)
+    per = LEN_WAVE / c
+    u0 = ETA0 * np.sqrt(G / H)
+    return (ETA0 * np.sin(2 * np.pi * (x_eta / LEN_WAVE - t / per)),
+            u0 * np.sin(2 * np.pi * (x_u / LEN_WAVE - t / per)))
+
+
+def bench(ncells, cfl=0.9, max_steps=None):
+    """ (seconds per model step, seconds per analytic evaluation, max |eta error|, steps) """
+    model = ShallowWater1D(2 * LEN_WAVE, ncells, h=H, g=G, cfl=cfl)
+    model.set_wave(ETA0, LEN_WAVE)
+    period = LEN_WAVE / model.c
+    nsteps = max(int(np.ceil(period / model.dt)), 1)
+    dt = period / nsteps
+    if max_steps is not None and nsteps > max_steps:
+        nsteps = max_steps   # stop early on fine grids, error is then at t < period
+
+    start = time.perf_counter()
+    model.step(nsteps, dt)
+    t_model = (time.perf_counter() - start) / nsteps
+
+    reps = min(nsteps, 50)
+    start = time.perf_counter()
+    for _ in range(reps):
+        eta, _ = analytic(model.x_eta, model.x_u, model.t)
+    t_analytic = (time.perf_counter() - start) / reps
+
+    return t_model, t_analytic, np.abs(model.eta - eta).max(), nsteps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--cells", type=int, nargs="+", default=[100, 1000, 10000, 100000, 1000000])
+    parser.add_argument("--cfl", type=float, default=0.9)
+    parser.add_argument("--max-steps", type=int, default=2000,
+                        help="cap on the steps per grid (the error is then taken earlier)")
+    args = parser.parse_args()
+
+    print(f"{'cells':>9} {'steps':>7} {'model/step':>12} {'analytic':>12} {'max |err|':>11}")
+    for n in args.cells:
+        t_model, t_analytic, err, nsteps = bench(n, args.cfl, args.max_steps)
+        print(f"{n:>9d} {nsteps:>7d} {t_model * 1e6:>10.1f}us {t_analytic * 1e6:>10.1f}us {err:>11.2e}")
+
+
+if __name__ == "__main__":
+    main()
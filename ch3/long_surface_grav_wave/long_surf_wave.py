@@ -9,14 +9,36 @@ Sandy Herho <sh001@ucr.edu>
 04/21/2024
 """
 
+import argparse
+import os
+import sys
+from io import BytesIO
+
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation, PillowWriter
+from matplotlib.animation import AbstractMovieWriter, FuncAnimation
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common import checkpoint, gifenc, raster, timings
+from shallow_water import ShallowWater1D
+from particles import ParticleTracker, model_velocity, wave_velocity
+
+# Legend labels and colors of the plot lines, surface wave first
+LABELS = ['Surface Wave', 'Fluid Parcel at 16m Depth', 'Fluid Parcel at 11m Depth', 'Fluid Parcel at 6m Depth', 'Fluid Parcel at 1m Depth']
+COLORS = ['#2eaaf2', '#03263b', '#074d75', '#08679e', '#0a88d1']
+
+# Initial z-positions (above the sea floor) of the fluid parcel rows, in plotting order
+PARCEL_HEIGHTS = [16.0, 11.0, 6.0, 1.0]
 
 class WaveAnimation:
-    def __init__(self):
+    def __init__(self, solver='analytic', ncells=200, boundary='periodic', integrator=None):
         """
         Initialize the wave animation with physical constants and settings.
+        solver='numerical' takes eta and u from the finite-difference model
+        in shallow_water.py (ncells cells over the plotted range) instead of
+        the analytic solution. integrator ('euler', 'rk2' or 'rk4') advects
+        the parcels with the particle tracker of particles.py; by default
+        they are moved with the one-step displacement of the course.
         """
         self.len_wave = 500.0  # Wavelength of the wave in meters.
         self.eta0 = 1.0        # Amplitude of the wave in meters.
@@ -28,24 +50,73 @@ class WaveAnimation:
 
         self.xrange = 2 * self.len_wave  # Horizontal range to cover in the plot in meters.
         self.x = np.linspace(0, self.xrange, 100)  # X-coordinates for plotting.
-        self.t = 0.0  # Start time of the simulation.
         self.trange = 2 * self.per  # Total time range to simulate in seconds.
         self.dt = self.trange / 100.  # Time step in seconds.
         self.ntot = int(self.trange / self.dt)  # Total number of time steps.
 
-        # Initial z-positions for different fluid parcels
-        self.zpos1 = np.ones_like(self.x)
-        self.zpos2 = 6.0 * np.ones_like(self.x)
-        self.zpos3 = 11.0 * np.ones_like(self.x)
-        self.zpos4 = 16.0 * np.ones_like(self.x)
+        self.model = None
+        if solver == 'numerical':
+            self.model = ShallowWater1D(self.xrange, ncells, h=self.h, g=self.g, boundary=boundary)
+        elif solver != 'analytic':
+            raise ValueError(f"unknown solver: {solver}")
+        self.integrator = integrator
+
+        self.reset()
 
         # Set up matplotlib plot aesthetics
         plt.style.use('bmh')
         self.fig, self.ax = plt.subplots()
         self.setup_plot()
 
-        # Initialize the animation
-        self.ani = FuncAnimation(self.fig, self.animate, frames=self.ntot, init_func=self.init, blit=True, interval=50)
+        # Initialize the animation. Its frames start at self.first, so that
+        # a checkpointed save can resume it at any frame.
+        self.first = 0
+        self.ani = FuncAnimation(self.fig, timings.wrap(self.animate, "update"), frames=self.frames,
+                                 init_func=self.init, blit=True, interval=50, cache_frame_data=False)
+
+    def frames(self):
+        """ Frame numbers of the animation: self.first to the last one. """
+        return iter(range(self.first, self.ntot))
+
+    def reset(self):
+        """
+        Set the time and the z-positions of the fluid parcels back to their initial values.
+        """
+        self.t = 0.0  # Start time of the simulation.
+        self.zpos = np.array(PARCEL_HEIGHTS)[:, None] * np.ones_like(self.x)  # One row per parcel line
+        if self.model is not None:
+            self.model.set_wave(self.eta0, self.len_wave)
+
+        self.tracker = None
+        if self.integrator is not None:
+            if self.model is None:
+                velocity = wave_velocity(self.eta0, self.len_wave, h=self.h, g=self.g)
+            else:
+                velocity = model_velocity(self.model)
+            self.tracker = ParticleTracker(self.x, self.zpos, velocity, self.integrator)
+
+    def state(self):
+        """ Everything step() depends on, as arrays for a checkpoint. """
+        state = {"t": self.t, "zpos": self.zpos}
+        if self.model is not None:
+            state.update(eta=self.model.eta, u=self.model.u, model_t=self.model.t,
+                         model_steps=self.model.steps)
+        if self.tracker is not None:
+            state.update(pos=self.tracker.pos, tracker_t=self.tracker.t)
+        return state
+
+    def restore(self, state):
+        """ Continue from a state() taken after reset() with the same settings. """
+        self.t = float(state["t"])
+        self.zpos[...] = state["zpos"]
+        if self.model is not None:
+            self.model.eta[:] = state["eta"]
+            self.model.u[:] = state["u"]
+            self.model.t = float(state["model_t"])
+            self.model.steps = int(state["model_steps"])
+        if self.tracker is not None:
+            self.tracker.pos[...] = state["pos"]
+            self.tracker.t = float(state["tracker_t"])
 
     def setup_plot(self):
         """
@@ -58,10 +129,8 @@ class WaveAnimation:
         self.ax.set_ylabel('Depth [meters]', fontsize=14)
         self.ax.axhline(0, color='black', linewidth=1)  # Horizontal line representing sea level.
 
-        # Define labels and colors for the plot lines, reversing the order
-        labels = ['Surface Wave', 'Fluid Parcel at 16m Depth', 'Fluid Parcel at 11m Depth', 'Fluid Parcel at 6m Depth', 'Fluid Parcel at 1m Depth']
-        colors = ['#2eaaf2', '#03263b', '#074d75', '#08679e', '#0a88d1']
-        self.lines = [self.ax.plot([], [], lw=2, label=label, color=color)[0] for label, color in reversed(list(zip(labels, colors)))]
+        # Plot lines in the reverse order of the legend labels
+        self.lines = [self.ax.plot([], [], lw=2, label=label, color=color)[0] for label, color in reversed(list(zip(LABELS, COLORS)))]
         
         self.ax.legend()  # Add a legend to the plot
 
@@ -77,32 +146,183 @@ class WaveAnimation:
         self.time_text.set_text('')
         return self.lines + [self.time_text]
 
+    def step(self):
+        """
+        Advance the parcels by one time step. Returns the (x, y) data of the
+        plot lines (deepest parcel first, surface wave last) and the time of
+        the frame.
+        """
+        if self.model is None:
+            eta = self.eta0 * np.sin(2 * np.pi * (self.x / self.len_wave - self.t / self.per))  # Wave surface displacement
+            u = self.u0 * np.sin(2 * np.pi * (self.x / self.len_wave - self.t / self.per))  # Horizontal velocity
+            dwdz = -2 * np.pi * self.u0 / self.len_wave * np.cos(2 * np.pi * (self.x / self.len_wave - self.t / self.per))  # Vertical velocity gradient
+        else:
+            eta, u, dudx = self.model.fields(self.x)
+            dwdz = -dudx  # Continuity: dw/dz = -du/dx
+
+        if self.tracker is None:
+            xpos = np.broadcast_to(self.x + self.dt * u, self.zpos.shape)  # Calculate new positions based on horizontal velocity
+            self.zpos += self.dt * (dwdz * self.zpos)  # Update z positions based on vertical velocity
+            zpos = self.zpos
+        else:
+            self.tracker.step(self.dt)  # Advect all parcels with the velocity at their positions
+            xpos, zpos = self.tracker.x.copy(), self.tracker.z
+        if self.model is not None:
+            self.model.advance(self.dt)
+
+        data = [(xrow, -self.h + zrow) for xrow, zrow in zip(xpos, zpos)]
+        data.append((self.x, eta))  # Surface wave position
+        t = self.t
+        self.t += self.dt
+        return data, t
+
     def animate(self, i):
         """
         Update plot lines for each frame of the animation based on wave properties.
         """
-        eta = self.eta0 * np.sin(2 * np.pi * (self.x / self.len_wave - self.t / self.per))  # Wave surface displacement
-        u = self.u0 * np.sin(2 * np.pi * (self.x / self.len_wave - self.t / self.per))  # Horizontal velocity
-        dwdz = -2 * np.pi * self.u0 / self.len_wave * np.cos(2 * np.pi * (self.x / self.len_wave - self.t / self.per))  # Vertical velocity gradient
-
-        for j, zpos in enumerate([self.zpos4, self.zpos3, self.zpos2, self.zpos1]):
-            xpos = self.x + self.dt * u  # Calculate new positions based on horizontal velocity
-            w = dwdz * zpos
-            zpos += self.dt * w  # Update z positions based on vertical velocity
-            self.lines[j].set_data(xpos, -self.h + zpos)  # Set new data for each line
-        self.lines[-1].set_data(self.x, eta)  # Update surface wave position
-        self.time_text.set_text(f'Time: {self.t:.2f} s')  # Update time annotation
-        self.t += self.dt
+        with timings.stage("compute"):
+            data, t = self.step()
+        timings.count("steps")
+        for line, (xdata, ydata) in zip(self.lines, data):
+            line.set_data(xdata, ydata)
+        self.time_text.set_text(f'Time: {t:.2f} s')  # Update time annotation
         return self.lines + [self.time_text]
 
-    def save_gif(self):
+    def save_gif(self, backend='matplotlib', checkpoint_every=None, restart=False):
         """
-        Save the animation as a GIF file.
+        Save the animation as a GIF file. backend='raster' draws the same
+        frames with common/raster.py instead of redrawing the figure.
+        checkpoint_every / restart: see save_gif_checkpointed().
         """
-        self.ani.save('long_surf_grav_wav.gif', writer=PillowWriter(fps=20))
+        if checkpoint_every or restart:
+            self.save_gif_checkpointed('long_surf_grav_wav.gif', backend, checkpoint_every or 10, restart)
+        elif backend == 'raster':
+            self.save_gif_raster('long_surf_grav_wav.gif', fps=20)
+        else:
+            self.ani.save('long_surf_grav_wav.gif', writer=timings.writer(gifenc.writer(fps=20, colors=COLORS)))
+
+    def save_gif_raster(self, filename, fps=20):
+        """
+        Render the frames with the matplotlib-free raster backend: axes,
+        grid, sea level and legend are drawn once into the background of a
+        640x480 canvas, and each frame only rasterizes the five lines and
+        the time annotation.
+        """
+        self.reset()
+        raster.save_gif(self.raster_frames(), filename, fps, colors=COLORS)
+        self.reset()
+
+    def raster_frames(self, start=0):
+        """ Frames start.. of save_gif_raster() as RGB arrays (one reused buffer). """
+        canvas = raster.Canvas(640, 480)
+        panel = canvas.panel((0.125, 0.11, 0.775, 0.77), (0, self.xrange), (-20, 2),
+                             yticks=np.arange(-20, 2, 2.5), xlabel='Distance [meters]', ylabel='Depth [meters]')
+        canvas.hline(panel, 0)
+        colors = COLORS[::-1]
+        canvas.legend(panel, list(zip(LABELS[::-1], colors)), corner='center right')
+
+        for i in range(start, self.ntot):
+            with timings.stage("compute"):
+                data, t = self.step()
+            timings.count("steps")
+            canvas.begin()
+            for (xdata, ydata), color in zip(data, colors):
+                canvas.polyline(panel, xdata, ydata, color, width=2)
+            canvas.text(panel.left + 0.02 * panel.width, panel.top + 0.05 * panel.height - canvas.glyphs.height,
+                        f'Time: {t:.2f} s')
+            yield canvas.frame
+
+    def save_figure_frames(self, filename, start, add):
+        """
+        Save frames start.. of the matplotlib animation, passing each one,
+        grabbed as gifenc.writer() grabs it, to add(i, frame) instead of an
+        encoder, so they encode to the same GIF.
+        """
+        class FrameWriter(AbstractMovieWriter):
+
+            def setup(self, fig, outfile, dpi=None):
+                super().setup(fig, outfile, dpi=dpi)
+                self.i = start
+
+            def grab_frame(self, **savefig_kwargs):
+                with timings.stage("redraw"):
+                    buf = BytesIO()
+                    self.fig.savefig(buf, **{**savefig_kwargs, "format": "rgba", "dpi": self.dpi})
+                width, height = self.frame_size
+                add(self.i, np.frombuffer(buf.getbuffer(), dtype=np.uint8).reshape(height, width, 4))
+                self.i += 1
+
+            def finish(self):
+                pass
+
+        self.first = start
+        try:
+            self.ani.save(filename, writer=FrameWriter(fps=20))
+        finally:
+            self.first = 0
+
+    def save_gif_checkpointed(self, filename, backend='matplotlib', every=10, restart=False, fps=20):
+        """
+        Save the GIF with a checkpoint every `every` frames: the parcel,
+        model and tracker state (state()), the frame number and the length
+        of the spool file the finished frames are appended to. restart
+        continues from the last checkpoint; the GIF is the same as that of
+        an uninterrupted run, and as that of save_gif() without checkpoints.
+        """
+        params = {"solver": "analytic" if self.model is None else "numerical",
+                  "ncells": None if self.model is None else self.model.n,
+                  "boundary": None if self.model is None else self.model.boundary,
+                  "integrator": self.integrator, "backend": backend}
+        ckpt = checkpoint.Checkpoint(filename + '.ckpt.npz', every, params)
+
+        self.reset()
+        start, cursor = 0, None
+        saved = ckpt.resume() if restart else None
+        if saved is not None:
+            start, state, cursor = saved
+            self.restore(state)
+            print(f"Restarting at frame {start}")
+
+        spool = checkpoint.FrameSpool(filename + '.frames', cursor, colors=COLORS)
+
+        def add(i, frame):
+            with timings.stage("encode"):
+                spool.append(frame)
+            timings.count("frames")
+            if ckpt.due(i + 1) and i + 1 < self.ntot:
+                ckpt.write(i + 1, self.state(), cursor=spool.tell())
+
+        if backend == 'raster':
+            for i, frame in enumerate(self.raster_frames(start), start):
+                add(i, frame)
+        else:
+            self.save_figure_frames(filename, start, add)
+        spool.save_gif(filename, fps)
+        spool.close()
+        ckpt.clear()
+        self.reset()
 
 if __name__ == "__main__":
-    wave_anim = WaveAnimation()
-    wave_anim.save_gif()  # Save the animation as a GIF
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Long surface gravity wave animation")
+    parser.add_argument("--backend", choices=("matplotlib", "raster"), default="matplotlib",
+                        help="raster: draw the GIF frames without matplotlib (common/raster.py)")
+    parser.add_argument("--solver", choices=("analytic", "numerical"), default="analytic",
+                        help="numerical: take eta and u from the finite-difference model (shallow_water.py)")
+    parser.add_argument("--cells", type=int, default=200, help="grid cells of the numerical model")
+    parser.add_argument("--boundary", choices=("periodic", "reflective", "open"), default="periodic",
+                        help="boundary condition of the numerical model")
+    parser.add_argument("--integrator", choices=("euler", "rk2", "rk4"), default=None,
+                        help="advect the parcels with the particle tracker (particles.py)")
+    parser.add_argument("--checkpoint-every", type=int, metavar="FRAMES",
+                        help="checkpoint to long_surf_grav_wav.gif.ckpt.npz every FRAMES frames")
+    parser.add_argument("--restart", action="store_true",
+                        help="continue from the last checkpoint, if there is one")
+    args = parser.parse_args()
+
+    wave_anim = WaveAnimation(solver=args.solver, ncells=args.cells, boundary=args.boundary,
+                              integrator=args.integrator)
+    wave_anim.save_gif(backend=args.backend, checkpoint_every=args.checkpoint_every,
+                       restart=args.restart)  # Save the animation as a GIF
     plt.show()  # Display the animation
 
@@ -0,0 +1,133 @@
+"""
+particles.py
+
+Lagrangian particle tracking in the long surface gravity wave.
+
+All parcels live in one contiguous (2, N, M) array of positions, x
+(horizontal, m) and z (height above the sea floor, m), and are advanced
+together. The velocity is evaluated at the actual parcel positions, either
+from the analytic wave of long_surf_wave.py or interpolated from the
+finite-difference model of shallow_water.py, with w = -z * du/dx from
+continuity and w = 0 at the floor.
+
+Because the parcels are advected with the velocity at their own
+position, their mean motion over a wave period is the Lagrangian (Stokes)
+drift; for the linear long wave it is eta0^2 * c / (2*h^2) at every depth.
+
+Sandy Herho, 2024
+"""
+
+import numpy as np
+
+INTEGRATORS = ("euler", "rk2", "rk4")
+
+
+def wave_velocity(eta0, wavelength, h=20.0, g=9.81):
+    """ Velocity (u, w) of the progressive long wave eta0*sin(k*x - omega*t). """
+    c = np.sqrt(g * h)
+    k = 2 * np.pi / wavelength
+    omega = k * c
+    u0 = eta0 * np.sqrt(g / h)
+
+    def velocity(x, z, t):
+        phase = k * x - omega * t
+        return u0 * np.sin(phase), -k * u0 * np.cos(phase) * z
+
+    return velocity
+
+
+def model_velocity(model):
+    """
+    Velocity (u, w) interpolated from a ShallowWater1D model at its current
+    state; the field is frozen over a tracker step, so the tracker should
+    step in lockstep with the model.
+    """
+    def velocity(x, z, t):
+        _, u, dudx = model.fields(x)
+        return u, -dudx * z
+
+    return velocity
+
+
+def stokes_drift(eta0, h=20.0, g=9.81):
+    """ Stokes drift (m/s) of the linear long wave, the same at every depth. """
+    return eta0 ** 2 * np.sqrt(g * h) / (2 * h ** 2)
+
+
+class ParticleTracker:
+    """
+    Parcels at the positions x, z (broadcast to a common shape) advected by
+    velocity(x, z, t) -> (u, w) with the explicit Euler, midpoint (rk2) or
+    classical fourth-order Runge-Kutta (rk4) scheme.
+    """
+
+    def __init__(self, x, z, velocity, integrator="rk4", t=0.0):
+        if integrator not in INTEGRATORS:
+            raise ValueError(f"unknown integrator: {integrator}")
+        x, z = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(z, dtype=float))
+        self.shape = x.shape
+        self.pos = np.empty((2,) + self.shape)
+        self.pos[0] = x
+        self.pos[1] = z
+        self.start = self.pos.copy()
+        self.velocity = velocity
+        self.integrator = integrator
+        self.t = self.t0 = t
+
+        nstages = {"euler": 1, "rk2": 2, "rk4": 4}[integrator]
+        self._k = np.empty((nstages,) + self.pos.shape)
+        self._tmp = np.empty(self.pos.shape)
+
+    @property
+    def x(self):
+        return self.pos[0]
+
+    @property
+    def z(self):
+        return self.pos[1]
+
+    def __len__(self):
+        return self.pos[0].size
+
+    def _rate(self, pos, t, out):
+        out[0], out[1] = self.velocity(pos[0], pos[1], t)
+
+    def _stage(self, i, scale, dt):
+        """ Temporary positions pos + scale*dt*k_i. """
+        np.multiply(self._k[i], scale * dt, out=self._tmp)
+        self._tmp += self.pos
+        return self._tmp
+
+    def step(self, dt, nsteps=1):
+        """ Advance all parcels nsteps steps of length dt. """
+        k = self._k
+        for _ in range(nsteps):
+            t = self.t
+            self._rate(self.pos, t, k[0])
+            if self.integrator == "euler":
+                k[0] *= dt
+                self.pos += k[0]
+            elif self.integrator == "rk2":
+                self._rate(self._stage(0, 0.5, dt), t + 0.5 * dt, k[1])
+                k[1] *= dt
+                self.pos += k[1]
+            else:
+                self._rate(self._stage(0, 0.5, dt), t + 0.5 * dt, k[1])
+                self._rate(self._stage(1, 0.5, dt), t + 0.5 * dt, k[2])
+                self._rate(self._stage(2, 1.0, dt), t + dt, k[3])
+                k[1] += k[2]
+                k[1] *= 2
+                k[1] += k[0]
+                k[1] += k[3]
+                k[1] *= dt / 6
+                self.pos += k[1]
+            self.t = t + dt
+
+    def drift(self):
+        """
+        Mean Lagrangian velocity (u, w) of every parcel since the start,
+        i.e. its net displacement divided by the elapsed time. Over whole
+        wave periods this is the Stokes drift.
+        """
+        elapsed = self.t - self.t0
+        return (self.pos[0] - self.start[0]) / elapsed, (self.pos[1] - self.start[1]) / elapsed
@@ -0,0 +1,56 @@
+"""
+Checkpointed and restarted GIFs of long_surf_wave.py are the bytes of
+the plain run.
+"""
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pytest
+
+import long_surf_wave
+from common import checkpoint
+
+FILENAME = 'long_surf_grav_wav.gif'
+
+
+def animation(**kwargs):
+    """ The first 12 frames only, so that a run takes seconds. """
+    wave = long_surf_wave.WaveAnimation(**kwargs)
+    wave.ntot = 12
+    return wave
+
+
+@pytest.fixture(autouse=True)
+def close_figures():
+    yield
+    plt.close('all')
+
+
+@pytest.mark.parametrize("backend", ["matplotlib", "raster"])
+@pytest.mark.parametrize("solver", ["analytic", "numerical"])
+def test_restart_after_crash(backend, solver, tmp_path_factory, monkeypatch):
+    plain = tmp_path_factory.mktemp("plain")
+    monkeypatch.chdir(plain)
+    animation(solver=solver).save_gif(backend=backend)
+    reference = (plain / FILENAME).read_bytes()
+
+    crashed = tmp_path_factory.mktemp("crashed")
+    monkeypatch.chdir(crashed)
+    write = checkpoint.Checkpoint.write
+    calls = []
+
+    def dying_write(self, *args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        write(self, *args, **kwargs)
+
+    monkeypatch.setattr(checkpoint.Checkpoint, "write", dying_write)
+    with pytest.raises(KeyboardInterrupt):
+        animation(solver=solver).save_gif(backend=backend, checkpoint_every=4)
+    monkeypatch.setattr(checkpoint.Checkpoint, "write", write)
+    assert not (crashed / FILENAME).exists()
+
+    animation(solver=solver).save_gif(backend=backend, checkpoint_every=5, restart=True)
+    assert (crashed / FILENAME).read_bytes() == reference
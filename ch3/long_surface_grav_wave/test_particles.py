@@ -0,0 +1,39 @@
+"""
+ParticleTracker converges at the order of its integrator and its parcels
+drift with the Stokes drift of the long wave.
+"""
+
+import numpy as np
+import pytest
+
+from particles import ParticleTracker, stokes_drift, wave_velocity
+
+WAVELENGTH = 200.0
+PERIOD = WAVELENGTH / np.sqrt(9.81 * 20.0)
+X = np.linspace(0.0, WAVELENGTH, 9, endpoint=False)
+Z = np.array([5.0, 15.0])[:, None]
+
+
+@pytest.mark.parametrize("integrator, order", [("euler", 1), ("rk2", 2), ("rk4", 4)])
+def test_convergence_order(integrator, order):
+    velocity = wave_velocity(1.0, WAVELENGTH)
+    reference = ParticleTracker(X, Z, velocity, "rk4")
+    reference.step(PERIOD / 4000, 4000)
+    errors = []
+    for nsteps in (20, 40, 80):
+        tracker = ParticleTracker(X, Z, velocity, integrator)
+        tracker.step(PERIOD / nsteps, nsteps)
+        assert tracker.t == pytest.approx(PERIOD)
+        errors.append(np.abs(tracker.pos - reference.pos).max())
+    np.testing.assert_allclose(np.log2(np.array(errors[:-1]) / errors[1:]), order, atol=0.1)
+
+
+def test_mean_drift_is_the_stokes_drift():
+    tracker = ParticleTracker(X, Z, wave_velocity(0.2, WAVELENGTH), "rk4")
+    tracker.step(PERIOD / 50, 500)
+    u, w = tracker.drift()
+    assert u.shape == (2, 9)
+    assert u.mean() == pytest.approx(stokes_drift(0.2), rel=1e-3)
+    np.testing.assert_allclose(u, stokes_drift(0.2), rtol=0.02)
+    np.testing.assert_allclose(u[0], u[1], rtol=1e-3)   # the same at every depth
+    assert np.abs(w).max() < 1e-2 * stokes_drift(0.2)   # no net vertical drift
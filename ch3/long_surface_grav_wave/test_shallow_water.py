@@ -0,0 +1,81 @@
+"""
+ShallowWater1D: the CFL limit, the three boundary conditions, and mass
+conservation.
+"""
+
+import numpy as np
+import pytest
+
+from shallow_water import BOUNDARIES, ShallowWater1D
+
+
+def pulse(boundary):
+    model = ShallowWater1D(1000.0, 400, h=20.0, boundary=boundary)
+    model.set_state(np.exp(-((model.x_eta - 300.0) / 30.0) ** 2), 0.0)
+    return model
+
+
+def energy(model):
+    return model.g * (model.eta ** 2).sum() + model.h * (model.u ** 2).sum()
+
+
+def test_cfl_limit():
+    model = ShallowWater1D(1000.0, 400, h=20.0)
+    assert model.dt_max == pytest.approx(2.5 / np.sqrt(9.81 * 20.0))
+    assert model.dt == pytest.approx(0.9 * model.dt_max)
+    with pytest.raises(ValueError, match="CFL"):
+        ShallowWater1D(1000.0, 400, h=20.0, dt=1.01 * model.dt_max)
+
+    # Grid-scale noise stays bounded below the limit
+    model.set_state(np.random.default_rng(0).normal(size=400), 0.0)
+    start = np.abs(model.eta).max()
+    model.step(5000)
+    assert np.abs(model.eta).max() < 1.5 * start
+
+
+def test_periodic_wave_returns_after_one_period():
+    model = ShallowWater1D(1000.0, 400, h=20.0)
+    model.set_wave(0.5, 250.0)
+    eta, u = model.eta.copy(), model.u.copy()
+    model.advance(250.0 / model.c)
+    assert model.t == pytest.approx(250.0 / model.c)
+    np.testing.assert_allclose(model.eta, eta, atol=1e-3)
+    np.testing.assert_allclose(model.u, u, atol=1e-3)
+    assert model.u[0] == model.u[-1]
+
+
+@pytest.mark.parametrize("boundary", ["periodic", "reflective"])
+def test_closed_domains_conserve_mass(boundary):
+    model = pulse(boundary)
+    mass, start = model.eta.sum(), energy(model)
+    model.advance(1500.0 / model.c)
+    assert abs(model.eta.sum() - mass) < 1e-12 * np.abs(model.eta).sum()
+    assert energy(model) == pytest.approx(start, rel=1e-2)
+
+
+def test_reflective_walls():
+    model = pulse("reflective")
+    model.advance(1500.0 / model.c)
+    assert model.u[0] == model.u[-1] == 0.0
+    # Both halves of the pulse are still in the domain, one of them reflected
+    assert np.abs(model.eta).max() > 0.45
+
+
+def test_open_boundaries_let_waves_out():
+    model = pulse("open")
+    start = energy(model)
+    model.advance(1500.0 / model.c)
+    assert energy(model) < 1e-4 * start
+    assert np.abs(model.eta).max() < 1e-2
+
+
+@pytest.mark.parametrize("boundary", BOUNDARIES)
+def test_stream_matches_step(boundary):
+    model, reference = pulse(boundary), pulse(boundary)
+    blocks = list(model.stream(25, every=4, block=3))
+    assert [len(b["time"]) for b in blocks] == [3, 3, 1]
+    reference.step(24)
+    np.testing.assert_array_equal(blocks[-1]["eta"][-1], reference.eta)
+    reference.step(1)
+    np.testing.assert_array_equal(model.eta, reference.eta)
+    assert model.steps == 25
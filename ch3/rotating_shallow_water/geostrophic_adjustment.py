@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""
+geostrophic_adjustment.py
+
+Geostrophic adjustment of a Gaussian hump of sea level released from rest
+in the 2-D rotating shallow-water model of rsw2d.py. Gravity waves radiate
+away and what remains is a hump in geostrophic balance with a clockwise
+(northern hemisphere) circulation around it, about one Rossby radius
+c/f wide.
+
+Prints the energy partition once per inertial period and the throughput in
+cell updates per second, and writes the final state with common/simio.py
+(cell-centre columns x, y, eta, u, v).
+
+Sandy Herho, 2024
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from common import simio, timings
+from rsw2d import BOUNDARIES, RotatingShallowWater2D, coriolis_parameter
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Geostrophic adjustment in the 2-D rotating shallow-water model")
+    parser.add_argument("--nx", type=int, default=400, help="cells in x")
+    parser.add_argument("--ny", type=int, default=400, help="cells in y")
+    parser.add_argument("--dx", type=float, default=10e3, help="cell size (m)")
+    parser.add_argument("--depth", type=float, default=100.0, help="water depth (m)")
+    parser.add_argument("--latitude", type=float, default=45.0, help="latitude (degrees)")
+    parser.add_argument("--amplitude", type=float, default=1.0, help="initial hump height (m)")
+    parser.add_argument("--width", type=float, default=300e3, help="e-folding radius of the hump (m)")
+    parser.add_argument("--periods", type=float, default=2.0, help="run length in inertial periods")
+    parser.add_argument("--boundary", choices=BOUNDARIES, default="periodic")
+    parser.add_argument("--tiles", type=int, nargs=2, default=(1, 1), metavar=("TY", "TX"),
+                        help="domain decomposition (tiles in y and x)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per tile)")
+    parser.add_argument("--output", default="output_geostrophic.npy")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    f = coriolis_parameter(args.latitude)
+
+    with RotatingShallowWater2D(args.nx, args.ny, args.dx, h=args.depth, f=f,
+                                boundary=args.boundary, tiles=args.tiles,
+                                workers=args.workers) as model:
+        x, y = model.grid()
+        x0, y0 = 0.5 * args.nx * args.dx, 0.5 * args.ny * model.dy
+        model.set_state(args.amplitude * np.exp(-((x - x0) ** 2 + (y - y0) ** 2) / args.width ** 2))
+
+        inertial_period = 2 * np.pi / abs(f)
+        per_period = int(round(inertial_period / model.dt))
+        nsteps = int(round(args.periods * inertial_period / model.dt))
+        print(f"grid {args.nx}x{args.ny}, dt = {model.dt:.1f} s, {per_period} steps per inertial period, "
+              f"Rossby radius {model.c / abs(f) / 1e3:.0f} km, {model.workers} worker(s)")
+        print(f"{'period':>6} {'kinetic':>12} {'potential':>12}")
+
+        elapsed = 0.0
+        while True:
+            kinetic, potential = model.energy()
+            print(f"{model.t / inertial_period:>6.2f} {kinetic:>12.4e} {potential:>12.4e}")
+            if model.steps == nsteps:
+                break
+            chunk = min(per_period, nsteps - model.steps)
+            start = time.perf_counter()
+            with timings.stage("compute"):
+                model.step(chunk)
+            elapsed += time.perf_counter() - start
+            timings.count("steps", chunk)
+
+        rate = args.nx * args.ny * model.steps / elapsed
+        print(f"{model.steps} steps in {elapsed:.2f} s, {rate / 1e6:.1f} M cell updates/s")
+
+        # Velocities averaged to the cell centres
+        u, v = model.u, model.v
+        uc = 0.5 * (u + np.roll(u, 1, axis=1))
+        vc = 0.5 * (v + np.roll(v, 1, axis=0))
+        if args.boundary == "closed":
+            uc[:, 0] = 0.5 * u[:, 0]
+            vc[0, :] = 0.5 * v[0, :]
+        simio.save(args.output, {"x": x.ravel(), "y": y.ravel(), "eta": model.eta.ravel(),
+                                 "u": uc.ravel(), "v": vc.ravel()},
+                   meta={"nx": args.nx, "ny": args.ny, "dx": args.dx, "dt": model.dt,
+                         "steps": model.steps, "f": f, "depth": args.depth})
+
+
+if __name__ == "__main__":
+    timings.setup(__file__)
+    main()
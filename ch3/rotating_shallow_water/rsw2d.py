@@ -0,0 +1,447 @@
+"""
+rsw2d.py
+
+2-D linear rotating shallow-water model
+
+    du/dt   = -g * deta/dx + f*v
+    dv/dt   = -g * deta/dy - f*u
+    deta/dt = -h * (du/dx + dv/dy)
+
+on an Arakawa C-grid, parallelised by domain decomposition.
+
+Time stepping combines the forward-backward scheme of long_surf_wave's
+shallow_water.py with the trapezoidal (Crank-Nicolson) Coriolis scheme of
+iner_osci_v1.py, alpha = f*dt, beta = alpha^2/4:
+
+    u^(n+1) = u^n - dt*g*deta/dx + alpha/2 * (v^n + v^(n+1))
+    v^(n+1) = v^n - dt*g*deta/dy - alpha/2 * (u^n + u^(n+1))
+    eta^(n+1) = eta^n - dt*h*div(u^(n+1), v^(n+1))
+
+The velocity equations are solved as a predictor holding every term at
+time n, followed by the exact rotation of (u*, v*):
+
+    u* = u^n - dt*g*deta/dx + alpha/2 * v^n
+    v* = v^n - dt*g*deta/dy - alpha/2 * u^n
+    u^(n+1) = (u* + alpha/2 * v*) / (1 + beta)
+    v^(n+1) = (v* - alpha/2 * u*) / (1 + beta)
+
+where v at u points and u at v points are four-point averages. Without
+pressure gradients this is the rotation of iner_osci_v1.py, and a state
+in geostrophic balance stays (up to the averaging) steady.
+
+Grid: every field is stored as an (ny+2, nx+2) array whose outer ring is
+a ghost (halo) layer. eta[j, i] is the centre of cell (j, i), u[j, i] its
+east face and v[j, i] its north face, for j = 1..ny, i = 1..nx. Boundaries
+are doubly periodic or closed walls (no normal flow).
+
+Parallelism: the fields live in one multiprocessing.shared_memory block.
+The interior is cut into rectangular tiles and every worker process of a
+persistent pool advances its tiles in place, reading the one-cell halo
+around them straight from the neighbouring tiles in shared memory. u* and
+v* have their own slots, so a step needs no copies. A worker also fills
+the part of the outer ring that copies (periodic) or closes (walls) the
+cells it has just updated, so a step takes three barriers, after the
+predictor, the rotation and the continuity update, and no serial halo
+refresh. Every cell sees the same arithmetic whatever the tiling, so the
+results are bit-for-bit independent of the number of workers. Workers give up on a barrier after `timeout` seconds
+and report their errors; the model checks that they are alive while it
+waits, and the shared memory is unlinked when the model is closed or
+garbage collected, or at exit.
+
+Sandy Herho, 2024
+"""
+
+import multiprocessing as mp
+import queue
+import traceback
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+BOUNDARIES = ("periodic", "closed")
+OMEGA = 2 * np.pi / (24 * 3600)   # rotation rate of the earth, as in the course
+
+# Field slots in the shared block: the state and the predicted velocities
+ETA, U, V, USTAR, VSTAR = range(5)
+TIMEOUT = 60.0   # seconds a worker waits for the others at a barrier
+POLL = 0.5       # seconds between liveness checks of the workers
+
+
+def coriolis_parameter(latitude):
+    """ f = 2*OMEGA*sin(latitude), latitude in degrees. """
+    return 2 * OMEGA * np.sin(np.radians(latitude))
+
+
+def tile_bounds(n, parts):
+    """ Split cells 1..n into `parts` contiguous [start, stop) ranges. """
+    edges = np.linspace(1, n + 1, min(parts, n) + 1).astype(int)
+    return list(zip(edges[:-1], edges[1:]))
+
+
+class _Tile:
+    """
+    One rectangle of interior cells, its preallocated work arrays and its
+    part of the outer ring of an nx x ny domain: the (ghost, cell) slice
+    pairs that wrap its edge cells around, and whether it holds the east
+    or north wall.
+    """
+
+    def __init__(self, j0, j1, i0, i1, nx, ny):
+        self.J = slice(j0, j1)
+        self.I = slice(i0, i1)
+        self.Jm, self.Jp = slice(j0 - 1, j1 - 1), slice(j0 + 1, j1 + 1)
+        self.Im, self.Ip = slice(i0 - 1, i1 - 1), slice(i0 + 1, i1 + 1)
+        shape = (j1 - j0, i1 - i0)
+        self.a = np.empty(shape)
+        self.b = np.empty(shape)
+
+        # Ghost row 0 copies row ny, ghost row ny+1 row 1 (and the same for columns)
+        rows = [(self.J, self.J)] + _ghosts(j0, j1, ny)
+        cols = [(self.I, self.I)] + _ghosts(i0, i1, nx)
+        self.wrap = [((gj, gi), (sj, si)) for gj, sj in rows for gi, si in cols][1:]
+        self.east = i1 == nx + 1
+        self.north = j1 == ny + 1
+
+
+class _Kernel:
+    """
+    The numerical scheme on views of the shared fields. Used in the worker
+    processes and, for a single worker, in the calling process.
+    """
+
+    def __init__(self, fields, nx, ny, dx, dy, dt, g, h, f, boundary, tiles):
+        self.fields = fields
+        self.nx, self.ny = nx, ny
+        self.rx, self.ry = g * dt / dx, g * dt / dy
+        self.hx, self.hy = h * dt / dx, h * dt / dy
+        alpha = f * dt
+        self.half = 0.125 * alpha   # alpha/2 times the 1/4 of the four-point averages
+        self.scale = 1 / (1 + 0.25 * alpha * alpha)
+        self.boundary = boundary
+        self.tiles = [_Tile(*t, nx, ny) for t in tiles]
+
+    def predictor(self):
+        """ u*, v*: every term of the momentum equations at time n. """
+        f = self.fields
+        eta, u, v, us, vs = f[ETA], f[U], f[V], f[USTAR], f[VSTAR]
+        for t in self.tiles:
+            J, I, Jm, Jp, Im, Ip, a, b = t.J, t.I, t.Jm, t.Jp, t.Im, t.Ip, t.a, t.b
+
+            # u: pressure gradient and half the Coriolis force, v averaged to u points
+            np.subtract(eta[J, Ip], eta[J, I], out=a)
+            a *= -self.rx
+            a += u[J, I]
+            _average(v, J, I, Jm, Ip, b, self.half)
+            np.add(a, b, out=us[J, I])
+
+            # v: pressure gradient and half the Coriolis force, u averaged to v points
+            np.subtract(eta[Jp, I], eta[J, I], out=a)
+            a *= -self.ry
+            a += v[J, I]
+            _average(u, J, I, Jp, Im, b, self.half)
+            np.subtract(a, b, out=vs[J, I])
+            self._edges(t, us, vs)
+
+    def rotation(self):
+        """ u^(n+1), v^(n+1): the other half of the Coriolis force, implicit. """
+        f = self.fields
+        u, v, us, vs = f[U], f[V], f[USTAR], f[VSTAR]
+        for t in self.tiles:
+            J, I, Jm, Jp, Im, Ip, b = t.J, t.I, t.Jm, t.Jp, t.Im, t.Ip, t.b
+            _average(vs, J, I, Jm, Ip, b, self.half)
+            b += us[J, I]
+            np.multiply(b, self.scale, out=u[J, I])
+            _average(us, J, I, Jp, Im, b, self.half)
+            np.subtract(vs[J, I], b, out=b)
+            np.multiply(b, self.scale, out=v[J, I])
+            self._edges(t, u, v)
+
+    def continuity(self):
+        eta, u, v = self.fields[ETA], self.fields[U], self.fields[V]
+        for t in self.tiles:
+            J, I, Jm, Im, a, b = t.J, t.I, t.Jm, t.Im, t.a, t.b
+            np.subtract(u[J, I], u[J, Im], out=a)
+            a *= self.hx
+            np.subtract(v[J, I], v[Jm, I], out=b)
+            b *= self.hy
+            a += b
+            eta[J, I] -= a
+            if self.boundary == "periodic":
+                for ghost, cell in t.wrap:
+                    eta[ghost] = eta[cell]
+
+    def _edges(self, t, un, vn):
+        """ The outer ring of the velocities un, vn next to the cells of tile t. """
+        if self.boundary == "periodic":
+            for ghost, cell in t.wrap:
+                un[ghost] = un[cell]
+                vn[ghost] = vn[cell]
+            return
+        if t.east:
+            un[t.J, self.nx] = 0.0
+        if t.north:
+            vn[self.ny, t.I] = 0.0
+
+    def velocity_halo(self, predicted=False):
+        """ Halo of u, v (or of u*, v*) over the whole domain, e.g. after set_state(). """
+        un, vn = (self.fields[USTAR], self.fields[VSTAR]) if predicted else (self.fields[U], self.fields[V])
+        nx, ny = self.nx, self.ny
+        if self.boundary == "periodic":
+            for q in (un, vn):
+                _wrap(q, nx, ny)
+        else:
+            un[:, nx] = 0.0      # east wall; the west wall is the ghost column u[:, 0] = 0
+            vn[ny, :] = 0.0      # north wall; the south wall is the ghost row v[0, :] = 0
+
+    def eta_halo(self):
+        if self.boundary == "periodic":
+            _wrap(self.fields[ETA], self.nx, self.ny)
+
+    def step(self, sync=lambda: None):
+        """ One time step; sync() waits for the other workers. """
+        self.predictor()
+        sync()
+        self.rotation()
+        sync()
+        self.continuity()
+        sync()
+
+
+def _average(q, J, I, Jn, In, out, scale):
+    """ scale times the sum of q at the four points (J|Jn, I|In) around a face. """
+    np.add(q[J, I], q[J, In], out=out)
+    out += q[Jn, I]
+    out += q[Jn, In]
+    out *= scale
+
+
+def _ghosts(start, stop, n):
+    """ (ghost, cell) slices of the outer ring that copy cells start..stop-1 of 1..n. """
+    pairs = []
+    if stop == n + 1:
+        pairs.append((slice(0, 1), slice(n, n + 1)))
+    if start == 1:
+        pairs.append((slice(n + 1, n + 2), slice(1, 2)))
+    return pairs
+
+
+def _wrap(q, nx, ny):
+    """ Fill the ghost ring of q from the opposite edges (corners included). """
+    q[1:ny + 1, 0] = q[1:ny + 1, nx]
+    q[1:ny + 1, nx + 1] = q[1:ny + 1, 1]
+    q[0, :] = q[ny, :]
+    q[ny + 1, :] = q[1, :]
+
+
+def _worker(name, shape, kernel_args, rank, barrier, commands, done, timeout):
+    """
+    Worker loop: attach to the shared fields and run steps on request. On
+    an error the barrier is aborted, so the other workers stop waiting,
+    and the traceback is sent back instead of the rank.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        fields = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        kernel = _Kernel(fields, *kernel_args)
+        while True:
+            command = commands.get()
+            if command is None:
+                break
+            try:
+                for _ in range(command):
+                    kernel.step(lambda: barrier.wait(timeout))
+            except Exception:
+                barrier.abort()
+                done.put((rank, traceback.format_exc()))
+                break
+            done.put((rank, None))
+        del fields, kernel
+    finally:
+        shm.close()
+
+
+def _release(shm, procs, commands, barrier):
+    """ Stop the workers (killing those that don't stop) and unlink the shared memory. """
+    if barrier is not None:
+        barrier.abort()
+    for q in commands:
+        q.put(None)
+    for proc in procs:
+        proc.join(POLL)
+        if proc.is_alive():
+            proc.terminate()
+            proc.join()
+    del procs[:], commands[:]
+    try:
+        shm.close()
+    except BufferError:   # views of the fields are still alive; the mapping goes with them
+        pass
+    shm.unlink()
+
+
+class RotatingShallowWater2D:
+    """
+    Linear rotating shallow-water model on nx x ny cells of size dx x dy.
+
+    f: Coriolis parameter (1/s), e.g. coriolis_parameter(45). dt defaults
+    to cfl times the gravity-wave limit 1/(c*sqrt(1/dx^2 + 1/dy^2)).
+    tiles: (tiles in y, tiles in x) of the domain decomposition; workers:
+    number of processes (default: one per tile, 1 runs in this process).
+    timeout: seconds a worker waits for the others before giving up; a
+    worker that dies or gives up makes step() raise RuntimeError.
+
+    Use as a context manager, or call close(), to stop the workers and
+    release the shared memory (otherwise it is released when the model is
+    garbage collected, or at exit). eta, u and v are views of that memory,
+    so copy what is needed before closing.
+    """
+
+    def __init__(self, nx, ny, dx, dy=None, h=100.0, f=1e-4, g=9.81, dt=None, cfl=0.9,
+                 boundary="periodic", tiles=(1, 1), workers=None, timeout=TIMEOUT):
+        if boundary not in BOUNDARIES:
+            raise ValueError(f"unknown boundary: {boundary}")
+        self.nx, self.ny = nx, ny
+        self.dx = float(dx)
+        self.dy = self.dx if dy is None else float(dy)
+        self.h, self.f, self.g = h, f, g
+        self.boundary = boundary
+        self.c = np.sqrt(g * h)
+
+        self.dt_max = 1 / (self.c * np.sqrt(1 / self.dx ** 2 + 1 / self.dy ** 2))
+        self.dt = cfl * self.dt_max if dt is None else dt
+        if self.dt > self.dt_max:
+            raise ValueError(f"dt={self.dt} exceeds the CFL limit {self.dt_max}")
+
+        boxes = [(j0, j1, i0, i1) for j0, j1 in tile_bounds(ny, tiles[0])
+                 for i0, i1 in tile_bounds(nx, tiles[1])]
+        nworkers = len(boxes) if workers is None else max(1, min(workers, len(boxes)))
+
+        shape = (5, ny + 2, nx + 2)
+        self._shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+        self._procs = []
+        self._commands = []
+        self._barrier = mp.Barrier(nworkers) if nworkers > 1 else None
+        self._finalizer = weakref.finalize(self, _release, self._shm, self._procs, self._commands,
+                                           self._barrier)
+        self._fields = np.ndarray(shape, dtype=np.float64, buffer=self._shm.buf)
+        self._fields[:] = 0.0
+        self._failure = None
+        self.steps = 0
+        self.t = 0.0
+
+        kernel_args = (nx, ny, self.dx, self.dy, self.dt, g, h, f, boundary)
+        if nworkers == 1:
+            self._kernel = _Kernel(self._fields, *kernel_args, boxes)
+            return
+
+        self._kernel = _Kernel(self._fields, *kernel_args, [])   # halo fills of set_state() only
+        self._done = mp.Queue()
+        for rank in range(nworkers):
+            commands = mp.Queue()
+            proc = mp.Process(target=_worker, daemon=True,
+                              args=(self._shm.name, shape, kernel_args + (boxes[rank::nworkers],),
+                                    rank, self._barrier, commands, self._done, timeout))
+            proc.start()
+            self._procs.append(proc)
+            self._commands.append(commands)
+
+    @property
+    def workers(self):
+        return max(len(self._procs), 1)
+
+    @property
+    def eta(self):
+        """ Surface elevation (ny, nx), a view of the shared state. """
+        return self._fields[ETA, 1:-1, 1:-1]
+
+    @property
+    def u(self):
+        """ u on the east faces (ny, nx); u[:, -1] is the east boundary face. """
+        return self._fields[U, 1:-1, 1:-1]
+
+    @property
+    def v(self):
+        """ v on the north faces (ny, nx); v[-1, :] is the north boundary face. """
+        return self._fields[V, 1:-1, 1:-1]
+
+    def grid(self):
+        """ Cell-centre coordinates (m) as (ny, nx) arrays x, y. """
+        return np.meshgrid((np.arange(self.nx) + 0.5) * self.dx, (np.arange(self.ny) + 0.5) * self.dy)
+
+    def set_state(self, eta, u=0.0, v=0.0):
+        """ Set eta (cell centres), u (east faces) and v (north faces). """
+        self.eta[...] = eta
+        self.u[...] = u
+        self.v[...] = v
+        self._kernel.velocity_halo()
+        self._kernel.eta_halo()
+
+    def reset(self):
+        """ Back to rest at t = 0. """
+        self._fields[:] = 0.0
+        self.steps = 0
+        self.t = 0.0
+
+    def step(self, nsteps=1):
+        """
+        Advance nsteps time steps, on the worker pool if there is one.
+        Raises RuntimeError if a worker fails or dies; the model can't be
+        stepped after that.
+        """
+        if self._failure is not None:
+            raise RuntimeError(f"the workers failed earlier: {self._failure}")
+        if self._barrier is None:
+            for _ in range(nsteps):
+                self._kernel.step()
+        else:
+            for commands in self._commands:
+                commands.put(nsteps)
+            self._wait()
+        self.steps += nsteps
+        self.t += nsteps * self.dt
+
+    def _wait(self):
+        """ Wait for every worker to finish, checking that they are still alive. """
+        pending = set(range(len(self._procs)))
+        while pending:
+            try:
+                rank, error = self._done.get(timeout=POLL)
+            except queue.Empty:
+                dead = [(r, self._procs[r].exitcode) for r in pending if not self._procs[r].is_alive()]
+                if dead:
+                    self._fail(f"worker {dead[0][0]} exited with code {dead[0][1]}")
+                continue
+            if error is not None:
+                self._fail(f"worker {rank} failed:\n{error}")
+            pending.discard(rank)
+
+    def _fail(self, message):
+        """ Stop the pool (the shared memory stays until close()) and raise. """
+        self._failure = message.splitlines()[0]
+        self._barrier.abort()
+        for proc in self._procs:
+            proc.terminate()
+            proc.join()
+        self._procs.clear()
+        self._commands.clear()
+        raise RuntimeError(message)
+
+    def energy(self):
+        """ Kinetic and potential energy per unit density (J/kg * m^2), summed over the domain. """
+        area = self.dx * self.dy
+        kinetic = 0.5 * self.h * (np.sum(self.u ** 2) + np.sum(self.v ** 2)) * area
+        potential = 0.5 * self.g * np.sum(self.eta ** 2) * area
+        return kinetic, potential
+
+    def close(self):
+        """ Stop the workers and free the shared memory. """
+        if self._finalizer.alive:
+            del self._fields, self._kernel
+            self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,83 @@
+"""
+rsw2d.py: results independent of the tiling, a geostrophically balanced
+state that stays steady, and a worker pool that fails loudly and
+releases its shared memory.
+"""
+
+import gc
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import rsw2d
+
+
+def hump(model):
+    x, y = model.grid()
+    x0, y0 = 0.4 * model.nx * model.dx, 0.6 * model.ny * model.dy
+    return np.exp(-((x - x0) ** 2 + (y - y0) ** 2) / (5 * model.dx) ** 2)
+
+
+def run(boundary, tiles, workers=None, nsteps=30):
+    with rsw2d.RotatingShallowWater2D(24, 18, 10e3, f=1e-4, boundary=boundary, tiles=tiles,
+                                      workers=workers) as model:
+        model.set_state(hump(model))
+        model.step(nsteps // 2)
+        model.step(nsteps - nsteps // 2)
+        return model.eta.copy(), model.u.copy(), model.v.copy()
+
+
+@pytest.mark.parametrize("boundary", rsw2d.BOUNDARIES)
+@pytest.mark.parametrize("tiles, workers", [((1, 1), 1), ((2, 3), 1), ((2, 3), None), ((3, 1), 2),
+                                            ((1, 4), 3)])
+def test_tiling_does_not_change_results(boundary, tiles, workers):
+    reference = run(boundary, (1, 1), 1)
+    for a, b in zip(run(boundary, tiles, workers), reference):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_balanced_state_stays_steady():
+    """ v(x) with eta in discrete geostrophic balance: g deta/dx = f v at u points. """
+    with rsw2d.RotatingShallowWater2D(64, 8, 10e3, f=1e-4) as model:
+        x, _ = model.grid()
+        v = 0.1 * np.sin(2 * np.pi * x / (model.nx * model.dx))
+        slope = model.f * model.dx / (2 * model.g) * (v + np.roll(v, -1, axis=1))
+        eta = np.concatenate([np.zeros((model.ny, 1)), np.cumsum(slope, axis=1)[:, :-1]], axis=1)
+        model.set_state(eta, 0.0, v)
+        model.step(500)
+        assert np.abs(model.v - v).max() < 1e-3 * 0.1
+        assert np.abs(model.u).max() < 1e-5 * 0.1
+        assert np.abs(model.eta - eta).max() < 1e-3 * np.abs(eta).max()
+
+
+def test_dead_worker_raises():
+    with rsw2d.RotatingShallowWater2D(24, 18, 10e3, tiles=(2, 2)) as model:
+        model.set_state(hump(model))
+        model.step(2)
+        model._procs[1].kill()
+        start = time.perf_counter()
+        with pytest.raises(RuntimeError, match="worker 1"):
+            model.step(10)
+        assert time.perf_counter() - start < 10
+        with pytest.raises(RuntimeError):
+            model.step(1)
+
+
+def test_hung_worker_times_out():
+    with rsw2d.RotatingShallowWater2D(24, 18, 10e3, tiles=(2, 1), timeout=0.5) as model:
+        model._commands[0].put(1)   # only worker 0 steps, and waits for worker 1 at the barrier
+        with pytest.raises(RuntimeError, match="worker 0 failed"):
+            model._wait()
+
+
+@pytest.mark.parametrize("workers", [1, None])
+def test_shared_memory_is_released(workers):
+    model = rsw2d.RotatingShallowWater2D(8, 8, 10e3, tiles=(2, 1), workers=workers)
+    name = model._shm.name
+    model.step(1)
+    del model
+    gc.collect()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
@@ -0,0 +1,9 @@
+"""
+common
+
+Shared numerical and I/O helpers used by the model scripts in ch1-ch3.
+The scripts are run from their own directories, so each one puts the
+repository root on sys.path before importing from this package.
+
+Sandy Herho, 2024
+"""
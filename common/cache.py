@@ -0,0 +1,212 @@
+"""
+cache.py
+
+Content-addressed cache of model results, shared by the simulators and
+the plotting scripts.
+
+A result is a set of equally long columns, stored as a binary run (see
+simio.py) under a key that hashes the model name, its parameters and the
+code version: a hash of the source files of the model and of every
+module of the repository they use. A result is only
+found again for the same parameters and the same code, so a plot never
+reads the output of another run or of an older model, and nothing is
+computed twice.
+
+    run = cache.fetch("inertial.trajectory", params, compute, sources=[__file__, inertial])
+
+compute(**params) returns the columns on a miss; fetch() returns a
+simio.Run either way, with {"model", "params", "code"} as its metadata.
+
+The results live in $COURSE_CACHE (default ~/.cache/course-models). The
+directory is kept below $COURSE_CACHE_MB megabytes (default 512) by
+evicting the least recently used results after every store; a hit
+refreshes the modification time that the eviction goes by.
+
+Sandy Herho, 2024
+"""
+
+import ast
+import hashlib
+import json
+import os
+import sys
+import types
+
+from . import simio, timings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "course-models")
+MAX_MB = 512
+
+
+def code_files(*sources):
+    """
+    The files of sources (paths or modules) and, for modules, of every
+    module of the repository they use, directly or through names they
+    import, recursively; sorted.
+    """
+    files = set()
+
+    def visit(module):
+        path = getattr(module, "__file__", None)
+        if path is None:
+            return
+        path = os.path.abspath(path)
+        if not path.startswith(ROOT + os.sep) or path in files:
+            return
+        files.add(path)
+        for value in vars(module).values():
+            if not isinstance(value, types.ModuleType):
+                name = getattr(value, "__module__", None)
+                value = sys.modules.get(name) if isinstance(name, str) else None
+            if value is not None:
+                visit(value)
+
+    for source in sources:
+        if isinstance(source, types.ModuleType):
+            visit(source)
+        else:
+            files.add(os.path.abspath(source))
+    return sorted(files)
+
+
+def code_version(*sources):
+    """ Hash of the source files that compute a result (see code_files()). """
+    digest = hashlib.sha256()
+    for path in code_files(*sources):
+        digest.update(os.path.relpath(path, ROOT).encode())
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+def key(model, params, code=""):
+    """ Cache key of the result of model with params, computed by code version code. """
+    text = json.dumps({"model": model, "params": params, "code": code}, sort_keys=True,
+                      default=simio.to_builtin)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class Cache:
+    """
+    A cache directory holding at most max_bytes of results (defaults
+    from $COURSE_CACHE and $COURSE_CACHE_MB).
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or os.environ.get("COURSE_CACHE") or DIRECTORY
+        if max_bytes is None:
+            max_bytes = float(os.environ.get("COURSE_CACHE_MB", MAX_MB)) * 2**20
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _stem(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """ The stored simio.Run of key, or None. """
+        npy, sidecar = simio.paths(self._stem(key))
+        if not os.path.exists(sidecar):
+            return None
+        for path in (npy, sidecar):
+            os.utime(path)
+        timings.count("cache_hits")
+        return simio.load(npy)
+
+    def put(self, key, columns, meta=None):
+        """
+        Store columns under key, then evict down to max_bytes (never key
+        itself). The sidecar is renamed into place last, so a result is
+        only visible once it is complete.
+        """
+        tmp = f"{self._stem(key)}.{os.getpid()}.tmp"
+        simio.save(tmp, columns, meta)
+        for src, dst in zip(simio.paths(tmp), simio.paths(self._stem(key))):
+            os.replace(src, dst)
+        self.evict(keep=key)
+        return simio.load(simio.paths(self._stem(key))[0])
+
+    def fetch(self, model, params, compute, sources=()):
+        """
+        The result of model with params: from the cache, or compute(**params)
+        (a dict of columns) stored on a miss. sources (files or modules,
+        with the repository modules they use) make up the code version of
+        the key.
+        """
+        code = code_version(*sources)
+        k = key(model, params, code)
+        run = self.get(k)
+        if run is None:
+            timings.count("cache_misses")
+            with timings.stage("compute"):
+                columns = compute(**params)
+            run = self.put(k, columns, {"model": model, "params": params, "code": code})
+        return run
+
+    def entries(self):
+        """ (last use, bytes, key) of every stored result, least recently used first. """
+        out = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json") or name.endswith(".tmp.json"):
+                continue
+            npy, sidecar = simio.paths(self._stem(name[:-5]))
+            try:
+                size = os.path.getsize(npy) + os.path.getsize(sidecar)
+                used = os.path.getmtime(sidecar)
+            except FileNotFoundError:   # evicted by another process meanwhile
+                continue
+            out.append((used, size, name[:-5]))
+        return sorted(out)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """ Remove least recently used results until at most max_bytes are stored. """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, k in entries:
+            if total <= self.max_bytes:
+                break
+            if k == keep:
+                continue
+            self.remove(k)
+            total -= size
+            timings.count("cache_evictions")
+
+    def remove(self, key):
+        npy, sidecar = simio.paths(self._stem(key))
+        for path in (sidecar, npy):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self):
+        for _, _, k in self.entries():
+            self.remove(k)
+
+
+def fetch(model, params, compute, sources=()):
+    """ Cache().fetch() with the default directory and size. """
+    return Cache().fetch(model, params, compute, sources)
+
+
+def overrides(params, assignments):
+    """
+    params updated with NAME=VALUE strings (e.g. from --set). VALUE is read
+    as a Python literal (numbers, True/False, lists, tuples, ...), or taken
+    as a string if it isn't one; an integer replacing a float becomes a
+    float. Unknown names raise ValueError.
+    """
+    params = dict(params)
+    for item in assignments or ():
+        name, sep, text = item.partition("=")
+        if not sep or name not in params:
+            raise ValueError(f"expected NAME=VALUE with NAME one of {sorted(params)}, got {item!r}")
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            value = text
+        if isinstance(params[name], float) and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        params[name] = value
+    return params
@@ -0,0 +1,179 @@
+"""
+checkpoint.py
+
+Checkpoint and restart of long model runs.
+
+A checkpoint is one .npz file holding the model state arrays, the step
+counter, the run parameters and the output cursor (how much of the output
+was written when the state was taken), e.g. the byte offset of a text
+file. It is written to a temporary file, synced and renamed over the
+previous checkpoint, so a crash at any moment leaves either the old or
+the new checkpoint, never half of one.
+
+On restart the state is restored, the output is cut back to the cursor
+(reopen() for text files, FrameSpool for animation frames) and the run
+continues. As long as the state holds everything the loop depends on, the
+restarted run writes exactly the bytes of an uninterrupted one.
+
+    ckpt = checkpoint.Checkpoint('run.ckpt.npz', every=1000, params={...})
+    saved = ckpt.resume() if restart else None
+    ...
+    if ckpt.due(step):
+        ckpt.write(step, {"z": z, "w": w}, cursor=file.tell())
+    ...
+    ckpt.clear()
+
+Sandy Herho, 2024
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+from PIL import Image
+
+from . import gifenc, simio, timings
+
+
+def save(path, arrays, meta):
+    """ Write arrays and JSON metadata to path atomically. """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as file:
+        np.savez(file, __meta__=np.array(json.dumps(meta, default=simio.to_builtin)),
+                 **{key: np.asarray(value) for key, value in arrays.items()})
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, path)
+
+
+def load(path):
+    """ (arrays, meta) of a checkpoint, or None if there is none. """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        meta = json.loads(str(data["__meta__"]))
+        arrays = {key: data[key] for key in data.files if key != "__meta__"}
+    return arrays, meta
+
+
+class Checkpoint:
+    """
+    Periodic checkpoints of one run to path, every `every` steps (never
+    if every is 0 or None). params are the run parameters: resume()
+    refuses a checkpoint taken with different ones.
+    """
+
+    def __init__(self, path, every, params):
+        self.path = path
+        self.every = every
+        self.params = json.loads(json.dumps(params, default=simio.to_builtin))
+
+    def due(self, step):
+        return bool(self.every) and step % self.every == 0
+
+    def write(self, step, arrays, cursor=None):
+        with timings.stage("checkpoint"):
+            save(self.path, arrays, {"step": step, "params": self.params, "cursor": cursor})
+        timings.count("checkpoints")
+
+    def resume(self):
+        """
+        (step, arrays, cursor) of the last checkpoint, or None if there is
+        none. Raises ValueError if it belongs to a run with other parameters.
+        """
+        saved = load(self.path)
+        if saved is None:
+            return None
+        arrays, meta = saved
+        if meta["params"] != self.params:
+            raise ValueError(f"checkpoint {self.path} was written with parameters {meta['params']}, "
+                             f"not {self.params}")
+        return meta["step"], arrays, meta["cursor"]
+
+    def clear(self):
+        """ Remove the checkpoint once the run is complete. """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def reopen(filename, cursor=None):
+    """
+    Open a text output for writing: truncated to nothing when cursor is
+    None, otherwise cut back to the byte offset cursor and positioned there.
+    """
+    if cursor is None:
+        return open(filename, 'w')
+    file = open(filename, 'r+')
+    file.truncate(cursor)
+    file.seek(cursor)
+    return file
+
+
+class FrameSpool:
+    """
+    Frames of an animation appended to a file as they are made, so that a
+    restarted animation keeps the frames before its checkpoint. Frames are
+    stored as indices into one global palette (gifenc.Palette, built from
+    the first frame and colors), which is kept with the first frame and
+    read back when a spool is reopened at a cursor (from tell()) to cut it
+    back to a checkpoint. save_gif() encodes the spooled frames as
+    gifenc.save_gif() does.
+    """
+
+    HEADER = struct.Struct('<iii')   # width, height, palette length (first frame only)
+
+    def __init__(self, path, cursor=None, colors=()):
+        self.path = path
+        self.colors = tuple(colors)
+        self.palette = None
+        if cursor is None:
+            self._file = open(path, 'wb')
+        else:
+            self._file = open(path, 'r+b')
+            self._file.truncate(cursor)
+            self._file.seek(cursor)
+            if cursor:
+                self._file.flush()
+                with open(path, 'rb') as file:
+                    _, _, npal = self.HEADER.unpack(file.read(self.HEADER.size))
+                    self.palette = gifenc.Palette(np.frombuffer(file.read(npal), dtype=np.uint8))
+
+    def append(self, image):
+        """ Add a frame: an RGB(A) image or array, mapped to the palette. """
+        frame = np.asarray(image.convert('RGB') if isinstance(image, Image.Image) else image)
+        palette = b""
+        if self.palette is None:
+            self.palette = gifenc.Palette.build(frame, self.colors)
+            palette = self.palette.colors.tobytes()
+        self._file.write(self.HEADER.pack(frame.shape[1], frame.shape[0], len(palette)))
+        self._file.write(palette)
+        self._file.write(self.palette.index(frame).tobytes())
+
+    def tell(self):
+        self._file.flush()
+        return self._file.tell()
+
+    def frames(self):
+        """ The spooled frames as palette index arrays, in order. """
+        self._file.flush()
+        with open(self.path, 'rb') as file:
+            while True:
+                head = file.read(self.HEADER.size)
+                if not head:
+                    return
+                width, height, npal = self.HEADER.unpack(head)
+                file.seek(npal, os.SEEK_CUR)
+                yield np.frombuffer(file.read(width * height), dtype=np.uint8).reshape(height, width)
+
+    def save_gif(self, filename, fps):
+        with gifenc.Encoder(filename, fps, palette=self.palette) as gif:
+            for indices in self.frames():
+                gif.add_indices(indices)
+        timings.count_file(filename)
+
+    def close(self, remove=True):
+        self._file.close()
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+
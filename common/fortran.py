@@ -0,0 +1,166 @@
+"""
+fortran.py
+
+ctypes bindings to the FORTRAN kernels in kernels.f90, the time loops of
+the course programs Coriolis.f95, InerOsci.f95 and iner_osci.f95.
+
+The shared library is compiled with gfortran (or the compiler named by
+the FC environment variable) the first time it is needed, into a build
+directory outside the source tree ($COURSE_BUILD, default
+~/.cache/course-build), under a name that hashes the kernel sources, so
+it is rebuilt whenever they change. If there is no compiler or the build
+fails, library() returns None and available() is False; callers then use
+their NumPy path (see inertial.trajectory(backend="auto")).
+
+Every kernel comes in two precisions. By default they compute in default
+REAL (single precision), exactly as the programs do, and agree with the
+NumPy engines only to single-precision round-off; double=True runs the
+REAL(8) build of the same loop, which agrees with them to double-precision
+round-off.
+
+Sandy Herho, 2024
+"""
+
+import ctypes
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(HERE, 'kernels.f90')
+SOURCES = (SOURCE, os.path.join(HERE, 'kernels.inc'))   # kernels.f90 includes kernels.inc
+BUILD = os.path.join(os.path.expanduser("~"), ".cache", "course-build")
+MODES = {"semi_implicit": 1, "exact": 2}
+
+_library = None
+_error = None
+
+_arrays = {dtype: np.ctypeslib.ndpointer(dtype=dtype, ndim=1, flags='C_CONTIGUOUS')
+           for dtype in (np.float32, np.float64)}
+_int_array = np.ctypeslib.ndpointer(dtype=np.int32, ndim=1, flags='C_CONTIGUOUS')
+
+
+def _library_path():
+    """ The library in the build directory, named after the hash of the sources. """
+    digest = hashlib.sha256()
+    for path in SOURCES:
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    name = f"_kernels-{digest.hexdigest()[:16]}" + ('.dll' if sys.platform == 'win32' else '.so')
+    folder = os.environ.get("COURSE_BUILD") or BUILD
+    try:
+        os.makedirs(folder, exist_ok=True)
+    except OSError:
+        folder = tempfile.gettempdir()
+    if not os.access(folder, os.W_OK):
+        folder = tempfile.gettempdir()
+    return os.path.join(folder, name)
+
+
+def _build(target):
+    compiler = shutil.which(os.environ.get('FC', 'gfortran'))
+    if compiler is None:
+        raise OSError("no FORTRAN compiler found (set FC or install gfortran)")
+    # Build next to the target and rename, so a concurrent import never sees half a file
+    tmp = f"{target}.{os.getpid()}.tmp"
+    workdir = tempfile.mkdtemp()
+    try:
+        subprocess.run([compiler, '-O2', '-shared', '-fPIC', '-J', workdir, SOURCE, '-o', tmp],
+                       check=True, capture_output=True, text=True)
+        os.replace(tmp, target)
+    except subprocess.CalledProcessError as err:
+        raise OSError(f"building {SOURCE} failed:\n{err.stderr}") from err
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def library():
+    """ The loaded kernel library, building it if needed; None if unavailable. """
+    global _library, _error
+    if _library is not None or _error is not None:
+        return _library
+    target = _library_path()
+    try:
+        if not os.path.exists(target):
+            _build(target)
+        lib = ctypes.CDLL(target)
+    except OSError as err:
+        _error = str(err)
+        return None
+
+    for suffix, real, array in (("", ctypes.c_float, _arrays[np.float32]),
+                                ("_f64", ctypes.c_double, _arrays[np.float64])):
+        coriolis = getattr(lib, "coriolis_run" + suffix)
+        coriolis.restype = None
+        coriolis.argtypes = [ctypes.c_int] * 2 + [real] * 6 + [array] * 5
+        inertial = getattr(lib, "inertial_run" + suffix)
+        inertial.restype = None
+        inertial.argtypes = ([ctypes.c_int] * 2 + [real] * 8 + [ctypes.c_int] + [_int_array] +
+                             [array] * 2 + [array] * 5)
+    _library = lib
+    return lib
+
+
+def available():
+    """ True if the kernels are compiled and loadable. """
+    return library() is not None
+
+
+def unavailable_reason():
+    """ Why library() returned None (empty if it didn't). """
+    library()
+    return _error or ""
+
+
+def _require():
+    lib = library()
+    if lib is None:
+        raise RuntimeError(f"FORTRAN kernels unavailable: {_error}")
+    return lib
+
+
+def _kernel(name, double):
+    return getattr(_require(), name + ("_f64" if double else ""))
+
+
+def _outputs(ntot, double):
+    return [np.empty(ntot, dtype=np.float64 if double else np.float32) for _ in range(5)]
+
+
+def _result(out):
+    return dict(zip(("u", "v", "x", "y", "time"), out))
+
+
+def coriolis_run(scheme, ntot, u, v, x, y, freq, dt, double=False):
+    """
+    Run the Coriolis.f95 loop. Returns float32 arrays (float64 if double)
+    "u", "v", "x", "y" (km) and "time" of length ntot, row n-1 being the
+    state after step n.
+    """
+    out = _outputs(ntot, double)
+    _kernel("coriolis_run", double)(MODES[scheme], ntot, u, v, x, y, freq, dt, *out)
+    return _result(out)
+
+
+def inertial_run(scheme, ntot, u, v, x, y, uzero, vzero, freq, dt, events=(), double=False):
+    """
+    Run the InerOsci.f95 / iner_osci.f95 loop with ambient drift (uzero,
+    vzero) and impulses events = [(step, du, dv), ...] added before the
+    update of their step. Same outputs as coriolis_run().
+    """
+    events = list(events)
+    real = np.float64 if double else np.float32
+    steps = np.array([e[0] for e in events], dtype=np.int32)
+    du = np.array([e[1] for e in events], dtype=real)
+    dv = np.array([e[2] for e in events], dtype=real)
+    out = _outputs(ntot, double)
+    _kernel("inertial_run", double)(MODES[scheme], ntot, u, v, x, y, uzero, vzero, freq, dt,
+                                    len(events), steps, du, dv, *out)
+    return _result(out)
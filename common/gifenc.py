@@ -0,0 +1,320 @@
+"""
+gifenc.py
+
+Fixed-palette, delta-frame GIF encoder for the course animations.
+
+PillowWriter quantizes every frame on its own (a median cut per frame),
+stores a palette with every frame and keeps all frames in memory until
+the end. The animations here have a fixed look (the 'bmh' style and a
+few line colors), so instead:
+
+  - one global palette is built up front, when the first frame arrives:
+    the colors of the style and of the animation, then the most frequent
+    colors of the first frame (backgrounds, antialiasing shades), all
+    kept exact. Colors that only appear later are approximated, so an
+    animation whose look changes over time should pass a palette built
+    from several sample frames (Palette.build());
+  - every frame is mapped to it through a lookup table indexed by the
+    24-bit color, one gather per pixel; colors outside the palette go to
+    the nearest entry at 6 bits per channel;
+  - only the bounding rectangle of the pixels that changed since the
+    previous frame is written (LZW-compressed by Pillow's GIF writer), on
+    top of the previous frame, with the unchanged pixels inside it
+    transparent so that they compress to almost nothing; a frame
+    identical to the previous one is dropped and its time added to the
+    previous frame's delay.
+
+Frames are encoded as they arrive, so memory is one frame whatever the
+length of the animation.
+
+    with gifenc.Encoder('out.gif', fps=20, colors=['red', '#2eaaf2']) as gif:
+        for frame in frames:        # (h, w, 3|4) uint8 arrays or images
+            gif.add(frame)
+
+writer() is the same as a matplotlib MovieWriter for Animation.save(),
+and save_gif() encodes any iterable of frames.
+
+Sandy Herho, 2024
+"""
+
+import functools
+import struct
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageColor
+
+from . import timings
+
+# Colors of the 'bmh' style: backgrounds, grid, edges, text, line cycle
+STYLE = ('#ffffff', '#eeeeee', '#b2b2b2', '#bcbcbc', '#000000',
+         '#348ABD', '#A60628', '#7A68A6', '#467821', '#D55E00',
+         '#CC79A7', '#56B4E9', '#009E73', '#F0E442', '#0072B2')
+
+# Matplotlib's single-letter colors, which ImageColor doesn't know
+LETTERS = {'k': '#000000', 'w': '#ffffff', 'r': '#ff0000', 'g': '#008000', 'b': '#0000ff',
+           'c': '#00bfbf', 'm': '#bf00bf', 'y': '#bfbf00'}
+
+BITS = 6   # bits per channel of the nearest-color search
+CHUNK = 16384   # cells of the RGB cube searched at a time
+TRANSPARENT = 255   # index of the unchanged pixels of a frame
+MAX_DELAY = 65535   # centiseconds, the largest delay of a frame
+
+
+def to_rgb(color):
+    """ RGB tuple of a color name, '#rrggbb' string, matplotlib letter or tuple. """
+    if isinstance(color, str):
+        return ImageColor.getrgb(LETTERS.get(color, color))[:3]
+    return tuple(int(c) for c in color[:3])
+
+
+class Palette:
+    """
+    Up to 255 colors (the last index is the transparent one) and the
+    lookup table from (R, G, B) to the nearest of them. Colors of the
+    palette map to themselves exactly.
+    """
+
+    def __init__(self, colors):
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        if len(colors) > TRANSPARENT:
+            raise ValueError(f"{len(colors)} colors don't fit in a GIF palette")
+        self.colors = colors
+        self.lut = _lookup_table(colors.tobytes())
+
+    @classmethod
+    def build(cls, frames, colors=()):
+        """
+        The style colors and colors, then the most frequent colors of
+        frames (an RGB(A) array or image, or a list of them as samples of
+        the whole animation) for the remaining entries.
+        """
+        if not isinstance(frames, (list, tuple)):
+            frames = [frames]
+        fixed = list(dict.fromkeys(to_rgb(c) for c in STYLE + tuple(colors)))
+        keys = np.concatenate([_key(_rgb(frame)).ravel() for frame in frames])
+        keys, counts = np.unique(keys, return_counts=True)
+        keys = keys[np.argsort(-counts, kind='stable')]
+        keys = keys[~np.isin(keys, [(r << 16) | (g << 8) | b for r, g, b in fixed])]
+        extra = [((k >> 16) & 255, (k >> 8) & 255, k & 255)
+                 for k in keys[:TRANSPARENT - len(fixed)].tolist()]
+        return cls(fixed + extra)
+
+    def index(self, rgb):
+        """ Palette indices (h, w) of an RGB(A) array (h, w, 3|4). """
+        return self.lut[_key(_rgb(rgb))]
+
+    def table(self):
+        """ The 768-byte global color table. """
+        table = np.zeros((256, 3), dtype=np.uint8)
+        table[:len(self.colors)] = self.colors
+        return table.tobytes()
+
+
+@functools.lru_cache(maxsize=8)
+def _lookup_table(colors):
+    """
+    Palette index of every 24-bit color: the nearest palette color to the
+    center of its cell of the RGB cube at BITS bits per channel, or the
+    color itself if it is in the palette (cached, so animations with the
+    same palette share it).
+    """
+    pal = np.frombuffer(colors, dtype=np.uint8).reshape(-1, 3)
+    step = 1 << (8 - BITS)
+    levels = np.arange(0, 256, step, dtype=np.float32) + (step - 1) / 2
+    cube = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 3)
+    # |c - p|^2 = |c|^2 - 2 c.p + |p|^2; |c|^2 doesn't change the argmin.
+    # In chunks of cells, so the distance matrix stays small.
+    p = pal.astype(np.float32)
+    norms = (p * p).sum(axis=1)
+    nearest = np.empty(len(cube), dtype=np.uint8)
+    for start in range(0, len(cube), CHUNK):
+        block = cube[start:start + CHUNK]
+        nearest[start:start + CHUNK] = np.argmin(norms - 2.0 * block @ p.T, axis=1)
+    # Spread the cells over all colors, then put the palette colors in exactly
+    lut = nearest.reshape((1 << BITS,) * 3)
+    for axis in range(3):
+        lut = lut.repeat(step, axis=axis)
+    lut = lut.ravel()
+    lut[_key(pal)] = np.arange(len(pal))
+    return lut
+
+
+def _key(rgb):
+    """ 24-bit integer colors of an RGB array (..., 3). """
+    rgb = rgb.astype(np.int32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def _rgb(frame):
+    frame = np.asarray(frame)
+    if frame.dtype != np.uint8:
+        frame = frame.astype(np.uint8)
+    return frame[..., :3]
+
+
+class Encoder:
+    """
+    Write a GIF frame by frame to filename, at fps frames per second
+    (the delay is rounded as PillowWriter rounds it) and looping forever.
+    Repeated frames only lengthen the delay of the last one written, up
+    to MAX_DELAY.
+    The palette is built from the first frame and colors unless one is
+    given (e.g. Palette.build() of sample frames). add() takes RGB(A)
+    frames, add_indices() frames already mapped to the palette.
+    """
+
+    def __init__(self, filename, fps, colors=(), palette=None, loop=0):
+        self.filename = filename
+        self.delay = int(int(1000 / fps) / 10)   # centiseconds
+        self.colors = tuple(colors)
+        self.palette = palette
+        self.loop = loop
+        self.frames = 0
+        self.dropped = 0
+        self._file = None
+        self._previous = None
+        self._pending = None   # encoded (rectangle, delay) of the last frame, until its delay is known
+
+    def add(self, frame):
+        frame = np.asarray(frame)
+        with timings.stage("encode"):
+            if self.palette is None:
+                self.palette = Palette.build(frame, self.colors)
+            indices = self.palette.index(frame)
+        self.add_indices(indices)
+
+    def add_indices(self, indices):
+        with timings.stage("encode"):
+            self._add(np.ascontiguousarray(indices, dtype=np.uint8))
+
+    def _add(self, indices):
+        if self._file is None:
+            self._start(indices.shape)
+            rows, cols = slice(0, indices.shape[0]), slice(0, indices.shape[1])
+        else:
+            changed = indices != self._previous
+            rows_changed = np.flatnonzero(changed.any(axis=1))
+            if rows_changed.size == 0 and self._pending[1] + self.delay <= MAX_DELAY:
+                self._pending[1] += self.delay
+                self.dropped += 1
+                timings.count("frames_dropped")
+                return
+            if rows_changed.size == 0:
+                # The pending delay is full: a one-pixel transparent frame carries on
+                rows_changed = cols_changed = np.zeros(1, dtype=np.intp)
+            else:
+                cols_changed = np.flatnonzero(changed[rows_changed[0]:rows_changed[-1] + 1].any(axis=0))
+            rows = slice(rows_changed[0], rows_changed[-1] + 1)
+            cols = slice(cols_changed[0], cols_changed[-1] + 1)
+        self._flush()
+        rect = indices[rows, cols]
+        transparent = self._previous is not None
+        if transparent:
+            rect = np.where(changed[rows, cols], rect, np.uint8(TRANSPARENT))
+        self._pending = [_image_block(rect, self.palette.table(), cols.start, rows.start),
+                         self.delay, transparent]
+        self._previous = indices
+        self.frames += 1
+
+    def _start(self, shape):
+        height, width = shape
+        self._file = open(self.filename, 'wb')
+        self._file.write(b"GIF89a" + struct.pack('<HHBBB', width, height, 0xF7, 0, 0))
+        self._file.write(self.palette.table())
+        # Netscape extension: number of loops
+        self._file.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack('<H', self.loop) + b"\x00")
+
+    def _flush(self):
+        """
+        Write the pending frame behind a control block with its delay and
+        transparent index, drawn over the last one.
+        """
+        if self._pending is None:
+            return
+        data, delay, transparent = self._pending
+        flags = 1 << 2 | transparent
+        self._file.write(b"!\xf9\x04" + struct.pack('<BHBB', flags, delay, TRANSPARENT, 0) + data)
+        self._pending = None
+
+    def close(self):
+        if self._file is None:
+            return
+        with timings.stage("encode"):
+            self._flush()
+            self._file.write(b";")
+            self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _image_block(indices, table, left, top):
+    """
+    Image descriptor and LZW-compressed data of the palette indices (h, w)
+    placed at (left, top): Pillow writes them as a one-frame GIF, which
+    is cut at its image descriptor (GIF89a, section 20).
+    """
+    height, width = indices.shape
+    image = Image.frombytes('P', (width, height), indices.tobytes())
+    image.putpalette(table)
+    buf = BytesIO()
+    image.save(buf, format="GIF", optimize=False, interlace=False)
+    data = buf.getvalue()
+
+    def skip_table(pos, flags):
+        return pos + (3 << ((flags & 7) + 1) if flags & 0x80 else 0)
+
+    pos = skip_table(13, data[10])
+    while data[pos] == 0x21:   # extension blocks: introducer, label, sub-blocks
+        pos += 2
+        while data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+    if data[pos] != 0x2C:
+        raise ValueError("no image descriptor in the GIF written by Pillow")
+    flags = data[pos + 9]
+    start = end = skip_table(pos + 10, flags) + 1   # past the LZW minimum code size
+    while data[end]:
+        end += data[end] + 1
+    return (b"," + struct.pack('<HHHHB', left, top, width, height, flags & 0x40)
+            + data[start - 1:end + 1])
+
+
+def save_gif(frames, filename, fps, colors=(), palette=None):
+    """ Encode an iterable of RGB(A) frames; drawing them is timed as "draw". """
+    with Encoder(filename, fps, colors, palette) as gif:
+        for frame in timings.iterate(frames, "draw"):
+            gif.add(frame)
+            timings.count("frames")
+    timings.count_file(filename)
+
+
+def writer(fps, colors=(), palette=None):
+    """
+    A matplotlib MovieWriter for Animation.save() that grabs frames as
+    PillowWriter does and encodes them with Encoder as they come.
+    """
+    from matplotlib.animation import AbstractMovieWriter
+
+    class GifWriter(AbstractMovieWriter):
+
+        def setup(self, fig, outfile, dpi=None):
+            super().setup(fig, outfile, dpi=dpi)
+            self._encoder = Encoder(outfile, self.fps, colors, palette)
+
+        def grab_frame(self, **savefig_kwargs):
+            buf = BytesIO()
+            self.fig.savefig(buf, **{**savefig_kwargs, "format": "rgba", "dpi": self.dpi})
+            width, height = self.frame_size
+            self._encoder.add(np.frombuffer(buf.getbuffer(), dtype=np.uint8).reshape(height, width, 4))
+
+        def finish(self):
+            self._encoder.close()
+
+    return GifWriter(fps=fps)
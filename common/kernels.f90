@@ -0,0 +1,38 @@
+!*******************************************
+! The time loops of the course's FORTRAN
+! programs as subroutines callable from C
+! (and so from Python, see fortran.py):
+!
+! coriolis_run  ch2/coriolis/utama/Coriolis.f95
+! inertial_run  ch2/InertialOscillations/InerOsci.f95
+!               and herho_work/iner_osci.f95
+!
+! The loops are in kernels.inc, compiled
+! twice: in default REAL, the arithmetic of
+! the programs (module kernels), and in
+! REAL(8) with the C names ending in _f64
+! (module kernels_f64). mode 1 is the
+! semi-implicit scheme, mode 2 the exact
+! rotation. Row n of the output is the
+! state after step n (time = n*dt).
+!
+! Sandy Herho <sh001@ucr.edu>
+!*******************************************
+
+MODULE kernels
+USE iso_c_binding
+IMPLICIT NONE
+INTEGER, PARAMETER :: wp = c_float
+CHARACTER(*), PARAMETER :: SUFFIX = ''
+CONTAINS
+INCLUDE 'kernels.inc'
+END MODULE kernels
+
+MODULE kernels_f64
+USE iso_c_binding
+IMPLICIT NONE
+INTEGER, PARAMETER :: wp = c_double
+CHARACTER(*), PARAMETER :: SUFFIX = '_f64'
+CONTAINS
+INCLUDE 'kernels.inc'
+END MODULE kernels_f64
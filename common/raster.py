@@ -0,0 +1,234 @@
+"""
+raster.py
+
+A small matplotlib-free raster backend for line-only animations.
+
+Frames are preallocated uint8 RGB arrays. Everything that doesn't change
+between frames (panel backgrounds, grid, tick labels, titles, legends) is
+drawn once into a background image; every frame starts as a copy of it
+and then only gets its polylines and changing text. The data-to-pixel
+transform of each panel is fixed when the panel is created.
+
+Glyphs are rendered once per character with DejaVu Sans (Pillow's default
+font if it isn't installed) and blended from a cache, so no text layout
+happens per frame.
+
+Sandy Herho, 2024
+"""
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from . import gifenc
+from .gifenc import to_rgb
+
+# Colors of the 'bmh' style used by the course animations
+FACE = (238, 238, 238)
+GRID = (178, 178, 178)
+EDGE = (188, 188, 188)
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+
+class Glyphs:
+    """ Cache of antialiased glyph masks of one font size. """
+
+    def __init__(self, size=12):
+        try:
+            self.font = ImageFont.truetype('DejaVuSans.ttf', size)
+        except OSError:
+            self.font = ImageFont.load_default(size=size)
+        ascent, descent = self.font.getmetrics()
+        self.height = ascent + descent
+        self._cache = {}
+
+    def glyph(self, char):
+        if char not in self._cache:
+            advance = self.font.getlength(char)
+            img = Image.new('L', (int(np.ceil(advance)) + 2, self.height))
+            ImageDraw.Draw(img).text((0, 0), char, font=self.font, fill=255)
+            self._cache[char] = (np.asarray(img, dtype=np.float32) / 255.0, advance)
+        return self._cache[char]
+
+    def width(self, text):
+        return sum(self.glyph(c)[1] for c in text)
+
+
+class Panel:
+    """ One plot area with a fixed linear data-to-pixel transform. """
+
+    def __init__(self, left, top, width, height, xlim, ylim):
+        self.left, self.top, self.width, self.height = left, top, width, height
+        self.xlim, self.ylim = xlim, ylim
+        self.sx = (width - 1) / (xlim[1] - xlim[0])
+        self.sy = (height - 1) / (ylim[1] - ylim[0])
+
+    def to_pixels(self, x, y):
+        """ Pixel columns and rows (float) of data points. """
+        px = self.left + (np.asarray(x, dtype=float) - self.xlim[0]) * self.sx
+        py = self.top + (self.ylim[1] - np.asarray(y, dtype=float)) * self.sy
+        return px, py
+
+
+class Canvas:
+    """
+    Preallocated frame buffer with a static background.
+
+    Typical use: create panels and static decorations once, then for every
+    frame call begin(), draw the polylines and text, and hand the `frame`
+    array (or image()) to the encoder.
+    """
+
+    def __init__(self, width, height, background=WHITE, font_size=12):
+        self.width, self.height = width, height
+        self.base = np.empty((height, width, 3), dtype=np.uint8)
+        self.base[:] = background
+        self.frame = self.base.copy()
+        self.glyphs = Glyphs(font_size)
+        self.panels = []
+
+    def panel(self, rect, xlim, ylim, xticks=None, yticks=None, grid=True, title=None,
+              xlabel=None, ylabel=None, tick_format='{:g}'):
+        """
+        Add a panel at rect = (left, bottom, width, height) in figure
+        fractions, as in matplotlib, and draw its static decorations.
+        """
+        left = int(round(rect[0] * self.width))
+        top = int(round((1 - rect[1] - rect[3]) * self.height))
+        width = int(round(rect[2] * self.width))
+        height = int(round(rect[3] * self.height))
+        panel = Panel(left, top, width, height, xlim, ylim)
+        self.panels.append(panel)
+
+        self.base[max(top, 0):top + height, max(left, 0):left + width] = FACE
+        # Edge lines one pixel outside the face, where they fall on the canvas
+        cols = slice(max(left - 1, 0), left + width + 1)
+        rows = slice(max(top - 1, 0), top + height + 1)
+        for row in (top - 1, top + height):
+            if 0 <= row < self.height:
+                self.base[row, cols] = EDGE
+        for col in (left - 1, left + width):
+            if 0 <= col < self.width:
+                self.base[rows, col] = EDGE
+        xticks = _nice_ticks(*xlim) if xticks is None else np.asarray(xticks)
+        yticks = _nice_ticks(*ylim) if yticks is None else np.asarray(yticks)
+        gh = self.glyphs.height
+        for xt in xticks:
+            px, _ = panel.to_pixels(xt, ylim[0])
+            if grid:
+                self.base[top:top + height, int(round(px))] = GRID
+            label = tick_format.format(xt)
+            self.text(px - self.glyphs.width(label) / 2, top + height + 3, label, static=True)
+        for yt in yticks:
+            _, py = panel.to_pixels(xlim[0], yt)
+            if grid:
+                self.base[int(round(py)), left:left + width] = GRID
+            label = tick_format.format(yt)
+            self.text(left - self.glyphs.width(label) - 4, py - gh / 2, label, static=True)
+
+        if title:
+            self.text(left + (width - self.glyphs.width(title)) / 2, top - gh - 4, title, static=True)
+        if xlabel:
+            self.text(left + (width - self.glyphs.width(xlabel)) / 2, top + height + gh + 6,
+                      xlabel, static=True)
+        if ylabel:
+            self.text(max(left - 60, 0), top - gh - 4, ylabel, static=True)
+        return panel
+
+    def hline(self, panel, y, color=BLACK, width=1):
+        """ Static horizontal line across a panel. """
+        self.polyline(panel, panel.xlim, [y, y], color, width, static=True)
+
+    def legend(self, panel, entries, corner='upper right'):
+        """ Static legend box with (label, color) entries. """
+        gh = self.glyphs.height
+        w = int(max(self.glyphs.width(label) for label, _ in entries)) + 36
+        h = len(entries) * (gh + 2) + 6
+        x0 = panel.left + panel.width - w - 8 if 'right' in corner else panel.left + 8
+        if corner.startswith('center'):
+            y0 = panel.top + (panel.height - h) // 2
+        else:
+            y0 = panel.top + 8 if 'upper' in corner else panel.top + panel.height - h - 8
+        self.base[y0:y0 + h, x0:x0 + w] = WHITE
+        for i, (label, color) in enumerate(entries):
+            y = y0 + 3 + i * (gh + 2)
+            self.base[y + gh // 2 - 1:y + gh // 2 + 1, x0 + 6:x0 + 26] = to_rgb(color)
+            self.text(x0 + 30, y, label, static=True)
+
+    def begin(self):
+        """ Start a new frame from the static background. """
+        np.copyto(self.frame, self.base)
+        return self.frame
+
+    def polyline(self, panel, x, y, color, width=1, static=False):
+        """
+        Draw a polyline in data coordinates, clipped to the panel. All
+        segments are rasterized together: every segment is sampled at one
+        point per pixel of its longer side and every sample is stamped
+        with a width x width square.
+        """
+        target = self.base if static else self.frame
+        px, py = panel.to_pixels(x, y)
+        x0, y0, x1, y1 = px[:-1], py[:-1], px[1:], py[1:]
+        ok = np.isfinite(x0) & np.isfinite(y0) & np.isfinite(x1) & np.isfinite(y1)
+        x0, y0, x1, y1 = x0[ok], y0[ok], x1[ok], y1[ok]
+        if x0.size == 0:
+            return
+
+        n = np.ceil(np.maximum(np.abs(x1 - x0), np.abs(y1 - y0))).astype(np.intp) + 1
+        seg = np.repeat(np.arange(n.size), n)
+        start = np.cumsum(n) - n
+        t = (np.arange(seg.size) - start[seg]) / np.maximum(n[seg] - 1, 1)
+        cols = np.rint(x0[seg] + t * (x1 - x0)[seg]).astype(np.intp)
+        rows = np.rint(y0[seg] + t * (y1 - y0)[seg]).astype(np.intp)
+
+        if width > 1:
+            off = np.arange(width) - (width - 1) // 2
+            cols, rows = np.broadcast_arrays(cols[:, None, None] + off[None, None, :],
+                                             rows[:, None, None] + off[None, :, None])
+            cols, rows = cols.ravel(), rows.ravel()
+
+        keep = ((cols >= panel.left) & (cols < panel.left + panel.width) &
+                (rows >= panel.top) & (rows < panel.top + panel.height))
+        target[rows[keep], cols[keep]] = to_rgb(color)
+
+    def text(self, x, y, string, color=BLACK, static=False):
+        """ Blend a string with its top-left corner at pixel (x, y). """
+        target = self.base if static else self.frame
+        rgb = np.asarray(to_rgb(color), dtype=np.float32)
+        pos = float(x)
+        top = int(round(y))
+        for char in string:
+            mask, advance = self.glyphs.glyph(char)
+            left = int(round(pos))
+            pos += advance
+            h, w = mask.shape
+            r0, c0 = max(top, 0), max(left, 0)
+            r1, c1 = min(top + h, self.height), min(left + w, self.width)
+            if r0 >= r1 or c0 >= c1:
+                continue
+            a = mask[r0 - top:r1 - top, c0 - left:c1 - left, None]
+            region = target[r0:r1, c0:c1]
+            region[:] = (region * (1.0 - a) + rgb * a).astype(np.uint8)
+
+    def image(self):
+        """ Current frame as a Pillow RGB image (a copy). """
+        return Image.fromarray(self.frame.copy(), 'RGB')
+
+
+def save_gif(frames, filename, fps, colors=()):
+    """
+    Encode RGB frames (arrays or images) with gifenc.save_gif(), colors
+    being the line colors to keep exact in the palette. frames may be any
+    iterable, e.g. a generator that keeps redrawing the same Canvas
+    buffer: each frame is encoded as soon as it arrives.
+    """
+    gifenc.save_gif(frames, filename, fps, colors)
+
+
+def _nice_ticks(lo, hi, target=5):
+    """ Round tick positions covering [lo, hi]. """
+    raw = (hi - lo) / target
+    mag = 10.0 ** np.floor(np.log10(raw))
+    step = mag * min((1, 2, 2.5, 5, 10), key=lambda m: abs(m * mag - raw))
+    return np.arange(np.ceil(lo / step) * step, hi + 0.5 * step, step)
@@ -0,0 +1,206 @@
+"""
+simio.py
+
+Binary columnar output shared by the model scripts and the plotting scripts.
+
+A run is stored as two files next to each other:
+
+    <name>.npy   float64 array of shape (n_columns, n_rows); every column
+                 is contiguous on disk
+    <name>.json  column names and the header metadata (freq, dt, ntot,
+                 model parameters, ...)
+
+load() opens the .npy file as a read-only np.memmap, so nothing is parsed
+and only the pages that are actually used are read. For the existing text
+outputs (including the FORTRAN ones) load() falls back to np.loadtxt and
+returns the same Run object.
+
+Runs that don't fit in memory are written block by block with Writer,
+which produces the same two files.
+
+Sandy Herho, 2024
+"""
+
+import json
+import os
+
+import numpy as np
+
+from . import timings
+
+
+class Run:
+    """ Columns of one model run plus its header metadata. """
+
+    def __init__(self, data, names, meta=None):
+        self.data = data
+        self.names = list(names)
+        self.meta = dict(meta or {})
+        if len(self.names) != data.shape[0]:
+            raise ValueError(f"{data.shape[0]} columns but {len(self.names)} names")
+
+    def __getitem__(self, name):
+        return self.data[self.names.index(name)]
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    def __repr__(self):
+        return f"Run(columns={self.names}, rows={len(self)}, meta={self.meta})"
+
+    def rows(self):
+        """ Row-major (n_rows, n_columns) view, like the text files. """
+        return self.data.T
+
+
+def paths(name):
+    """ Data and sidecar file names of a binary run, with or without extension. """
+    stem = name[:-4] if name.endswith(('.npy', '.txt', '.csv')) else name
+    return stem + '.npy', stem + '.json'
+
+
+def save(name, columns, meta=None, dtype=np.float64):
+    """
+    Write a run in the binary columnar format.
+
+    columns: dict of equally long 1-D arrays, written in insertion order.
+    meta: JSON-serialisable header values. Returns the number of bytes
+    written.
+    """
+    with timings.stage("write"):
+        nbytes = _save(name, columns, meta, dtype)
+    timings.count("bytes_written", nbytes)
+    return nbytes
+
+
+def _save(name, columns, meta, dtype):
+    npy, sidecar = paths(name)
+    names = list(columns)
+    nrows = len(next(iter(columns.values()))) if names else 0
+
+    out = np.lib.format.open_memmap(npy, mode='w+', dtype=dtype, shape=(len(names), nrows))
+    for i, key in enumerate(names):
+        out[i] = columns[key]
+    out.flush()
+    del out
+
+    _write_sidecar(sidecar, names, nrows, meta)
+    return os.path.getsize(npy) + os.path.getsize(sidecar)
+
+
+def _write_sidecar(sidecar, names, nrows, meta):
+    with open(sidecar, 'w') as file:
+        json.dump({"columns": names, "rows": nrows, "meta": meta or {}}, file,
+                  indent=1, default=to_builtin)
+
+
+class Writer:
+    """
+    Write a run block by block, for runs too long to hold in memory.
+
+    append() takes a dict of equally long 1-D arrays (the same columns
+    every time). Each column is spooled to a temporary file next to the
+    run; close() copies them piecewise into the column-contiguous .npy
+    file and writes the sidecar, so memory stays bounded by the piece
+    size whatever the length of the run. close() returns the number of
+    bytes written, like save().
+    """
+
+    PIECE = 1 << 20   # values copied per read when assembling a column
+
+    def __init__(self, name, meta=None, dtype=np.float64):
+        self.npy, self.sidecar = paths(name)
+        self.meta = dict(meta or {})
+        self.dtype = np.dtype(dtype)
+        self.names = None
+        self.rows = 0
+        self._parts = []
+
+    def append(self, columns):
+        names = list(columns)
+        if self.names is None:
+            self.names = names
+            self._parts = [open(f"{self.npy}.{i}.part", 'wb') for i in range(len(names))]
+        elif names != self.names:
+            raise ValueError(f"columns {names} differ from {self.names}")
+        nrows = len(columns[names[0]]) if names else 0
+        for part, key in zip(self._parts, names):
+            column = np.asarray(columns[key], dtype=self.dtype)
+            if column.shape != (nrows,):
+                raise ValueError(f"column {key} has shape {column.shape}, expected ({nrows},)")
+            column.tofile(part)
+        self.rows += nrows
+
+    def close(self):
+        names = self.names or []
+        with timings.stage("write"):
+            out = np.lib.format.open_memmap(self.npy, mode='w+', dtype=self.dtype,
+                                            shape=(len(names), self.rows))
+            for i, part in enumerate(self._parts):
+                part.close()
+                with open(part.name, 'rb') as file:
+                    for start in range(0, self.rows, self.PIECE):
+                        piece = np.fromfile(file, dtype=self.dtype, count=self.PIECE)
+                        out[i, start:start + len(piece)] = piece
+                os.remove(part.name)
+            out.flush()
+            del out
+            self._parts = []
+            _write_sidecar(self.sidecar, names, self.rows, self.meta)
+        nbytes = os.path.getsize(self.npy) + os.path.getsize(self.sidecar)
+        timings.count("bytes_written", nbytes)
+        return nbytes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def load(name, names=None, header=None, **loadtxt_kw):
+    """
+    Open a run written by save() as a memmap, or parse a text output.
+
+    For text files, names labels the columns and header, if given, names
+    the values on the first line (e.g. ("freq", "dt", "ntot")), which are
+    then returned as metadata instead of data. A header line that isn't
+    numeric (as in the FORTRAN 'freq dt ntot' labels) is skipped.
+    """
+    with timings.stage("load"):
+        return _load(name, names, header, **loadtxt_kw)
+
+
+def _load(name, names, header, **loadtxt_kw):
+    npy, sidecar = paths(name)
+    if name.endswith('.npy') or (not os.path.exists(name) and os.path.exists(sidecar)):
+        with open(sidecar) as file:
+            info = json.load(file)
+        return Run(np.load(npy, mmap_mode='r'), info["columns"], info["meta"])
+
+    meta = {}
+    if header is not None:
+        with open(name) as file:
+            first = file.readline().split()
+        try:
+            meta = {key: float(value) for key, value in zip(header, first)}
+        except ValueError:
+            meta = {}
+        loadtxt_kw.setdefault("skiprows", 1)
+    data = np.atleast_2d(np.loadtxt(name, **loadtxt_kw)).T
+    if names is None:
+        names = [f"c{i}" for i in range(data.shape[0])]
+    return Run(data, names, meta)
+
+
+def to_builtin(value):
+    """ JSON fallback for NumPy scalars and arrays (json.dumps(..., default=to_builtin)). """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"cannot store {type(value).__name__} as JSON")
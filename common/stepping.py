@@ -0,0 +1,315 @@
+"""
+stepping.py
+
+Batched time-stepping kernels for linear (affine) ODE systems
+
+    dy/dt = A y + b
+
+as they appear throughout the course: the decay problem (ch1), the
+buoyancy oscillator with friction and the inertial oscillations (ch2).
+
+The state is always a batch of shape (n_members, n_vars). `A` is either
+one (n_vars, n_vars) matrix shared by all members or a stack of shape
+(n_members, n_vars, n_vars); `b` is (n_vars,) or (n_members, n_vars).
+
+Every linear scheme reduces to y_new = G y + c with a constant propagator
+G. `propagator()` builds (G, c) once, so a time loop only pays for one
+batched matrix-vector product per step through `apply()`.
+
+Nonlinear problems (e.g. quadratic drag) go through DormandPrince, an
+embedded Runge-Kutta pair with step size control and dense output.
+
+Sandy Herho, 2024
+"""
+
+import numpy as np
+
+
+def as_batch(y):
+    """ Return the state as a float array of shape (n_members, n_vars). """
+    y = np.asarray(y, dtype=float)
+    if y.ndim == 0:
+        return y.reshape(1, 1)
+    if y.ndim == 1:
+        return y[None, :]
+    return y
+
+
+def apply(G, y, c=None):
+    """ Advance the batch y by one step of the propagator: G y + c. """
+    yn = np.einsum('...ij,...j->...i', G, y)
+    if c is not None:
+        yn += c
+    return yn
+
+
+def expm(M):
+    """
+    Matrix exponential of one matrix or a stack of matrices (..., n, n),
+    using scaling and squaring with a [6/6] Pade approximant.
+    """
+    M = np.asarray(M, dtype=float)
+    n = M.shape[-1]
+    eye = np.eye(n)
+
+    norm = np.max(np.sum(np.abs(M), axis=-2)) if M.size else 0.0
+    s = max(0, int(np.ceil(np.log2(norm / 0.5)))) if norm > 0.5 else 0
+    X = M / 2.0 ** s
+
+    q = 6
+    c = 1.0
+    N = eye.copy()
+    D = eye.copy()
+    Xk = np.broadcast_to(eye, X.shape).copy()
+    for k in range(1, q + 1):
+        c = c * (q - k + 1) / (k * (2 * q - k + 1))
+        Xk = Xk @ X
+        N = N + c * Xk
+        D = D + (-1) ** k * c * Xk
+    E = np.linalg.solve(D, N)
+
+    for _ in range(s):
+        E = E @ E
+    return E
+
+
+def propagator(scheme, A, dt, b=None):
+    """
+    Constant one-step propagator (G, c) of `scheme` for dy/dt = A y + b.
+
+    scheme: "explicit" (explicit Euler), "implicit" (implicit Euler),
+            "crank_nicolson" or "exponential" (exact for constant A, b).
+    c is None when no forcing b is given.
+    """
+    A = np.asarray(A, dtype=float)
+    n = A.shape[-1]
+    eye = np.eye(n)
+    hb = None if b is None else dt * np.asarray(b, dtype=float)
+
+    if scheme == "explicit":
+        G = eye + dt * A
+        c = hb
+    elif scheme == "implicit":
+        G = np.linalg.inv(eye - dt * A)
+        c = None if hb is None else np.einsum('...ij,...j->...i', G, hb)
+    elif scheme == "crank_nicolson":
+        Minv = np.linalg.inv(eye - 0.5 * dt * A)
+        G = Minv @ (eye + 0.5 * dt * A)
+        c = None if hb is None else np.einsum('...ij,...j->...i', Minv, hb)
+    elif scheme == "exponential":
+        if b is None:
+            G = expm(dt * A)
+            c = None
+        else:
+            # Exact affine update from the augmented system [[A, b], [0, 0]]
+            b = np.broadcast_to(np.asarray(b, dtype=float), A.shape[:-1])
+            aug = np.zeros(A.shape[:-2] + (n + 1, n + 1))
+            aug[..., :n, :n] = A
+            aug[..., :n, n] = b
+            E = expm(dt * aug)
+            G = E[..., :n, :n]
+            c = E[..., :n, n]
+    else:
+        raise ValueError(f"unknown scheme: {scheme}")
+    return G, c
+
+
+def explicit_euler(y, A, dt, b=None):
+    """ One explicit Euler step of the batch y. """
+    G, c = propagator("explicit", A, dt, b)
+    return apply(G, as_batch(y), c)
+
+
+def implicit_euler(y, A, dt, b=None):
+    """ One implicit Euler step of the batch y. """
+    G, c = propagator("implicit", A, dt, b)
+    return apply(G, as_batch(y), c)
+
+
+def crank_nicolson(y, A, dt, b=None):
+    """ One Crank-Nicolson (trapezoidal) step of the batch y. """
+    G, c = propagator("crank_nicolson", A, dt, b)
+    return apply(G, as_batch(y), c)
+
+
+def exponential(y, A, dt, b=None):
+    """ One exact matrix-exponential step of the batch y. """
+    G, c = propagator("exponential", A, dt, b)
+    return apply(G, as_batch(y), c)
+
+
+def rotation_matrix(alpha):
+    """
+    Exact propagator of du/dt = f v, dv/dt = -f u over one step, where
+    alpha = f*dt; alpha may be an array, giving a stack of matrices.
+    """
+    alpha = np.asarray(alpha, dtype=float)
+    ca, sa = np.cos(alpha), np.sin(alpha)
+    return np.stack([np.stack([ca, sa], axis=-1),
+                     np.stack([-sa, ca], axis=-1)], axis=-2)
+
+
+def rotation(y, alpha):
+    """
+    Rotate the first two state variables (u, v) of every member by the
+    angle alpha: un = cos(alpha) u + sin(alpha) v, vn = cos(alpha) v - sin(alpha) u.
+    Further variables are passed through unchanged.
+    """
+    y = as_batch(y)
+    alpha = np.asarray(alpha, dtype=float)
+    ca, sa = np.cos(alpha), np.sin(alpha)
+    yn = y.copy()
+    yn[:, 0] = ca * y[:, 0] + sa * y[:, 1]
+    yn[:, 1] = ca * y[:, 1] - sa * y[:, 0]
+    return yn
+
+
+def semi_implicit(w, force, r, dt):
+    """
+    Velocity update with explicit forcing and implicit linear friction,
+    (w + dt*force) / (1 + r*dt), as used by the buoyancy models.
+    """
+    return (w + dt * force) / (1.0 + r * dt)
+
+
+def expm2(A, t):
+    """
+    Closed-form exp(A t) of a 2x2 matrix for an array of times t.
+
+    A has shape (2, 2) or (..., 2, 2) and broadcasts against t; the result
+    has shape broadcast(A.shape[:-2], t.shape) + (2, 2). With
+    tau = trace(A)/2 and mu^2 = tau^2 - det(A),
+
+        exp(A t) = exp(tau t) [cosh(mu t) I + sinh(mu t)/mu (A - tau I)],
+
+    where cosh/sinh turn into cos/sin for mu^2 < 0. This costs a handful of
+    array operations however long t is.
+    """
+    A = np.asarray(A, dtype=float)
+    t = np.asarray(t, dtype=float)
+    tau = 0.5 * (A[..., 0, 0] + A[..., 1, 1])
+    det = A[..., 0, 0] * A[..., 1, 1] - A[..., 0, 1] * A[..., 1, 0]
+    mu2 = tau * tau - det
+    tau, mu2, t = np.broadcast_arrays(tau, mu2, t)
+
+    C = np.empty(t.shape)
+    S = np.empty(t.shape)
+
+    osc = mu2 < 0.0
+    om = np.sqrt(-mu2[osc])
+    grow = np.exp(tau[osc] * t[osc])
+    C[osc] = grow * np.cos(om * t[osc])
+    S[osc] = grow * np.sin(om * t[osc]) / om
+
+    # Real mu: combine the exponentials so strongly damped modes don't overflow
+    real = ~osc
+    mu = np.sqrt(mu2[real])
+    ep = np.exp((tau[real] + mu) * t[real])
+    em = np.exp((tau[real] - mu) * t[real])
+    C[real] = 0.5 * (ep + em)
+    small = mu * np.abs(t[real]) < 1.0e-4
+    with np.errstate(divide='ignore', invalid='ignore'):
+        S[real] = np.where(small,
+                           np.exp(tau[real] * t[real]) * t[real] * (1.0 + (mu * t[real]) ** 2 / 6.0),
+                           0.5 * (ep - em) / mu)
+
+    M = A - tau[..., None, None] * np.eye(2)
+    return C[..., None, None] * np.eye(2) + S[..., None, None] * M
+
+
+class DormandPrince:
+    """
+    Adaptive integrator for dy/dt = fun(t, y) (y a 1-D array) with the
+    embedded Runge-Kutta 5(4) pair of Dormand and Prince.
+
+    Every step() takes one accepted step of at most t_bound - t, with the
+    step size chosen so that the estimated local error stays below
+    atol + rtol*|y| (RMS over the variables). After a step, dense(t) gives
+    the state anywhere in [t_old, t] from the fourth-order continuous
+    extension, at no extra function evaluations. restart(t, y) continues
+    from a new state, e.g. after an event changed the equations, keeping
+    the current step size. nsteps, nrejected and nfev count the work.
+    """
+
+    C = np.array([0.0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1.0])
+    A = [np.array([]),
+         np.array([1 / 5]),
+         np.array([3 / 40, 9 / 40]),
+         np.array([44 / 45, -56 / 15, 32 / 9]),
+         np.array([19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729]),
+         np.array([9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656])]
+    B = np.array([35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84])
+    E = np.array([-71 / 57600, 0.0, 71 / 16695, -71 / 1920, 17253 / 339200, -22 / 525, 1 / 40])
+    P = np.array([
+        [1.0, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432],
+        [0.0, 0.0, 0.0, 0.0],
+        [0.0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799],
+        [0.0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072],
+        [0.0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632],
+        [0.0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844],
+        [0.0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423]])
+
+    def __init__(self, fun, t, y, rtol=1e-6, atol=1e-9, h=None, max_step=np.inf):
+        self.fun = fun
+        self.rtol = rtol
+        self.atol = atol
+        self.max_step = max_step
+        self.nsteps = self.nrejected = self.nfev = 0
+        self.K = None
+        self.restart(t, y)
+        self.h = self._initial_step() if h is None else h
+
+    def restart(self, t, y):
+        self.t = self.t_old = t
+        self.y = self.y_old = np.array(y, dtype=float)
+        self.f = self._rate(t, self.y)
+
+    def _rate(self, t, y):
+        self.nfev += 1
+        return np.asarray(self.fun(t, y), dtype=float)
+
+    def _norm(self, x, y_new=None):
+        scale = self.atol + self.rtol * (np.abs(self.y) if y_new is None
+                                         else np.maximum(np.abs(self.y), np.abs(y_new)))
+        return np.sqrt(np.mean((x / scale) ** 2))
+
+    def _initial_step(self):
+        """ First step size from the size of y and of its first two derivatives (Hairer et al.). """
+        d0, d1 = self._norm(self.y), self._norm(self.f)
+        h0 = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+        f1 = self._rate(self.t + h0, self.y + h0 * self.f)
+        d2 = self._norm(f1 - self.f) / h0
+        h1 = max(1e-6, 1e-3 * h0) if max(d1, d2) <= 1e-15 else (0.01 / max(d1, d2)) ** 0.2
+        return min(100 * h0, h1, self.max_step)
+
+    def step(self, t_bound):
+        """ One accepted step towards t_bound; returns the new time. """
+        K = np.empty((7, self.y.size))
+        while True:
+            h = min(self.h, self.max_step, t_bound - self.t)
+            K[0] = self.f
+            for i in range(1, 6):
+                K[i] = self._rate(self.t + self.C[i] * h, self.y + h * (self.A[i] @ K[:i]))
+            y_new = self.y + h * (self.B @ K[:6])
+            K[6] = self._rate(self.t + h, y_new)
+            err = self._norm(h * (self.E @ K), y_new)
+            factor = 10.0 if err == 0.0 else min(10.0, max(0.2, 0.9 * err ** -0.2))
+            if err <= 1.0:
+                break
+            self.nrejected += 1
+            self.h = h * factor
+        if h == self.h or factor < 1.0:
+            self.h = h * factor
+        self.nsteps += 1
+        self.t_old, self.y_old = self.t, self.y
+        self.t, self.y, self.f = self.t + h, y_new, K[6]
+        self.K = K
+        return self.t
+
+    def dense(self, t):
+        """ States at the times t (scalar or array) within the last step, shape t.shape + y.shape. """
+        h = self.t - self.t_old
+        sigma = (np.asarray(t, dtype=float) - self.t_old) / h
+        powers = np.cumprod(np.repeat(sigma[..., None], 4, axis=-1), axis=-1)
+        Q = self.K.T @ self.P
+        return self.y_old + h * powers @ Q.T
@@ -0,0 +1,256 @@
+"""
+streams.py
+
+Constant-memory plumbing for long integrations.
+
+The models expose generators (parcels.stream(), inertial.stream(),
+trajectories.coriolis_stream(), winethief.stream(),
+ShallowWater1D.stream()) that yield the run as consecutive blocks: dicts
+of NumPy arrays whose first axis is time, at most BLOCK rows each (and,
+for states as wide as a batch of parcels, at most BUDGET bytes), with
+the same keys as the whole-run functions. Only one block is alive at a
+time, so a run of any length needs the memory of one block.
+
+Sinks consume the blocks as they arrive:
+
+    FileSink    text (.txt/.csv, appended with np.savetxt) or a binary
+                run written with simio.Writer
+    Reducer     folds every block into a running value
+    Statistics  count, mean, std, min and max of every column, merged
+                block by block (Chan et al.), so no sample is kept
+    Plotter     a thinned copy of some columns, at most max_points rows,
+                drawn with plot() when the run is over
+
+drain(blocks, *sinks) feeds every block to every sink and closes them:
+
+    stats = streams.Statistics()
+    streams.drain(inertial.stream(0.1, 0, 0, 0, f, 60.0, ntot), stats,
+                  streams.FileSink('run'))
+
+Sandy Herho, 2024
+"""
+
+import numpy as np
+
+from . import simio, timings
+
+BLOCK = 4096   # rows per block of the model streams
+BUDGET = 64 << 20   # bytes per block of the streams of wide states (many parcels)
+
+
+def block_rows(width, arrays=1, itemsize=8, budget=BUDGET, block=BLOCK):
+    """
+    Rows per block for `arrays` arrays of `width` columns of `itemsize`
+    bytes: at most block, and few enough to fit in budget bytes (but at
+    least one).
+    """
+    return max(1, min(block, budget // (width * itemsize * arrays)))
+
+
+def drain(blocks, *sinks):
+    """
+    Feed every block to every sink, then close the sinks. Generating the
+    blocks is timed as "compute" and consuming them as "sink" (see
+    timings.py). Returns the sinks.
+    """
+    try:
+        for block in timings.iterate(blocks, "compute"):
+            with timings.stage("sink"):
+                for sink in sinks:
+                    sink.consume(block)
+            timings.count("blocks")
+    finally:
+        for sink in sinks:
+            sink.close()
+    return sinks
+
+
+def collect(blocks):
+    """ Concatenate a stream into one dict of arrays (for runs that fit in memory). """
+    parts = {}
+    for block in blocks:
+        for key, value in block.items():
+            parts.setdefault(key, []).append(value)
+    return {key: np.concatenate(value) for key, value in parts.items()}
+
+
+def columns(block, keys=None):
+    """
+    The block as 1-D columns: an array of shape (rows, m) becomes the
+    columns key_0 .. key_(m-1) (or just key if m == 1).
+    """
+    out = {}
+    for key in block if keys is None else keys:
+        value = np.asarray(block[key])
+        if value.ndim == 1:
+            out[key] = value
+            continue
+        value = value.reshape(len(value), -1)
+        if value.shape[1] == 1:
+            out[key] = value[:, 0]
+        else:
+            for i in range(value.shape[1]):
+                out[f"{key}_{i}"] = value[:, i]
+    return out
+
+
+class Sink:
+    """ Something that consumes blocks; close() is called once at the end. """
+
+    def consume(self, block):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class FileSink(Sink):
+    """
+    Write the blocks to a file as they arrive.
+
+    Names ending in .txt or .csv get text rows written with np.savetxt
+    (fmt and delimiter as there, header=True writes the column names
+    first); any other name a binary run (see simio.py) with meta as its
+    header. keys selects and orders the columns; multi-column arrays are
+    split as in columns().
+    """
+
+    def __init__(self, name, keys=None, meta=None, fmt="%.17g", delimiter=" ", header=False):
+        self.name = name
+        self.keys = keys
+        self.text = name.endswith(('.txt', '.csv'))
+        self.fmt = fmt
+        self.delimiter = delimiter
+        self.header = header
+        self.nbytes = 0
+        if self.text:
+            self._file = open(name, 'w')
+        else:
+            self._writer = simio.Writer(name, meta=meta)
+        self._open = True
+
+    def consume(self, block):
+        cols = columns(block, self.keys)
+        if not self.text:
+            self._writer.append(cols)
+            return
+        with timings.stage("write"):
+            if self.header:
+                self._file.write(self.delimiter.join(cols) + "\n")
+                self.header = False
+            np.savetxt(self._file, np.column_stack(list(cols.values())), fmt=self.fmt,
+                       delimiter=self.delimiter)
+
+    def close(self):
+        if not self._open:
+            return
+        self._open = False
+        if self.text:
+            self._file.close()
+            timings.count_file(self.name)
+        else:
+            self.nbytes = self._writer.close()
+
+
+class Reducer(Sink):
+    """
+    Fold the blocks into one value: value = func(value, block), starting
+    from initial.
+    """
+
+    def __init__(self, func, initial=None):
+        self.func = func
+        self.value = initial
+
+    def consume(self, block):
+        self.value = self.func(self.value, block)
+
+
+class Statistics(Reducer):
+    """
+    Running count, mean, standard deviation, min and max of every column
+    (or of keys), over the time axis. Columns with more dimensions get
+    statistics of the same trailing shape. result() returns
+    {key: {"count", "mean", "std", "min", "max"}}.
+    """
+
+    def __init__(self, keys=None):
+        super().__init__(self._merge, {})
+        self.keys = keys
+
+    def _merge(self, state, block):
+        for key in block if self.keys is None else self.keys:
+            x = np.asarray(block[key])
+            if x.dtype.kind not in "fiub" or len(x) == 0:
+                continue
+            x = x.astype(float)
+            n_b = len(x)
+            mean_b = x.mean(axis=0)
+            m2_b = ((x - mean_b) ** 2).sum(axis=0)
+            if key not in state:
+                state[key] = [n_b, mean_b, m2_b, x.min(axis=0), x.max(axis=0)]
+                continue
+            s = state[key]
+            n = s[0] + n_b
+            delta = mean_b - s[1]
+            s[1] = s[1] + delta * n_b / n
+            s[2] = s[2] + m2_b + delta ** 2 * s[0] * n_b / n
+            s[3] = np.minimum(s[3], x.min(axis=0))
+            s[4] = np.maximum(s[4], x.max(axis=0))
+            s[0] = n
+        return state
+
+    def result(self):
+        return {key: {"count": n, "mean": mean, "std": np.sqrt(m2 / n), "min": lo, "max": hi}
+                for key, (n, mean, m2, lo, hi) in self.value.items()}
+
+
+class Plotter(Sink):
+    """
+    Keep a thinned copy of the columns x and ys for plotting a run of any
+    length: every stride-th row is kept, and whenever more than
+    max_points rows are held every other one is dropped and the stride
+    doubles. plot(ax) draws ys against x on a matplotlib axes.
+    """
+
+    def __init__(self, x, ys, max_points=10000):
+        self.x = x
+        self.ys = [ys] if isinstance(ys, str) else list(ys)
+        self.max_points = max_points
+        self.stride = 1
+        self.seen = 0
+        self.kept = {key: [] for key in [x] + self.ys}
+
+    def consume(self, block):
+        n = len(block[self.x])
+        first = (-self.seen) % self.stride
+        for key, parts in self.kept.items():
+            parts.append(np.asarray(block[key])[first::self.stride].copy())
+        self.seen += n
+        while sum(len(p) for p in self.kept[self.x]) > self.max_points:
+            self._thin()
+
+    def _thin(self):
+        for key, parts in self.kept.items():
+            self.kept[key] = [np.concatenate(parts)[::2]]
+        self.stride *= 2
+
+    def data(self):
+        """ The kept rows, {key: array}. """
+        return {key: np.concatenate(parts) if parts else np.empty(0)
+                for key, parts in self.kept.items()}
+
+    def plot(self, ax, **kwargs):
+        """ Draw every y column against x; returns the lines. """
+        data = self.data()
+        lines = []
+        for key in self.ys:
+            lines += ax.plot(data[self.x], data[key], label=key, **kwargs)
+        return lines
@@ -0,0 +1,62 @@
+"""
+Keys, code versions and --set overrides of the result cache.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from common import cache, checkpoint, simio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'ch2', 'InertialOscillations', 'herho_work'))
+sys.path.insert(0, os.path.join(ROOT, 'ch2', 'buoyant_force'))
+
+
+def test_overrides_reads_literals():
+    params = {"dt": 1.0, "ntot": 10, "flag": True, "scheme": "exact", "events": [(40, 0.0, -0.3)]}
+    out = cache.overrides(params, ["flag=False", "events=[(10, 0.1, 0.0), (20, 0.0, 0.2)]",
+                                   "scheme=semi_implicit", "dt=100", "ntot=20"])
+    assert out["flag"] is False
+    assert out["events"] == [(10, 0.1, 0.0), (20, 0.0, 0.2)]
+    assert out["scheme"] == "semi_implicit"
+    assert out["dt"] == 100.0 and isinstance(out["dt"], float)
+    assert out["ntot"] == 20
+    assert params["dt"] == 1.0
+    with pytest.raises(ValueError):
+        cache.overrides(params, ["nope=1"])
+
+
+def test_code_version_covers_the_modules_used():
+    import inertial
+    import parcels
+    files = {os.path.relpath(path, ROOT) for path in cache.code_files(inertial)}
+    assert {os.path.join('common', name) for name in ('fortran.py', 'streams.py')} <= files
+    assert os.path.join('common', 'stepping.py') in {os.path.relpath(path, ROOT)
+                                                     for path in cache.code_files(parcels)}
+    assert not any(path.startswith('..') for path in files)
+    assert cache.code_version(inertial) != cache.code_version(inertial, __file__)
+
+
+def test_fetch_hits_and_misses(tmp_path):
+    store = cache.Cache(str(tmp_path))
+    calls = []
+
+    def compute(n, scale):
+        calls.append(n)
+        return {"x": np.arange(n) * scale}
+
+    params = {"n": 5, "scale": np.float64(2.0)}
+    first = store.fetch("model", params, compute, sources=[__file__])
+    second = store.fetch("model", params, compute, sources=[__file__])
+    np.testing.assert_array_equal(first["x"], second["x"])
+    assert calls == [5]
+    store.fetch("model", dict(params, n=6), compute, sources=[__file__])
+    assert calls == [5, 6] and len(store.entries()) == 2
+
+
+def test_json_fallback_is_shared():
+    ckpt = checkpoint.Checkpoint("unused", 1, {"a": np.float32(1.5), "b": np.arange(2)})
+    assert ckpt.params == {"a": 1.5, "b": [0, 1]}
@@ -0,0 +1,75 @@
+"""
+GIFs written by gifenc.Encoder decode, with Pillow, to the palette colors
+of the frames given.
+"""
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from common import gifenc
+
+
+def frames(count=6, shape=(40, 50)):
+    rng = np.random.default_rng(0)
+    colors = rng.integers(0, 256, size=(20, 3), dtype=np.uint8)
+    frame = np.zeros(shape + (3,), dtype=np.uint8) + 255
+    out = []
+    for i in range(count):
+        frame = frame.copy()
+        if i != 3:   # frame 3 repeats frame 2
+            frame[5 + i:15 + 2 * i, 10 + 3 * i:30] = colors[i]
+            frame[-1, -1] = colors[10 + i]
+        out.append(frame)
+    return out
+
+
+def decoded(filename):
+    with Image.open(filename) as gif:
+        return ([np.asarray(frame.convert('RGB')) for frame in ImageSequence.Iterator(gif)],
+                [frame.info.get('duration') for frame in ImageSequence.Iterator(gif)])
+
+
+def test_roundtrip_with_dropped_frame(tmp_path):
+    given = frames()
+    filename = str(tmp_path / "a.gif")
+    with gifenc.Encoder(filename, fps=10, palette=gifenc.Palette.build(given)) as gif:
+        for frame in given:
+            gif.add(frame)
+    assert gif.frames == 5 and gif.dropped == 1
+    images, durations = decoded(filename)
+    expected = [frame for i, frame in enumerate(given) if i != 3]
+    assert len(images) == len(expected)
+    for image, frame in zip(images, expected):
+        np.testing.assert_array_equal(image, frame)
+    assert durations[2] == 2 * durations[0]
+
+
+def test_lookup_table():
+    palette = gifenc.Palette([(0, 0, 0), (255, 255, 255), (200, 10, 10), (3, 130, 7)])
+    assert palette.lut.shape == (1 << 24,)
+    rgb = palette.colors[None, :, :]
+    np.testing.assert_array_equal(palette.index(rgb), [[0, 1, 2, 3]])
+    np.testing.assert_array_equal(palette.index(np.array([[[250, 250, 250], [190, 20, 0]]])), [[1, 2]])
+
+
+def test_build_from_sample_frames():
+    first, later = np.zeros((4, 4, 3), dtype=np.uint8), np.zeros((4, 4, 3), dtype=np.uint8)
+    first[:] = (10, 20, 30)
+    later[:] = (40, 50, 60)
+    colors = [tuple(c) for c in gifenc.Palette.build([first, later], colors=['r']).colors.tolist()]
+    assert (10, 20, 30) in colors and (40, 50, 60) in colors and (255, 0, 0) in colors
+    assert (40, 50, 60) not in [tuple(c) for c in gifenc.Palette.build(first).colors.tolist()]
+
+
+def test_long_still_is_split_at_the_largest_delay(tmp_path):
+    """ 700 repeats of 1 s: 65535 cs is the most one frame can wait. """
+    given = frames(count=2)
+    filename = str(tmp_path / "still.gif")
+    with gifenc.Encoder(filename, fps=1, palette=gifenc.Palette.build(given)) as gif:
+        gif.add(given[0])
+        for _ in range(700):
+            gif.add(given[1])
+    assert gif.frames == 3 and gif.dropped == 698
+    images, durations = decoded(filename)
+    assert durations == [1000, 655000, 45000]
+    np.testing.assert_array_equal(images[2], given[1])
@@ -0,0 +1,33 @@
+"""
+Panels of the raster backend keep their edge lines on the canvas.
+"""
+
+import numpy as np
+
+from common import raster
+
+
+def test_panel_filling_the_canvas_does_not_wrap():
+    canvas = raster.Canvas(100, 80)
+    canvas.panel((0.0, 0.0, 1.0, 1.0), (0, 1), (0, 1), xticks=[], yticks=[])
+    assert (canvas.base == raster.FACE).all()
+
+
+def test_panel_edges():
+    canvas = raster.Canvas(100, 80)
+    panel = canvas.panel((0.1, 0.1, 0.5, 0.5), (0, 1), (0, 1), xticks=[], yticks=[])
+    top, left, bottom, right = panel.top, panel.left, panel.top + panel.height, panel.left + panel.width
+    for row in (top - 1, bottom):
+        assert (canvas.base[row, left - 1:right + 1] == raster.EDGE).all()
+    for col in (left - 1, right):
+        assert (canvas.base[top - 1:bottom + 1, col] == raster.EDGE).all()
+    assert (canvas.base[top:bottom, left:right] == raster.FACE).all()
+    assert (canvas.base[:top - 1] == raster.WHITE).all()
+
+
+def test_colors_are_those_of_the_gif_palette():
+    canvas = raster.Canvas(20, 20)
+    panel = canvas.panel((0.0, 0.0, 1.0, 1.0), (0, 1), (0, 1), xticks=[], yticks=[])
+    canvas.begin()
+    canvas.polyline(panel, [0, 1], [0.5, 0.5], 'orange')
+    assert (canvas.frame == np.array(raster.to_rgb('orange'), dtype=np.uint8)).all(axis=-1).any()
@@ -0,0 +1,137 @@
+"""
+The step kernels of stepping.py against closed-form decay and rotation,
+for single systems and batches.
+"""
+
+import numpy as np
+import pytest
+
+from common import stepping
+
+KAPPA, DT = 1e-4, 3600.0
+
+
+@pytest.mark.parametrize("scheme, factor", [
+    ("explicit", 1 - KAPPA * DT),
+    ("implicit", 1 / (1 + KAPPA * DT)),
+    ("crank_nicolson", (1 - 0.5 * KAPPA * DT) / (1 + 0.5 * KAPPA * DT)),
+    ("exponential", np.exp(-KAPPA * DT)),
+])
+def test_decay_factor(scheme, factor):
+    G, c = stepping.propagator(scheme, [[-KAPPA]], DT)
+    assert c is None
+    np.testing.assert_allclose(G, [[factor]], rtol=1e-14)
+    kernel = {"explicit": stepping.explicit_euler, "implicit": stepping.implicit_euler,
+              "crank_nicolson": stepping.crank_nicolson, "exponential": stepping.exponential}[scheme]
+    np.testing.assert_allclose(kernel(5.0, [[-KAPPA]], DT), [[5.0 * factor]], rtol=1e-14)
+
+
+def test_exponential_step_of_forced_decay():
+    """ dy/dt = -kappa y + b relaxes to b/kappa: y(t) = b/kappa + (y0 - b/kappa) exp(-kappa t). """
+    b = 2e-3
+    y = stepping.exponential(1.0, [[-KAPPA]], DT, b=[b])
+    np.testing.assert_allclose(y, [[b / KAPPA + (1.0 - b / KAPPA) * np.exp(-KAPPA * DT)]], rtol=1e-13)
+
+
+def test_rotation():
+    f = 1e-4
+    A = [[0.0, f], [-f, 0.0]]
+    angle = f * DT
+    G, _ = stepping.propagator("exponential", A, DT)
+    np.testing.assert_allclose(G, stepping.rotation_matrix(angle), atol=1e-15)
+    np.testing.assert_allclose(stepping.rotation([[0.3, 0.1, 7.0]], angle),
+                               [[0.3 * np.cos(angle) + 0.1 * np.sin(angle),
+                                 0.1 * np.cos(angle) - 0.3 * np.sin(angle), 7.0]], rtol=1e-15)
+
+    # Crank-Nicolson keeps the speed and turns by 2*arctan(angle/2)
+    G, _ = stepping.propagator("crank_nicolson", A, DT)
+    np.testing.assert_allclose(G, stepping.rotation_matrix(2 * np.arctan(0.5 * angle)), atol=1e-15)
+
+
+def test_batched_shapes():
+    rng = np.random.default_rng(1)
+    A = rng.normal(size=(5, 3, 3)) * 1e-3
+    b = rng.normal(size=(5, 3)) * 1e-3
+    y = rng.normal(size=(5, 3))
+    for scheme in ("explicit", "implicit", "crank_nicolson", "exponential"):
+        G, c = stepping.propagator(scheme, A, 100.0, b)
+        assert G.shape == (5, 3, 3) and c.shape == (5, 3)
+        batch = stepping.apply(G, y, c)
+        for m in range(5):
+            Gm, cm = stepping.propagator(scheme, A[m], 100.0, b[m])
+            np.testing.assert_allclose(batch[m], Gm @ y[m] + cm, rtol=1e-13, atol=1e-15)
+
+    # One matrix shared by the whole batch
+    G, _ = stepping.propagator("implicit", A[0], 100.0)
+    np.testing.assert_allclose(stepping.apply(G, y), y @ G.T, rtol=1e-13)
+    assert stepping.as_batch(2.0).shape == (1, 1) and stepping.as_batch([1.0, 2.0]).shape == (1, 2)
+
+
+def test_expm_of_a_stack():
+    rng = np.random.default_rng(2)
+    M = rng.normal(size=(4, 3, 3)) * 3.0
+    E = stepping.expm(M)
+    for m in range(4):
+        w, V = np.linalg.eig(M[m])
+        np.testing.assert_allclose(E[m], (V * np.exp(w)) @ np.linalg.inv(V), rtol=1e-10, atol=1e-12)
+    np.testing.assert_array_equal(stepping.expm(np.zeros((2, 2))), np.eye(2))
+
+
+@pytest.mark.parametrize("A", [
+    [[0.0, 1.0], [-1e-4, -0.02]],    # underdamped oscillator
+    [[0.0, 1.0], [-1e-4, -0.5]],     # overdamped
+    [[0.0, 1.0], [-1e-4, -0.0200002]],   # nearly critical, mu*t small
+    [[-0.01, 0.0], [0.0, -0.01]],    # mu = 0
+    [[0.0, 1e-4], [-1e-4, 0.0]],     # rotation
+])
+def test_expm2_matches_expm(A):
+    t = np.array([0.0, 1.0, 60.0, 3600.0])
+    np.testing.assert_allclose(stepping.expm2(A, t), stepping.expm(np.asarray(A) * t[:, None, None]),
+                               rtol=1e-10, atol=1e-14)
+
+
+def test_expm2_broadcasts():
+    A = np.array([[[0.0, 1.0], [-k, -0.01]] for k in (1e-4, 4e-4, 1e-2)])   # (3, 2, 2)
+    t = np.linspace(0.0, 600.0, 7)[:, None]                                 # (7, 1)
+    E = stepping.expm2(A, t)
+    assert E.shape == (7, 3, 2, 2)
+    np.testing.assert_allclose(E[4, 2], stepping.expm(A[2] * t[4, 0]), rtol=1e-10, atol=1e-14)
+
+
+@pytest.mark.parametrize("rtol", [1e-6, 1e-9])
+def test_dormand_prince_oscillator(rtol):
+    """ y'' = -y from (1, 0): the steps stay within tolerance and grow with it. """
+    solver = stepping.DormandPrince(lambda t, y: (y[1], -y[0]), 0.0, [1.0, 0.0], rtol=rtol, atol=rtol)
+    times, errors = [], []
+    while solver.t < 20.0:
+        t = solver.step(20.0)
+        times.append(t)
+        errors.append(np.abs(solver.y - [np.cos(t), -np.sin(t)]).max())
+        mid = 0.5 * (solver.t_old + t)
+        np.testing.assert_allclose(solver.dense(mid), [np.cos(mid), -np.sin(mid)], atol=100 * rtol)
+    assert times[-1] == 20.0
+    assert max(errors) < 100 * rtol
+    assert solver.nsteps == len(times)
+    assert solver.nfev >= 6 * solver.nsteps
+
+
+def test_dormand_prince_step_count_follows_fifth_order():
+    """ Tightening the tolerance by 10^5 costs about 10x the steps of a fifth-order pair. """
+    counts = []
+    for rtol in (1e-5, 1e-10):
+        solver = stepping.DormandPrince(lambda t, y: -y, 0.0, [1.0], rtol=rtol, atol=1e-14)
+        while solver.t < 10.0:
+            solver.step(10.0)
+        np.testing.assert_allclose(solver.y, [np.exp(-10.0)], rtol=100 * rtol)
+        counts.append(solver.nsteps)
+    assert 5 < counts[1] / counts[0] < 20
+
+
+def test_dormand_prince_restart():
+    solver = stepping.DormandPrince(lambda t, y: -y, 0.0, [1.0])
+    solver.step(0.5)
+    solver.restart(2.0, [3.0])
+    assert solver.t == solver.t_old == 2.0
+    while solver.t < 3.0:
+        solver.step(3.0)
+    np.testing.assert_allclose(solver.y, [3.0 * np.exp(-1.0)], rtol=1e-5)
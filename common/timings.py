@@ -0,0 +1,248 @@
+"""
+timings.py
+
+Opt-in per-stage timers and counters for the model and plotting scripts.
+
+A script calls setup() once at start-up. Instrumentation is switched on
+either by the COURSE_TIMINGS environment variable or by a --timings flag
+on the command line (removed from sys.argv before the script parses its
+own arguments):
+
+    COURSE_TIMINGS=1 python buoyant_plot.py         # timings_buoyant_plot_<date>_<pid>.json
+    COURSE_TIMINGS=/tmp/prof python coriolis.py     # same name, inside /tmp/prof
+    python long_surf_wave.py --timings=run.json     # exactly run.json
+
+Stages are timed with
+
+    with timings.stage("compute"):
+        ...
+
+and events counted with timings.count("frames") or
+timings.count("bytes_written", n). Stage times are inclusive (a stage
+inside another is also part of the outer one). When the run ends one
+JSON profile is written with the wall time, the seconds and number of
+calls of every stage, and the counters.
+
+Matplotlib animations are covered by wrapping the update function
+(wrap()) and the writer (writer()): grab_frame() is where the figure is
+redrawn and captured ("redraw"), finish() is where the writer encodes
+the GIF ("encode"). gifenc.writer() encodes each frame as it is grabbed,
+so most of its "encode" time is inside "redraw".
+
+When instrumentation is off, stage() returns one shared do-nothing
+context manager, count() returns at once, and wrap(), writer() and
+iterate() hand back their argument unchanged, so the cost is a global
+lookup per call.
+
+Sandy Herho, 2024
+"""
+
+import atexit
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+ENV = "COURSE_TIMINGS"
+FLAG = "--timings"
+
+_active = None
+_null = nullcontext()
+
+
+class Profile:
+    """ Accumulated stage times and counters of one run. """
+
+    def __init__(self, script, path):
+        self.script = script
+        self.path = path
+        self.date = datetime.now().isoformat(timespec='seconds')
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+
+    def add(self, name, seconds):
+        entry = self.stages.get(name)
+        if entry is None:
+            self.stages[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self):
+        return {"script": self.script, "argv": sys.argv[1:], "date": self.date,
+                "python": platform.python_version(),
+                "wall": time.perf_counter() - self.start,
+                "stages": {name: {"seconds": s, "calls": n} for name, (s, n) in self.stages.items()},
+                "counters": dict(self.counters)}
+
+    def dump(self):
+        """ Write the JSON profile, returns its path. """
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(self.path, 'w') as file:
+            json.dump(self.as_dict(), file, indent=1)
+        return self.path
+
+
+class _Stage:
+    __slots__ = ("profile", "name", "t0")
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.add(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+def _default_name(script):
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    return f"timings_{script}_{stamp}_{os.getpid()}.json"
+
+
+def _take_flag(argv):
+    """ Remove --timings / --timings=PATH from argv; returns the value, '1' or None. """
+    for i, arg in enumerate(argv):
+        if arg == FLAG:
+            del argv[i]
+            return "1"
+        if arg.startswith(FLAG + "="):
+            del argv[i]
+            return arg.split("=", 1)[1] or "1"
+    return None
+
+
+def setup(script, argv=None):
+    """
+    Enable instrumentation if the --timings flag is in argv (sys.argv by
+    default, the flag is removed from it) or COURSE_TIMINGS is set.
+    script is a name or a __file__ path, used in the default file name.
+    Returns True if enabled.
+    """
+    script = os.path.splitext(os.path.basename(script))[0]
+    value = _take_flag(sys.argv if argv is None else argv)
+    if value is None:
+        value = os.environ.get(ENV, "")
+    if value in ("", "0"):
+        return False
+    if value == "1":
+        path = _default_name(script)
+    elif os.path.isdir(value) or value.endswith(os.sep):
+        path = os.path.join(value, _default_name(script))
+    else:
+        path = value
+    enable(script, path)
+    return True
+
+
+def enable(script="run", path=None):
+    """ Start collecting; the profile is written at exit (or by dump()). """
+    global _active
+    if _active is None:
+        atexit.register(dump)
+    _active = Profile(script, path or _default_name(script))
+    return _active
+
+
+def enabled():
+    return _active is not None
+
+
+def stage(name):
+    """ Context manager timing a stage; a shared no-op when disabled. """
+    if _active is None:
+        return _null
+    return _Stage(_active, name)
+
+
+def count(name, n=1):
+    """ Add n to a counter (steps, frames, bytes_written, ...). """
+    if _active is not None:
+        _active.count(name, n)
+
+
+def count_file(path, name="bytes_written"):
+    """ Add the size of a file just written to a counter. """
+    if _active is not None and os.path.exists(path):
+        _active.count(name, os.path.getsize(path))
+
+
+def wrap(func, name):
+    """ func timed as stage name on every call (func itself when disabled). """
+    if _active is None:
+        return func
+
+    def timed(*args, **kwargs):
+        with _Stage(_active, name):
+            return func(*args, **kwargs)
+    return timed
+
+
+def writer(w, fps=None):
+    """
+    Instrument a matplotlib MovieWriter: grab_frame() is timed as "redraw"
+    and counted in "frames", finish() as "encode", and the size of the
+    output file goes to "bytes_written". w may also be a writer name
+    ('pillow', 'imagemagick', ...), made with fps as Animation.save()
+    would, falling back to PillowWriter if it isn't available.
+    """
+    if isinstance(w, str):
+        from matplotlib.animation import PillowWriter, writers
+        try:
+            w = writers[w](fps=fps)
+        except RuntimeError:
+            w = PillowWriter(fps=fps)
+    if _active is None:
+        return w
+    grab_frame, finish = w.grab_frame, w.finish
+
+    def timed_grab(**kwargs):
+        with stage("redraw"):
+            grab_frame(**kwargs)
+        count("frames")
+
+    def timed_finish():
+        with stage("encode"):
+            finish()
+        count_file(w.outfile)
+
+    w.grab_frame = timed_grab
+    w.finish = timed_finish
+    return w
+
+
+def iterate(iterable, name):
+    """ Yield from iterable, timing the production of each item as stage name. """
+    if _active is None:
+        return iterable
+    return _timed_iter(iter(iterable), name)
+
+
+def _timed_iter(it, name):
+    while True:
+        with stage(name):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+
+def dump():
+    """ Write the profile of the active run (if any) and return its path. """
+    if _active is None:
+        return None
+    return _active.dump()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+
+"""
+run_sweep.py
+
+Parameter sweeps over the models of ch1-ch3 from a declarative spec.
+
+A spec is a TOML or JSON file naming a model (see MODELS) and its
+parameters:
+
+    model = "buoyancy"
+    output = "buoyancy_sweep"      # .csv: text table, otherwise a binary run
+    workers = 4                    # processes (default: all cores)
+    retries = 1                    # extra attempts for a failing member
+
+    [fixed]                        # the same for every member
+    ntot = 3600
+
+    [grid]                         # every combination is one member
+    rho = [1025.2, 1025.5, 1025.8]
+    r = [0.0, 0.01, 0.02]
+
+and optionally a list of explicit members ([[members]] tables), each
+combined with every grid point, e.g. the scenarios of waveInterference.py.
+Parameters that aren't given keep the course values (the defaults of the
+MODELS functions).
+
+The members run on a local process pool. A member that raises is
+resubmitted up to `retries` times, then reported as failed; members
+caught in a pool broken by a dying worker are resubmitted to a fresh pool
+without losing an attempt. Progress is printed as members complete.
+
+All results go into one dataset (see common/simio.py), written in member
+order as they come in: the column "member", one column per parameter that
+varies across the sweep (strings as the index into meta["levels"]), then
+the model's output columns. The metadata holds the spec, the parameters
+of every member and the failed members with their errors, so
+
+    run = simio.load('buoyancy_sweep')
+    z = run['z'][run['member'] == 4]
+
+Sandy Herho, 2024
+"""
+
+import argparse
+import inspect
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for folder in ('', 'ch1', 'ch2/buoyant_force', 'ch2/InertialOscillations/herho_work', 'ch2/coriolis',
+               'ch2/wave', 'ch3/long_surface_grav_wave'):
+    sys.path.insert(0, os.path.join(ROOT, folder))
+
+from common import streams, timings
+
+
+# Every model takes its parameters as keywords (defaults: the course run)
+# and returns a dict of equally long 1-D columns.
+
+def winethief(kappa=1.0e-4, dt=3600.0, scheme="explicit", hours=24.0):
+    import winethief
+    result = winethief.ensemble(kappa, dt, scheme, hours=hours)
+    return {key: result[key][0] for key in ("time", "C", "CTRUE", "error")}
+
+
+def buoyancy(z=-80.0, rho=1025.5, N2=1.0e-4, r=0.0, cd=0.0, w=0.0, dt=1.0, ntot=3600, nout=10):
+    import parcels
+    if cd:
+        result = parcels.simulate_adaptive(z, rho, N2, r, cd=cd, w=w, t_end=ntot * dt,
+                                           dt_out=nout * dt)
+    else:
+        result = parcels.simulate(z, rho, N2, r, w=w, dt=dt, ntot=ntot, nout=nout)
+    return {"time": result["time"], "z": result["z"][:, 0], "w": result["w"][:, 0]}
+
+
+def inertial(latitude=-90.0, u=0.1, v=0.0, uzero=0.05, vzero=0.05, dt=4320.0, ntot=120,
+             scheme="exact", kick="before", impulses=True):
+    import inertial
+    return inertial.trajectory(u, v, 0.0, 0.0, inertial.coriolis_parameter(latitude), dt, ntot,
+                               events=inertial.IMPULSES if impulses else (), uzero=uzero,
+                               vzero=vzero, scheme=scheme, kick=kick)
+
+
+def coriolis(x0=0.0, y0=0.0, u0=0.5, v0=0.5, fre=-2 * np.pi / (24 * 3600), dt=432.0, nframes=200):
+    from trajectories import coriolis_path
+    return coriolis_path(x0, y0, u0, v0, fre, dt, nframes)
+
+
+def waves(lambda2=100.0, T2=50.0, lambda1=100.0, T1=60.0, amp=1.0, nx=500, ntot=200, label=""):
+    from superposition import Superposition
+    x = np.linspace(0, 10 * lambda1, nx)
+    t = np.arange(ntot) * (10 * T1 / ntot)
+    elevation = Superposition([(amp, lambda1, T1), (amp, lambda2, T2)], x).elevation(t)
+    return {"time": np.repeat(t, nx), "x": np.tile(x, ntot), "eta": elevation.ravel()}
+
+
+def shallow_water(ncells=200, boundary="periodic", eta0=0.5, wavelength=100.0, length=500.0,
+                  h=20.0, duration=20.0, every=10):
+    from shallow_water import ShallowWater1D
+    model = ShallowWater1D(length, ncells, h=h, boundary=boundary)
+    model.set_wave(eta0, wavelength)
+    nsteps = int(np.ceil(duration / model.dt))
+    run = streams.collect(model.stream(nsteps, every=every))
+    rows = len(run["time"])
+    return {"time": np.repeat(run["time"], ncells), "x": np.tile(model.x_eta, rows),
+            "eta": run["eta"].ravel()}
+
+
+MODELS = {
+    "winethief": winethief,
+    "buoyancy": buoyancy,
+    "inertial": inertial,
+    "coriolis": coriolis,
+    "waves": waves,
+    "shallow_water": shallow_water,
+}
+
+
+def load_spec(filename):
+    """ The sweep spec in a TOML (.toml) or JSON file, as a dict. """
+    if filename.endswith('.toml'):
+        import tomllib
+        with open(filename, 'rb') as file:
+            spec = tomllib.load(file)
+    else:
+        with open(filename) as file:
+            spec = json.load(file)
+    if spec.get("model") not in MODELS:
+        raise ValueError(f"{filename}: model must be one of {sorted(MODELS)}, not {spec.get('model')!r}")
+    unknown = set(spec) - {"model", "output", "workers", "retries", "fixed", "grid", "members"}
+    if unknown:
+        raise ValueError(f"{filename}: unknown keys {sorted(unknown)}")
+    return spec
+
+
+def expand(spec):
+    """ Parameters of every member: fixed, then each explicit member, then each grid point. """
+    grid = spec.get("grid", {})
+    names = list(grid)
+    points = [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+    members = [{**spec.get("fixed", {}), **member, **point}
+               for member in spec.get("members", [{}]) for point in points]
+    known = inspect.signature(MODELS[spec["model"]]).parameters
+    unknown = {name for params in members for name in params} - set(known)
+    if unknown:
+        raise ValueError(f"model {spec['model']} has no parameters {sorted(unknown)}; "
+                         f"it takes {', '.join(known)}")
+    return members
+
+
+def run_member(model, params):
+    """ Run one member in a worker; returns its columns as float arrays. """
+    columns = streams.columns(MODELS[model](**params))
+    return {key: np.asarray(value, dtype=float) for key, value in columns.items()}
+
+
+def run_pool(model, members, failed, workers=None, retries=0, progress=print):
+    """
+    Run the members on a process pool and yield (index, columns) as they
+    complete, in any order. A member that raises is resubmitted up to
+    retries times. A worker that dies breaks the pool: the members still
+    unfinished are resubmitted to a new one without being charged an
+    attempt. If a pool breaks before any member completed in it, the
+    remaining members run one at a time, so that a member that kills its
+    worker is found and charged like one that raises. Members that fail
+    every attempt are added to failed as {index: error}.
+    """
+    attempts = [0] * len(members)
+    pending = list(range(len(members)))
+    done = 0
+    isolate = False
+    start = time.perf_counter()
+
+    def failure(i, exc):
+        attempts[i] += 1
+        if attempts[i] <= retries:
+            pending.append(i)
+            timings.count("retries")
+            progress(f"member {i} failed ({exc!r}), retry {attempts[i]} of {retries}")
+        else:
+            failed[i] = repr(exc)
+            progress(f"member {i} failed ({exc!r}), giving up")
+
+    def finished(i):
+        nonlocal done
+        done += 1
+        elapsed = time.perf_counter() - start
+        left = elapsed / done * (len(members) - done - len(failed))
+        progress(f"[{done + len(failed)}/{len(members)}] member {i} done, "
+                 f"{elapsed:.1f} s elapsed, about {left:.1f} s left")
+
+    while pending:
+        batch = sorted(pending)
+        pending.clear()
+        completed, broken = 0, False
+        with ProcessPoolExecutor(max_workers=1 if isolate else workers) as pool:
+            if isolate:
+                # One member in the pool at a time: a broken pool is its doing
+                for position, i in enumerate(batch):
+                    try:
+                        columns = pool.submit(run_member, model, members[i]).result()
+                    except BrokenProcessPool as exc:
+                        failure(i, exc)
+                        pending.extend(batch[position + 1:])
+                        break
+                    except Exception as exc:
+                        failure(i, exc)
+                        continue
+                    finished(i)
+                    yield i, columns
+                continue
+
+            futures = {pool.submit(run_member, model, members[i]): i for i in batch}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    columns = future.result()
+                except BrokenProcessPool:
+                    pending.append(i)
+                    broken = True
+                    continue
+                except Exception as exc:
+                    failure(i, exc)
+                    continue
+                completed += 1
+                finished(i)
+                yield i, columns
+        if broken:
+            timings.count("pool_restarts")
+            isolate = completed == 0
+            progress(f"a worker died, resubmitting {len(pending)} members to a new pool"
+                     + (" one at a time" if isolate else ""))
+
+
+def varying(members):
+    """ Names of the parameters that differ between members, in spec order. """
+    names = []
+    for params in members:
+        names += [name for name in params if name not in names]
+    return [name for name in names if len({json.dumps(p.get(name)) for p in members}) > 1]
+
+
+def encode(members, names):
+    """
+    Numeric columns of the varying parameters of every member: numbers as
+    they are, anything else as the index into a sorted list of levels.
+    """
+    values, levels = {}, {}
+    for name in names:
+        column = [params.get(name) for params in members]
+        if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in column):
+            values[name] = np.array(column, dtype=float)
+        else:
+            levels[name] = sorted({json.dumps(v) for v in column})
+            values[name] = np.array([levels[name].index(json.dumps(v)) for v in column], dtype=float)
+            levels[name] = [json.loads(v) for v in levels[name]]
+    return values, levels
+
+
+def sweep(spec, output=None, workers=None, retries=None, progress=print):
+    """
+    Run the sweep of spec and write its dataset to output (default
+    spec["output"]). Members are written in order as soon as all members
+    before them are done, so only out-of-order results are held in
+    memory. Returns (rows written, {member: error} of the failures).
+    """
+    model = spec["model"]
+    output = output or spec.get("output") or f"{model}_sweep"
+    workers = workers or spec.get("workers")
+    retries = spec.get("retries", 0) if retries is None else retries
+    members = expand(spec)
+    names = varying(members)
+    values, levels = encode(members, names)
+    failed = {}   # filled in by run_pool(), before the sink writes the metadata on close
+    meta = {"model": model, "spec": spec, "members": members, "levels": levels, "failed": failed}
+    progress(f"{model}: {len(members)} members, varying {', '.join(names) or 'nothing'}")
+
+    text = output.endswith(('.txt', '.csv'))
+    waiting = {}
+    following, rows = 0, 0
+
+    def flush(sink):
+        """ Write the members that are done from the next one in order on, skipping failures. """
+        nonlocal following, rows
+        while following in waiting or following in failed:
+            i = following
+            columns = waiting.pop(i, None)
+            if columns is not None:
+                n = len(next(iter(columns.values())))
+                block = {"member": np.full(n, i, dtype=float)}
+                block.update({name: np.full(n, values[name][i]) for name in names})
+                block.update(columns)
+                with timings.stage("sink"):
+                    sink.consume(block)
+                rows += n
+            following += 1
+
+    with streams.FileSink(output, meta=meta, delimiter="," if output.endswith('.csv') else " ",
+                          header=text) as sink:
+        for i, columns in run_pool(model, members, failed, workers, retries, progress):
+            waiting[i] = columns
+            flush(sink)
+        flush(sink)   # members waiting behind one that failed last
+    timings.count("members", len(members) - len(failed))
+    return rows, failed
+
+
+def main(spec_file, output=None, workers=None, retries=None, quiet=False):
+    spec = load_spec(spec_file)
+    progress = (lambda message: None) if quiet else (lambda message: print(message, flush=True))
+    rows, failed = sweep(spec, output, workers, retries, progress)
+    output = output or spec.get("output") or f"{spec['model']}_sweep"
+    print(f"{rows} rows of {len(expand(spec)) - len(failed)} members written to {output}")
+    if failed:
+        print(f"{len(failed)} members failed: {', '.join(map(str, sorted(failed)))}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    timings.setup(__file__)
+    parser = argparse.ArgumentParser(description="Parameter sweep of one of the course models")
+    parser.add_argument("spec", help="TOML or JSON sweep spec")
+    parser.add_argument("--output", help="dataset to write instead of the spec's output")
+    parser.add_argument("--workers", type=int, help="processes instead of the spec's workers")
+    parser.add_argument("--retries", type=int, help="retries instead of the spec's retries")
+    parser.add_argument("--quiet", action="store_true", help="no progress messages")
+    args = parser.parse_args()
+    main(args.spec, output=args.output, workers=args.workers, retries=args.retries,
+         quiet=args.quiet)
@@ -0,0 +1,59 @@
+"""
+Failure handling of run_sweep.run_pool(): a member that raises uses up
+its retries, a worker that dies doesn't charge the members caught in the
+broken pool.
+"""
+
+import os
+import time
+
+import numpy as np
+import pytest
+
+import run_sweep
+from common import simio
+
+
+def flaky(k=0, kill=-1, raise_at=-1, once="", delay=0.05):
+    """ A model member that kills its worker or raises for some k (only once if `once` is a file). """
+    time.sleep(delay)
+    if k in (kill, raise_at) and not (once and os.path.exists(once)):
+        if once:
+            open(once, 'w').close()
+        if k == kill:
+            os._exit(1)
+        raise ValueError(f"member {k}")
+    return {"k": np.full(3, k, dtype=float)}
+
+
+@pytest.fixture(autouse=True)
+def model(monkeypatch):
+    monkeypatch.setitem(run_sweep.MODELS, "flaky", flaky)
+
+
+def run(tmp_path, retries=0, workers=3, **fixed):
+    spec = {"model": "flaky", "grid": {"k": list(range(8))}, "fixed": fixed}
+    rows, failed = run_sweep.sweep(spec, output=str(tmp_path / "out"), workers=workers,
+                                   retries=retries, progress=lambda message: None)
+    return simio.load(str(tmp_path / "out")), failed
+
+
+@pytest.mark.parametrize("kill", [0, 5])
+def test_dead_worker_fails_only_its_member(tmp_path, kill):
+    result, failed = run(tmp_path, kill=kill)
+    assert list(failed) == [kill]
+    assert sorted(set(result["member"].astype(int))) == [k for k in range(8) if k != kill]
+
+
+def test_dead_worker_once_costs_no_attempt(tmp_path):
+    result, failed = run(tmp_path, kill=2, once=str(tmp_path / "killed"))
+    assert failed == {}
+    np.testing.assert_array_equal(result["member"], np.repeat(np.arange(8.0), 3))
+
+
+def test_raising_member_is_retried(tmp_path):
+    result, failed = run(tmp_path, raise_at=4, once=str(tmp_path / "raised"), retries=1)
+    assert failed == {}
+    result, failed = run(tmp_path, raise_at=4, retries=1)
+    assert list(failed) == [4] and "member 4" in failed[4]
+    assert 4 not in result["member"]